@@ -0,0 +1,39 @@
+"""Measure how generate_cmake scales with the number of logged invocations.
+
+    python benchmarks/bench_generate.py [--max 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmakegen.cmake_generator import generate_cmake
+from synthetic import synthetic_invocations
+
+
+def measure(n: int) -> float:
+    """Seconds generate_cmake takes for a synthetic log of about n invocations."""
+    invocations = synthetic_invocations(n)
+    start = time.perf_counter()
+    generate_cmake(invocations)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max", type=int, default=100_000, help="Largest log size to measure")
+    args = parser.parse_args()
+
+    print(f"{'invocations':>12} {'seconds':>10} {'us/invocation':>14}")
+    n = 10
+    while n <= args.max:
+        elapsed = measure(n)
+        print(f"{n:>12} {elapsed:>10.4f} {elapsed / n * 1e6:>14.2f}")
+        n *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compare parse_args with ParseCache on a synthetic 10k-TU build log.
+
+    python benchmarks/bench_parse_cache.py [--tus 10000] [--flags 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmakegen.flag_parser import ParseCache, parse_args
+from synthetic import synthetic_argvs
+
+
+def measure(tus: int, flags: int) -> dict:
+    """Invocations per second of parse_args and of ParseCache."""
+    argvs = synthetic_argvs(tus, targets=8, include_dirs=flags // 2, defines=flags // 2)
+
+    start = time.perf_counter()
+    for argv in argvs:
+        parse_args(argv)
+    uncached = time.perf_counter() - start
+
+    cache = ParseCache()
+    start = time.perf_counter()
+    for argv in argvs:
+        cache.parse(argv)
+    cached = time.perf_counter() - start
+    return {
+        "parse_args_per_s": len(argvs) / uncached,
+        "parse_cache_per_s": len(argvs) / cached,
+        "parse_cache_hits": cache.hits,
+        "parse_cache_misses": cache.misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tus", type=int, default=10_000, help="Number of compile invocations")
+    parser.add_argument("--flags", type=int, default=300, help="Shared flags per invocation")
+    args = parser.parse_args()
+
+    result = measure(args.tus, args.flags)
+    print(f"parse_args:  {result['parse_args_per_s']:10.0f} invocations/s")
+    print(f"ParseCache:  {result['parse_cache_per_s']:10.0f} invocations/s "
+          f"({result['parse_cache_per_s'] / result['parse_args_per_s']:.1f}x, "
+          f"{result['parse_cache_hits']} hits, {result['parse_cache_misses']} misses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Measure the per-invocation overhead the proxy compiler adds to a build.
+
+Runs a proxy script whose "real compiler" is `true`, so the difference to
+running `true` directly is what cmakegen costs per translation unit. The
+launcher of a wrapper directory (cmakegen.wrappers) is measured as well.
+
+    python benchmarks/bench_proxy.py [--runs N] [--check]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from cmakegen.wrappers import install_wrappers
+
+# Per-invocation budget for the proxy on top of bare interpreter startup.
+TARGET_OVERHEAD_MS = 5.0
+
+PROXY_SCRIPT = f"""\
+import sys
+sys.path.insert(0, {ROOT_DIR!r})
+from cmakegen.proxy import main
+main("true")
+"""
+
+COMPILE_ARGS = (
+    ["-g", "-O2", "-std=c++17", "-Wall", "-Wextra", "-fPIC"]
+    + [f"-I/opt/project/include/module{i}" for i in range(50)]
+    + [f"-DFEATURE_{i}=1" for i in range(50)]
+    + ["-c", "-o", "build/main.o", "src/main.cpp"]
+)
+
+
+def time_command(command: list[str], runs: int, env: dict) -> float:
+    """Return the mean wall time of `command` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(command, env=env, check=True)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def measure(runs: int) -> dict:
+    """Mean wall times in ms of the compiler alone, a bare interpreter, the proxy and a wrapper."""
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "proxy.py")
+        with open(script, "w") as f:
+            f.write(PROXY_SCRIPT)
+        wrappers = os.path.join(tmp, "wrappers")
+        install_wrappers(wrappers, {"cc": shutil.which("true")})
+        env = dict(os.environ, CMAKEGEN_LOG=os.path.join(tmp, "log.jsonl"))
+
+        direct = time_command(["true"] + COMPILE_ARGS, runs, env)
+        interpreter = time_command([sys.executable, "-c", "pass"], runs, env)
+        proxy = time_command([sys.executable, script] + COMPILE_ARGS, runs, env)
+        wrapper = time_command([os.path.join(wrappers, "cc")] + COMPILE_ARGS, runs, env)
+    return {
+        "direct_ms": direct,
+        "interpreter_ms": interpreter,
+        "proxy_ms": proxy,
+        "overhead_ms": proxy - direct,
+        # A difference of noisy timings: clamp rather than report a negative cost
+        "cmakegen_ms": max(0.0, proxy - interpreter - direct),
+        "wrapper_ms": wrapper,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50, help="Invocations per measurement")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if the overhead target is missed")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(f"direct compiler:      {result['direct_ms']:8.2f} ms")
+    print(f"bare interpreter:     {result['interpreter_ms']:8.2f} ms")
+    print(f"proxy + compiler:     {result['proxy_ms']:8.2f} ms")
+    print(f"proxy overhead:       {result['overhead_ms']:8.2f} ms")
+    print(f"wrapper + compiler:   {result['wrapper_ms']:8.2f} ms")
+    print(f"cmakegen share:       {result['cmakegen_ms']:8.2f} ms (target {TARGET_OVERHEAD_MS:.1f} ms)")
+
+    if args.check and result["cmakegen_ms"] > TARGET_OVERHEAD_MS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
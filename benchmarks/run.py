@@ -0,0 +1,156 @@
+"""Run the benchmark suite and report the results as JSON.
+
+    python benchmarks/run.py [--quick] [--output results.json] [--compare baseline.json]
+
+Each benchmark reports named metrics. Names ending in _per_s are rates
+(higher is better); names ending in _ms or _s are times (lower is better).
+With --compare, any of those that regressed by more than --tolerance
+relative to the baseline is listed and the exit status is 1.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_generate
+import bench_parse_cache
+import bench_proxy
+from cmakegen.invocation_log import log_invocation, read_invocations
+from synthetic import synthetic_invocations, write_log
+
+# Problem sizes for a full run and for --quick
+SIZES = {
+    "full": {"parse_tus": 10_000, "flags": 300, "append_processes": 8, "append_records": 500,
+             "read_tus": 50_000, "generate": [1_000, 10_000, 100_000], "proxy_runs": 50},
+    "quick": {"parse_tus": 500, "flags": 60, "append_processes": 2, "append_records": 50,
+              "read_tus": 1_000, "generate": [100, 1_000], "proxy_runs": 3},
+}
+# Measured for context only; they don't depend on cmakegen
+REFERENCE_METRICS = {"direct_ms", "interpreter_ms"}
+# Differences of other metrics, too noisy to compare; what they derive from is compared
+DERIVED_METRICS = {"cmakegen_ms"}
+
+
+def _append_worker(log_path: str, invocation: dict, records: int) -> None:
+    for _ in range(records):
+        log_invocation(log_path, invocation)
+
+
+def bench_append(processes: int, records: int) -> dict:
+    """log_invocation rate with `processes` proxies appending concurrently."""
+    invocation = synthetic_invocations(1, targets=1)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "build.jsonl")
+        workers = [multiprocessing.Process(target=_append_worker, args=(log_path, invocation, records))
+                   for _ in range(processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        assert len(read_invocations(log_path)) == processes * records
+    return {"processes": processes, "append_per_s": processes * records / elapsed}
+
+
+def _write_proxy_log(log_path: str, tus: int) -> int:
+    """Write a synthetic log one record per append, as proxies without the daemon do."""
+    invocations = synthetic_invocations(tus)
+    for invocation in invocations:
+        log_invocation(log_path, invocation)
+    return len(invocations)
+
+
+def bench_read(tus: int) -> dict:
+    """read_invocations decode rate for the JSONL and binary formats.
+
+    binary_proxy is a binary log written by the proxies themselves: one
+    small block per record, until `cmakegen compact` re-blocks it.
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, name, write in (("jsonl", "build.jsonl", write_log), ("binary", "build.cglog", write_log),
+                                 ("binary_proxy", "proxy.cglog", _write_proxy_log)):
+            log_path = os.path.join(tmp, name)
+            count = write(log_path, tus)
+            start = time.perf_counter()
+            read_invocations(log_path)
+            result[f"{fmt}_read_per_s"] = count / (time.perf_counter() - start)
+            result[f"{fmt}_bytes_per_record"] = os.path.getsize(log_path) / count
+    return result
+
+
+def run(sizes: dict) -> dict:
+    """Run every benchmark; returns {benchmark: {metric: value}}."""
+    return {
+        "parse": bench_parse_cache.measure(sizes["parse_tus"], sizes["flags"]),
+        "append": bench_append(sizes["append_processes"], sizes["append_records"]),
+        "read": bench_read(sizes["read_tus"]),
+        "generate": {f"generate_{n}_s": bench_generate.measure(n) for n in sizes["generate"]},
+        "proxy": bench_proxy.measure(sizes["proxy_runs"]),
+    }
+
+
+def regressions(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Describe each metric that got worse than `baseline` by more than `tolerance`."""
+    found = []
+    for bench, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(bench, {}).get(name)
+            if not old or name in REFERENCE_METRICS or name in DERIVED_METRICS:
+                continue
+            if name.endswith("_per_s"):
+                change = (old - value) / old
+            elif name.endswith(("_ms", "_s")):
+                change = (value - old) / old
+            else:
+                continue
+            if change > tolerance:
+                found.append(f"{bench}.{name}: {old:.4g} -> {value:.4g} ({change:+.0%} worse)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Small problem sizes, for a smoke test")
+    parser.add_argument("--output", "-o", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown tolerated by --compare (default: 0.2)")
+    args = parser.parse_args()
+
+    sizes = SIZES["quick" if args.quick else "full"]
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "sizes": sizes,
+        "results": run(sizes),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(baseline["results"], report["results"], args.tolerance)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
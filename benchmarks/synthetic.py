@@ -0,0 +1,86 @@
+"""Synthetic build logs shaped like a large C++ project.
+
+    python benchmarks/synthetic.py -o build.jsonl [--tus 10000] [--targets 20]
+        [--include-dirs 40] [--defines 60]
+
+Every TU belongs to one of `targets` libraries or executables. TUs of a
+target share its flags (include dirs, defines, warnings), as with CMake or
+Meson, apart from the -MT/-MF options naming each TU's object and depfile.
+The last target links all the others.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import clear_log, log_invocations
+
+
+def target_flags(target: int, include_dirs: int, defines: int) -> list[str]:
+    """The compile flags shared by the TUs of one target."""
+    return (["-g", "-O2", "-std=c++17", "-Wall", "-Wextra", "-fPIC", "-pthread"]
+            + [f"-I/opt/project/component{target}/include/module{i}" for i in range(include_dirs)]
+            + ["-isystem", "/opt/third_party/include"]
+            + [f"-DFEATURE_{target}_{i}=1" for i in range(defines)]
+            + ["-MD"])
+
+
+def synthetic_argvs(tus: int, targets: int = 20, include_dirs: int = 40,
+                    defines: int = 60) -> list[list[str]]:
+    """Compile command lines for `tus` TUs followed by one link per target."""
+    targets = max(1, min(targets, tus))
+    flags = [target_flags(t, include_dirs, defines) for t in range(targets)]
+    argvs = []
+    objects = [[] for _ in range(targets)]
+    for i in range(tus):
+        t = i % targets
+        obj = f"build/target{t}/file{i}.o"
+        objects[t].append(obj)
+        # Depfile options name the TU's own object, as CMake and Ninja write them
+        argvs.append(flags[t] + ["-MT", obj, "-MF", f"{obj}.d", "-c", "-o", obj, f"src/target{t}/file{i}.cpp"])
+    for t in range(targets - 1):
+        argvs.append(objects[t] + ["-shared", "-o", f"build/libtarget{t}.so"])
+    argvs.append(objects[-1] + ["-Lbuild", "-o", "build/app"]
+                 + [f"-ltarget{t}" for t in range(targets - 1)] + ["-pthread"])
+    return argvs
+
+
+def synthetic_invocations(tus: int, targets: int = 20, include_dirs: int = 40,
+                          defines: int = 60) -> list[dict]:
+    """Parsed invocations of synthetic_argvs(), as the proxies would log them."""
+    invocations = []
+    for argv in synthetic_argvs(tus, targets, include_dirs, defines):
+        invocation = parse_args(argv)
+        invocation["cwd"] = "/opt/project/build"
+        invocations.append(invocation)
+    return invocations
+
+
+def write_log(log_path: str, tus: int, targets: int = 20, include_dirs: int = 40,
+              defines: int = 60, batch_size: int = 4096) -> int:
+    """Write a fresh synthetic log to `log_path`; returns the record count."""
+    clear_log(log_path)
+    invocations = synthetic_invocations(tus, targets, include_dirs, defines)
+    for start in range(0, len(invocations), batch_size):
+        log_invocations(log_path, invocations[start:start + batch_size])
+    return len(invocations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", required=True, help="Log to write (*.cglog for the binary format)")
+    parser.add_argument("--tus", type=int, default=10_000, help="Number of translation units")
+    parser.add_argument("--targets", type=int, default=20, help="Number of targets")
+    parser.add_argument("--include-dirs", type=int, default=40, help="Include directories per target")
+    parser.add_argument("--defines", type=int, default=60, help="Defines per target")
+    args = parser.parse_args()
+
+    count = write_log(args.output, args.tus, args.targets, args.include_dirs, args.defines)
+    print(f"Wrote {count} invocations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
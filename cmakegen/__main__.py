@@ -1,10 +1,21 @@
-"""CLI entry point: python -m cmakegen generate"""
+"""CLI entry point: python -m cmakegen generate|report|analyze|deps|clear|convert|compact|daemon|import|wrappers|wrap"""
 
-import argparse
 import sys
 
-from cmakegen.invocation_log import read_invocations, clear_log, DEFAULT_LOG_PATH
-from cmakegen.cmake_generator import generate_cmake
+if __name__ == "__main__" and sys.argv[1:2] == ["wrap"]:
+    # Runs once per compile: skip argparse and the generator
+    from cmakegen.proxy import wrap
+    wrap(sys.argv[2:])
+
+import argparse
+import json
+import os
+
+from cmakegen.invocation_log import clear_log, convert_log, DEFAULT_LOG_PATH, LOG_FORMATS
+from cmakegen.cmake_generator import COMPILER_LAUNCHERS, LINKERS, aggregate_log
+from cmakegen.output import write_if_changed
+from cmakegen import (analyze, checkpoint, compact, daemon, importer, include_graph, report, speedup, watch,
+                      wrappers)
 
 
 def main():
@@ -14,29 +25,220 @@ def main():
     gen_parser = subparsers.add_parser("generate", help="Generate CMakeLists.txt from the invocation log")
     gen_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
     gen_parser.add_argument("--output", "-o", help="Write output to file instead of stdout")
+    gen_parser.add_argument("--jobs", "-j", type=int, default=0,
+                            help="Processes reading the log (default: one per CPU for large JSONL logs)")
+    gen_parser.add_argument("--incremental", action="store_true",
+                            help="Only read records appended since the last --incremental run (state is kept "
+                                 "next to the log)")
+    gen_parser.add_argument("--unity", action="store_true", help="Unity build targets with several sources (CMake 3.16)")
+    gen_parser.add_argument("--unity-batch-size", type=int, default=0,
+                            help="Sources per unity batch (default: from the logged timings, else 8)")
+    gen_parser.add_argument("--pch", action="store_true",
+                            help="Precompile the headers most sources read, found from their depfiles (CMake 3.16)")
+    gen_parser.add_argument("--pch-threshold", type=float, default=speedup.PCH_MIN_SHARE,
+                            help="Share of a target's sources that must read a header for it to be "
+                                 "precompiled (default: %(default)s)")
+    gen_parser.add_argument("--explain", action="store_true",
+                            help="Explain the --unity and --pch choices on stderr")
+    gen_parser.add_argument("--compiler-launcher", nargs="?", const="auto", choices=COMPILER_LAUNCHERS,
+                            help="Compile through ccache or sccache when the configuring machine has one "
+                                 "(default without a value: auto, the first found)")
+    gen_parser.add_argument("--linker", nargs="?", const="auto", choices=LINKERS,
+                            help="Link with mold, lld or gold when the compiler accepts it (CMake 3.18; "
+                                 "default without a value: auto, the fastest available unless the logged "
+                                 "build chose one)")
+
+    gen_parser.add_argument("--watch", action="store_true",
+                            help="Keep running and rewrite --output whenever the log's records change it")
+    gen_parser.add_argument("--debounce", type=float, default=watch.DEBOUNCE_SECONDS,
+                            help="With --watch, seconds the log must be quiet before regenerating "
+                                 "(default: %(default)s)")
+
+    report_parser = subparsers.add_parser("report", help="Profile a build logged with CMAKEGEN_TIMING=1")
+    report_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+    report_parser.add_argument("--top", type=int, default=10, help="Rows per table")
+    report_parser.add_argument("--jobs", "-j", type=int, default=0, help="Processes reading the log")
+
+    analyze_parser = subparsers.add_parser("analyze", help="Critical path and parallelism of a build logged with "
+                                                           "CMAKEGEN_TIMING=1")
+    analyze_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+    analyze_parser.add_argument("--cores", type=int, default=os.cpu_count(),
+                                help="Cores the build could use (default: this machine's)")
+    analyze_parser.add_argument("--trace", help="Also write a Chrome trace (chrome://tracing) of the build here")
+    analyze_parser.add_argument("--top", type=int, default=10, help="Critical path steps to list")
+    analyze_parser.add_argument("--jobs", "-j", type=int, default=0, help="Processes reading the log")
+
+    deps_parser = subparsers.add_parser("deps", help="Query the include graph of a build logged with CMAKEGEN_DEPS=1")
+    deps_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+    deps_parser.add_argument("--index", help="Path of the index (default: next to the log; rebuilt when older "
+                                             "than the log)")
+    deps_subparsers = deps_parser.add_subparsers(dest="deps_command")
+    deps_subparsers.add_parser("index", help="Rebuild the index")
+    rebuilds_parser = deps_subparsers.add_parser("rebuilds", help="List the TUs that rebuild when a header changes")
+    rebuilds_parser.add_argument("header", help="Path of the header, or the end of it (e.g. foo/bar.h)")
+    top_parser = deps_subparsers.add_parser("top", help="Headers by rebuild cost: fan-out x compile time of the "
+                                                        "TUs reading them")
+    top_parser.add_argument("--top", type=int, default=20, help="Headers to list")
 
     clear_parser = subparsers.add_parser("clear", help="Clear the invocation log")
     clear_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
 
+    convert_parser = subparsers.add_parser("convert", help="Convert an invocation log between JSONL and binary")
+    convert_parser.add_argument("source", help="Log to read (either format)")
+    convert_parser.add_argument("destination", help="Log to write; overwritten if it exists")
+    convert_parser.add_argument("--format", choices=LOG_FORMATS,
+                                help="Output format (default: binary for *.cglog, else jsonl)")
+
+    compact_parser = subparsers.add_parser("compact", help="Drop repeated invocations from the log, keeping the latest")
+    compact_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+
+    daemon_parser = subparsers.add_parser("daemon", help="Run the interception daemon the proxy compilers log through")
+    daemon_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+    daemon_parser.add_argument("--socket", default=daemon.DEFAULT_SOCKET_PATH, help="Path of the Unix socket to listen on")
+    daemon_parser.add_argument("--stop", action="store_true", help="Stop the daemon listening on --socket")
+
+    import_parser = subparsers.add_parser("import", help="Log the commands of a compile_commands.json, `ninja -t commands` "
+                                                         "or `make -n` output without building")
+    import_parser.add_argument("source", help="File to import, or - for stdin")
+    import_parser.add_argument("--log", default=DEFAULT_LOG_PATH, help="Path to the invocation log file")
+    import_parser.add_argument("--format", choices=importer.IMPORT_FORMATS, help="Input format (default: detected)")
+    import_parser.add_argument("--jobs", "-j", type=int, help="Parser processes (default: one per CPU)")
+
+    wrappers_parser = subparsers.add_parser("wrappers", help="Set up a directory of wrappers for every compiler on "
+                                                             "PATH, to put first on PATH during the build")
+    wrappers_parser.add_argument("directory", help="Directory to create or update")
+    wrappers_parser.add_argument("tools", nargs="*", metavar="TOOL",
+                                 help="Tools to wrap, as NAME or NAME=REAL_PATH (default: every compiler and "
+                                      "archiver on PATH)")
+
+    subparsers.add_parser("wrap", help="Log and run one compiler call: wrap <real-compiler> [arguments...]")
+
     args = parser.parse_args()
 
     if args.command == "generate":
-        invocations = read_invocations(args.log)
-        if not invocations:
+        def render(aggregate):
+            plans = None
+            if args.unity or args.pch:
+                plans = speedup.plan_speedups(aggregate, args.unity, args.pch, args.unity_batch_size,
+                                              args.pch_threshold, args.jobs)
+                if args.explain:
+                    print(speedup.format_plan(plans), end="", file=sys.stderr)
+            return aggregate.render(plans, args.compiler_launcher, args.linker)
+
+        if args.watch:
+            if not args.output:
+                gen_parser.error("--watch needs --output")
+            print(f"Watching {args.log}; press Ctrl-C to stop", file=sys.stderr)
+            try:
+                watch.watch(args.log, args.output, render, args.jobs, args.debounce)
+            except KeyboardInterrupt:
+                pass
+            return
+        if args.incremental:
+            aggregate = checkpoint.aggregate_incremental(args.log, args.jobs)
+        else:
+            aggregate = aggregate_log(args.log, args.jobs)
+        if not aggregate.count:
             print("No invocations found in log. Run a build with the proxy compilers first.", file=sys.stderr)
             sys.exit(1)
-        cmake_content = generate_cmake(invocations)
+        cmake_content = render(aggregate)
         if args.output:
-            with open(args.output, "w") as f:
-                f.write(cmake_content)
-            print(f"CMakeLists.txt written to {args.output}")
+            if write_if_changed(args.output, cmake_content):
+                print(f"CMakeLists.txt written to {args.output}")
+            else:
+                print(f"{args.output} is up to date")
         else:
             print(cmake_content)
 
+    elif args.command == "report":
+        text = report.build_report(aggregate_log(args.log, args.jobs), args.top)
+        if text is None:
+            print("No timings found in log. Run a build with CMAKEGEN_TIMING=1 first.", file=sys.stderr)
+            sys.exit(1)
+        print(text, end="")
+
+    elif args.command == "analyze":
+        graph = analyze.build_graph(aggregate_log(args.log, args.jobs))
+        if not len(graph):
+            print("No timings found in log. Run a build with CMAKEGEN_TIMING=1 first.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            result = analyze.analyze(graph, args.cores)
+        except ValueError as e:
+            print(f"Cannot analyze {args.log}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(analyze.format_analysis(graph, result, args.top), end="")
+        if args.trace:
+            with open(args.trace, "w") as f:
+                json.dump(analyze.chrome_trace(graph, result["critical_path"]), f)
+            print(f"Chrome trace written to {args.trace}")
+
+    elif args.command == "deps":
+        if args.deps_command is None:
+            deps_parser.print_help()
+            sys.exit(1)
+        if args.deps_command == "index":
+            tus, edges = include_graph.build_index(args.log, args.index)
+            print(f"Indexed {edges} includes of {tus} TUs")
+            return
+        conn = include_graph.open_index(args.log, args.index)
+        tus, headers = include_graph.index_summary(conn)
+        if not tus:
+            print("No header dependencies found in log. Run a build with CMAKEGEN_DEPS=1 first.", file=sys.stderr)
+            sys.exit(1)
+        if args.deps_command == "rebuilds":
+            matches = include_graph.find_headers(conn, args.header)
+            if len(matches) != 1:
+                print(f"{len(matches) or 'No'} indexed headers match {args.header}"
+                      + "".join(f"\n  {m}" for m in matches[:20]), file=sys.stderr)
+                sys.exit(1)
+            rebuilt = include_graph.rebuilt_by(conn, matches[0])
+            for source, _ in rebuilt:
+                print(source)
+            seconds = sum(ms for _, ms in rebuilt if ms) / 1000
+            print(f"{len(rebuilt)} of {tus} TUs read {matches[0]} ({seconds:.1f} s of compile time)",
+                  file=sys.stderr)
+        else:
+            print(include_graph.format_costliest(include_graph.costliest_headers(conn, args.top), tus, headers),
+                  end="")
+
     elif args.command == "clear":
         clear_log(args.log)
         print("Log cleared.")
 
+    elif args.command == "convert":
+        count = convert_log(args.source, args.destination, args.format)
+        print(f"Converted {count} invocations to {args.destination}")
+
+    elif args.command == "compact":
+        total, kept = compact.compact_log(args.log)
+        print(f"Kept {kept} of {total} invocations in {args.log}")
+
+    elif args.command == "daemon":
+        if args.stop:
+            if not daemon.stop(args.socket):
+                print(f"No daemon listening on {args.socket}.", file=sys.stderr)
+                sys.exit(1)
+        else:
+            daemon.serve(args.socket, args.log)
+
+    elif args.command == "import":
+        count = importer.import_file(args.source, args.log, args.format, args.jobs)
+        print(f"Imported {count} invocations into {args.log}")
+
+    elif args.command == "wrappers":
+        tools = None
+        if args.tools:
+            names = [t for t in args.tools if "=" not in t]
+            tools = wrappers.find_tools(names, exclude=args.directory)
+            missing = [name for name in names if name not in tools]
+            if missing:
+                print(f"Not found on PATH: {' '.join(missing)}", file=sys.stderr)
+                sys.exit(1)
+            tools.update(t.split("=", 1) for t in args.tools if "=" in t)
+        tools = wrappers.install_wrappers(args.directory, tools)
+        print(f"Wrapped {len(tools)} tools in {args.directory}: {' '.join(sorted(tools))}")
+
     else:
         parser.print_help()
         sys.exit(1)
@@ -0,0 +1,212 @@
+"""Compact binary encoding for the invocation log.
+
+A binary log is a sequence of self-contained blocks, each appended with a
+single write just like a JSONL record:
+
+    b"CGB1" | u32 payload size | zlib(u32 table size | u32 value words
+                                     | string table | value words | record words)
+
+Everything in a block is interned. The string table holds every distinct
+string (keys, paths, flags) once, NUL-separated. The value table holds every
+distinct field value once as a type tag plus its payload, e.g. the list of
+string indexes for an include path list shared by thousands of TUs. A record
+is then just its field count followed by (key, value) index pairs.
+
+A proxy writes one-record blocks; the daemon, `cmakegen convert` and
+`cmakegen compact` write large blocks, where interning pays off most.
+Decoding builds each distinct value once and assembles records from index
+pairs, so a log of large blocks decodes considerably faster than
+json.loads on the equivalent JSONL. One-record blocks are the exception:
+their fixed cost per block makes them slower to read than JSONL lines,
+which is why a proxy-written log is best compacted before it is read.
+"""
+
+import struct
+import sys
+import zlib
+from _collections_abc import Iterator
+from array import array
+
+from cmakegen.invocation_log import BINARY_MAGIC, _dumps
+
+MAGIC = BINARY_MAGIC
+HEADER = struct.Struct("<4sI")
+PAYLOAD_HEADER = struct.Struct("<II")
+
+_WORD = "I" if array("I").itemsize == 4 else "L"
+_SWAP = sys.byteorder == "big"
+
+# Value type tags
+_NONE, _FALSE, _TRUE, _STR, _LIST, _INT, _JSON = range(7)
+_MAX_WORD = 0xFFFFFFFF
+
+
+def encode_block(invocations: list[dict]) -> bytes:
+    """Encode invocations as one binary log block."""
+    strings = {}
+    values = {}
+    value_words = array(_WORD)
+    record_words = array(_WORD)
+
+    def intern(s):
+        index = strings.get(s)
+        if index is None:
+            index = strings[s] = len(strings)
+        return index
+
+    def intern_value(value):
+        if value is None:
+            key = encoded = (_NONE,)
+        elif value is True:
+            key = encoded = (_TRUE,)
+        elif value is False:
+            key = encoded = (_FALSE,)
+        elif isinstance(value, str) and "\0" not in value:
+            key = (_STR, value)
+            encoded = (_STR, intern(value))
+        elif isinstance(value, list) and all(isinstance(v, str) and "\0" not in v for v in value):
+            key = (_LIST,) + tuple(value)
+            encoded = (_LIST, len(value)) + tuple([intern(v) for v in value])
+        elif isinstance(value, int) and 0 <= value <= _MAX_WORD:
+            key = encoded = (_INT, value)
+        else:
+            text = _dumps(value)
+            key = (_JSON, text)
+            encoded = (_JSON, intern(text))
+        index = values.get(key)
+        if index is None:
+            index = values[key] = len(values)
+            value_words.extend(encoded)
+        return index
+
+    for inv in invocations:
+        record_words.append(len(inv))
+        for key, value in inv.items():
+            record_words.append(intern(key))
+            record_words.append(intern_value(value))
+
+    table = "\0".join(strings).encode("utf-8")
+    if _SWAP:
+        value_words.byteswap()
+        record_words.byteswap()
+    payload = zlib.compress(
+        PAYLOAD_HEADER.pack(len(table), len(value_words)) + table
+        + value_words.tobytes() + record_words.tobytes(), 1)
+    return HEADER.pack(MAGIC, len(payload)) + payload
+
+
+def _decode_values(words: array, strings: list[str]) -> list:
+    values = []
+    i = 0
+    n = len(words)
+    while i < n:
+        tag = words[i]
+        if tag == _LIST:
+            count = words[i + 1]
+            values.append([strings[w] for w in words[i + 2:i + 2 + count]])
+            i += 2 + count
+            continue
+        if tag == _STR:
+            values.append(strings[words[i + 1]])
+        elif tag == _INT:
+            values.append(words[i + 1])
+        elif tag == _JSON:
+            import json
+            values.append(json.loads(strings[words[i + 1]]))
+        elif tag == _NONE:
+            values.append(None)
+            i += 1
+            continue
+        elif tag == _FALSE:
+            values.append(False)
+            i += 1
+            continue
+        elif tag == _TRUE:
+            values.append(True)
+            i += 1
+            continue
+        else:
+            raise ValueError(f"unknown value tag {tag} in binary log block")
+        i += 2
+    return values
+
+
+def decode_block(payload: bytes) -> list[dict]:
+    """Decode the payload of one block (everything after its header)."""
+    raw = zlib.decompress(payload)
+    table_size, value_word_count = PAYLOAD_HEADER.unpack_from(raw)
+    start = PAYLOAD_HEADER.size
+    strings = raw[start:start + table_size].decode("utf-8").split("\0")
+    start += table_size
+    value_words = array(_WORD)
+    value_words.frombytes(raw[start:start + 4 * value_word_count])
+    record_words = array(_WORD)
+    record_words.frombytes(raw[start + 4 * value_word_count:])
+    if _SWAP:
+        value_words.byteswap()
+        record_words.byteswap()
+
+    values = _decode_values(value_words, strings)
+    # Values are shared between records; copy mutable ones so records stay
+    # independent, as with json.loads.
+    is_list = [isinstance(v, (list, dict)) for v in values]
+    invocations = []
+    i = 0
+    n = len(record_words)
+    while i < n:
+        end = i + 1 + 2 * record_words[i]
+        invocations.append({
+            strings[k]: (values[v].copy() if is_list[v] else values[v])
+            for k, v in zip(record_words[i + 1:end:2], record_words[i + 2:end:2])
+        })
+        i = end
+    return invocations
+
+
+def _find_magic(f, pos: int):
+    """Offset of the first block header at or after `pos` in `f`, or None."""
+    f.seek(pos)
+    while True:
+        chunk = f.read(1 << 20)
+        if len(chunk) < len(MAGIC):
+            return None
+        found = chunk.find(MAGIC)
+        if found >= 0:
+            return pos + found
+        # Keep the tail, in case a header straddles two chunks
+        pos += len(chunk) - len(MAGIC) + 1
+        f.seek(pos)
+
+
+def read_blocks(f, name: str = "binary log") -> Iterator[tuple[int, list[dict]]]:
+    """Yield (offset after the block, its invocations) for each block in `f`.
+
+    Reading starts at the current position. A damaged block (say, one cut
+    short by a killed writer with others appended after it) is skipped with
+    a warning and reading resumes at the next block header. Raises EOFError
+    if the final block is damaged or cut short.
+    """
+    while True:
+        start = f.tell()
+        header = f.read(HEADER.size)
+        if not header:
+            return
+        invocations = None
+        if len(header) == HEADER.size:
+            magic, size = HEADER.unpack(header)
+            if magic == MAGIC:
+                payload = f.read(size)
+                if len(payload) == size:
+                    try:
+                        invocations = decode_block(payload)
+                    except (zlib.error, struct.error, ValueError, IndexError):
+                        pass
+        if invocations is not None:
+            yield f.tell(), invocations
+            continue
+        resume = _find_magic(f, start + 1)
+        if resume is None:
+            raise EOFError
+        import warnings
+        warnings.warn(f"{name}: skipping {resume - start} damaged bytes at offset {start}")
+        f.seek(resume)
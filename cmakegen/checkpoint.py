@@ -0,0 +1,136 @@
+"""Saved generate state, so repeated runs only read what was appended to the log.
+
+A checkpoint holds the BuildAggregate of the first `offset` bytes of a log
+and is stored next to it (log path + CHECKPOINT_SUFFIX). It is only reused
+while it still describes the log: the same file (device and inode), at
+least `offset` bytes long, with the same bytes at its start and just before
+`offset`. Truncating, clearing or replacing the log invalidates it.
+"""
+
+import hashlib
+import os
+import pickle
+from typing import Optional
+
+from cmakegen.cmake_generator import BuildAggregate, aggregate_log
+from cmakegen.invocation_log import CHECKPOINT_SUFFIX, complete_size, is_binary_log, iter_invocations_from
+
+CHECKPOINT_VERSION = 2
+_FINGERPRINT_SIZE = 4096
+
+
+def checkpoint_path(log_path: str) -> str:
+    return log_path + CHECKPOINT_SUFFIX
+
+
+def _fingerprint(f, offset: int) -> str:
+    """Hash of the log's first and last few KiB before `offset`."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    digest.update(f.read(min(offset, _FINGERPRINT_SIZE)))
+    start = max(0, offset - _FINGERPRINT_SIZE)
+    f.seek(start)
+    digest.update(f.read(offset - start))
+    return digest.hexdigest()
+
+
+def load_checkpoint(log_path: str) -> Optional[tuple[BuildAggregate, int]]:
+    """Return (aggregate, offset) if a checkpoint still matching the log exists."""
+    try:
+        with open(checkpoint_path(log_path), "rb") as f:
+            state = pickle.load(f)
+        with open(log_path, "rb") as log:
+            st = os.fstat(log.fileno())
+            if (state["version"] != CHECKPOINT_VERSION
+                    or (state["device"], state["inode"]) != (st.st_dev, st.st_ino)
+                    or st.st_size < state["offset"]
+                    or _fingerprint(log, state["offset"]) != state["fingerprint"]):
+                return None
+    except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        return None
+    return state["aggregate"], state["offset"]
+
+
+def _interned(aggregate: BuildAggregate) -> BuildAggregate:
+    """A copy of `aggregate` in which equal strings and lists are one object.
+
+    Most TUs share their include paths, defines and so on; pickle stores a
+    shared object once, which makes the checkpoint several times smaller
+    and faster to load. The invocations of an aggregate are never modified,
+    so sharing their values is safe.
+    """
+    pool = {}
+    copies = {}
+
+    def intern(inv):
+        copy = copies.get(id(inv))
+        if copy is None:
+            copy = copies[id(inv)] = {}
+            for key, value in inv.items():
+                if value.__class__ is list:
+                    value = pool.setdefault(tuple(value), value)
+                elif value.__class__ is str:
+                    value = pool.setdefault(value, value)
+                copy[key] = value
+        return copy
+
+    interned = BuildAggregate()
+    interned.count = aggregate.count
+    interned.compiles = {obj: (src, intern(inv)) for obj, (src, inv) in aggregate.compiles.items()}
+    interned.links = {output: intern(inv) for output, inv in aggregate.links.items()}
+    return interned
+
+
+def save_checkpoint(log_path: str, aggregate: BuildAggregate, offset: int) -> None:
+    """Record that `aggregate` covers the first `offset` bytes of the log."""
+    with open(log_path, "rb") as log:
+        st = os.fstat(log.fileno())
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "device": st.st_dev,
+            "inode": st.st_ino,
+            "offset": offset,
+            "fingerprint": _fingerprint(log, offset),
+            "aggregate": _interned(aggregate),
+        }
+    path = checkpoint_path(log_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def aggregate_incremental(log_path: str, jobs: int = 0) -> BuildAggregate:
+    """Aggregate the log, reading only the records appended since the last call.
+
+    Without a valid checkpoint the whole log is read (with `jobs` workers,
+    see aggregate_log). A final record still being written is included in
+    the result but not in the checkpoint, so the next call reads it again.
+    """
+    if not os.path.exists(log_path):
+        if os.path.exists(checkpoint_path(log_path)):
+            os.remove(checkpoint_path(log_path))
+        return BuildAggregate()
+
+    loaded = load_checkpoint(log_path)
+    if loaded is not None:
+        aggregate, offset = loaded
+    elif is_binary_log(log_path):
+        aggregate, offset = BuildAggregate(), 0
+    else:
+        offset = complete_size(log_path)
+        aggregate = aggregate_log(log_path, jobs, end=offset)
+
+    start = offset
+    unfinished = []
+    for end, invocation in iter_invocations_from(log_path, offset):
+        if end is None:
+            unfinished.append(invocation)
+            continue
+        aggregate.add(invocation)
+        offset = end
+    if loaded is None or offset != start:
+        save_checkpoint(log_path, aggregate, offset)
+    for invocation in unfinished:
+        aggregate.add(invocation)
+    return aggregate
@@ -1,174 +1,636 @@
 """Read aggregated invocations and produce CMakeLists.txt content."""
 
 import os
+import shlex
+from collections import Counter
+from typing import Iterable, Optional
+
+from cmakegen.flag_parser import SEPARATE_ARG_OPTIONS
+from cmakegen.invocation_log import is_binary_log, iter_invocations, split_log
+
+LIBRARY_KINDS = ("STATIC", "SHARED")
+# Name of the OBJECT libraries holding objects several targets link
+SHARED_OBJECTS_NAME = "shared_objects"
+# Logs smaller than this are aggregated serially when the job count is automatic
+PARALLEL_MIN_LOG_SIZE = 32 << 20
+# -x value -> CMake LANGUAGE source property
+_LANGUAGES = {"c": "C", "c++": "CXX"}
+# Options that stop the compiler driver before it writes an object or links
+_NO_BUILD_FLAGS = {"-E", "-S", "--version", "-dumpversion", "-dumpfullversion", "-dumpmachine",
+                  "-print-search-dirs", "-print-sysroot"}
+# Linker flags CMake adds to every link itself (on macOS)
+_CMAKE_LINKER_FLAGS = ("-Wl,-search_paths_first", "-Wl,-headerpad_max_install_names")
+# generate_cmake(compiler_launcher=...) values; "auto" takes the first found
+COMPILER_LAUNCHERS = ("auto", "ccache", "sccache")
+# generate_cmake(linker=...) values; "auto" takes the first the compiler accepts
+LINKERS = ("auto", "mold", "lld", "gold")
+
+
+class BuildAggregate:
+    """Compile and link steps accumulated from invocations.
+
+    Invocations are folded in one at a time with add(), so memory is bounded
+    by the number of distinct objects and link outputs rather than by the
+    length of the log. Compile steps are keyed by the object file they
+    produce and link steps (including ar steps) by their output, both as
+    absolute paths, so main.o built in two directories is two objects. A
+    repeated step (e.g. from an incremental rebuild) replaces the earlier
+    one but keeps its position. Repeated ar steps add to the members of the archive
+    instead, since archives are often built by several ar calls. The
+    object -> target graph is resolved in render(), which is why the log
+    may be consumed in a single pass.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.compiles = {}  # absolute object path -> (source file, compile invocation)
+        self.links = {}     # absolute output path -> link invocation
+
+    def add(self, inv: dict) -> None:
+        """Fold one parsed invocation into the aggregate.
+
+        Calls that build nothing, such as the `cc --version` and `cc -E`
+        probes of configure scripts or a `-c -E` preprocessing run, are left
+        out (and not counted).
+        """
+        if _builds_nothing(inv):
+            return
+        if inv.get("compile_only"):
+            self.count += 1
+            sources = inv.get("source_files", [])
+            for src in sources:
+                self.compiles[_absolute(inv, _object_key(inv, src, len(sources)))] = (src, inv)
+        elif _is_link(inv):
+            self.count += 1
+            output = _absolute(inv, inv.get("output") or "a.out")
+            self.links[output] = _archive_union(self.links.get(output), inv)
+
+    def merge(self, later: "BuildAggregate") -> None:
+        """Fold in an aggregate of invocations that came after this one's.
+
+        The result is the same as if every invocation had been add()ed here,
+        in order: a repeated key keeps its first position and takes the
+        later value, which is exactly what dict.update does (apart from the
+        members of archives, which accumulate).
+        """
+        self.count += later.count
+        self.compiles.update(later.compiles)
+        links = self.links
+        for output, inv in later.links.items():
+            links[output] = _archive_union(links.get(output), inv)
+
+    def targets(self) -> list["Target"]:
+        """Resolve the object -> target graph into targets, in log order.
+
+        Every link and ar step becomes a target owning the sources of the
+        objects it links. Objects several targets link are compiled once, in
+        an OBJECT library those targets use. Compiled objects no link step
+        refers to are attributed to the first target, and without any link
+        step all sources form a single executable named "project". Static
+        and shared libraries another link step names as a file are linked
+        to it as targets.
+        """
+        targets = []
+        names = set()
+        object_targets = {}
+        outputs = {}
+        for output, link in self.links.items():
+            kind = _target_kind(link)
+            target = Target(_unique_name(_target_name(output, kind), names), kind, link)
+            targets.append(target)
+            outputs[output] = target.name
+            for obj in link.get("object_files", []):
+                object_targets.setdefault(_absolute(link, obj), []).append(target)
+
+        if not targets:
+            targets.append(Target("project", "EXECUTABLE", None))
+
+        for target in targets:
+            for path in (target.link or {}).get("library_files", []):
+                name = outputs.get(_absolute(target.link, path))
+                target.library_targets.append(name if name is not None and name != target.name
+                                              else _absolute(target.link, path))
+
+        # Attribute compiles in log order so sources keep their compile order
+        object_libraries = {}  # consumer targets -> OBJECT library
+        for obj, (src, inv) in self.compiles.items():
+            owners = object_targets.get(obj) or targets[:1]
+            if len(owners) > 1:
+                consumers = tuple(dict.fromkeys(owners))
+                library = object_libraries.get(consumers)
+                if library is None:
+                    library = Target(_unique_name(SHARED_OBJECTS_NAME, names), "OBJECT", None)
+                    object_libraries[consumers] = library
+                    for consumer in consumers:
+                        consumer.object_libraries.append(library.name)
+                owners = [library]
+            for target in owners:
+                target.add_source(src, inv)
+        targets.extend(object_libraries.values())
+
+        # Sources compiled and linked in the same step
+        for target in targets:
+            if target.link:
+                for src in target.link.get("source_files", []):
+                    target.add_source(src, target.link)
+        return targets
+
+    def render(self, plans: Optional[dict] = None, compiler_launcher: Optional[str] = None,
+               linker: Optional[str] = None) -> str:
+        """Produce the CMakeLists.txt content for everything added so far.
+
+        `plans` maps target names to speedup.TargetPlan settings (unity
+        build, precompiled headers) to apply on top of the logged flags.
+        `compiler_launcher` (one of COMPILER_LAUNCHERS) compiles through
+        ccache or sccache when the configuring machine has one. `linker`
+        (one of LINKERS) links with a faster linker than the default; with
+        "auto", a linker the logged build chose with -fuse-ld= is kept.
+        """
+        targets = self.targets()
+        std = self._std()
+        plans = plans or {}
+        # Source properties are per directory: sources of several targets need theirs guarded
+        counts = Counter(src for target in targets for src in target.sources)
+        shared_sources = {src for src, count in counts.items() if count > 1}
+        target_lines = []
+        for target in targets:
+            target_lines.extend(target.render(std, plans.get(target.name), linker, shared_sources))
+        version = max(target.cmake_version for target in targets)
+        speedup_lines = []
+        if compiler_launcher:
+            pch = any(plan.precompile_headers for plan in plans.values())
+            speedup_lines.extend(_launcher_lines(compiler_launcher, pch))
+        if linker:
+            linker_lines = self._linker_lines(linker)
+            if linker_lines:
+                speedup_lines.extend(linker_lines)
+                version = max(version, (3, 18))
+
+        # Build CMakeLists.txt
+        lines = []
+        lines.append(f"cmake_minimum_required(VERSION {version[0]}.{version[1]})")
+        sysroot = self._sysroot()
+        if sysroot:
+            # Must be known before project() probes the compiler
+            lines.append(f"set(CMAKE_SYSROOT {sysroot})")
+        lines.append(f"project({targets[0].name})")
+
+        std_setting = _std_setting(std)
+        if std_setting:
+            lang, num = std_setting
+            lines.append(f"set(CMAKE_{lang}_STANDARD {num})")
+            if not std.startswith("gnu"):
+                # CMake defaults to the GNU dialect (e.g. -std=gnu++17)
+                lines.append(f"set(CMAKE_{lang}_EXTENSIONS OFF)")
+
+        lines.extend(speedup_lines)
+        lines.extend(target_lines)
+        return "\n".join(lines) + "\n"
+
+    def _std(self):
+        for _, inv in self.compiles.values():
+            if inv.get("std"):
+                return inv["std"]
+        for inv in self.links.values():
+            if inv.get("source_files") and inv.get("std"):
+                return inv["std"]
+        return None
+
+    def _linker_lines(self, linker: str) -> list[str]:
+        """Pick the first of the candidate linkers the compiler accepts, at configure time."""
+        if linker == "auto":
+            if any(link.get("linker") for link in self.links.values()):
+                return []
+            candidates = [name for name in LINKERS if name != "auto"]
+        else:
+            candidates = [linker]
+        language = "C" if all(_source_language(src, inv) == "C"
+                              for src, inv in self.compiles.values()) else "CXX"
+        lines = ["include(CheckLinkerFlag)",
+                 f"set(CMAKEGEN_LINKERS {' '.join(candidates)})"]
+        if any(link.get("lto") for link in self.links.values()):
+            # The link step does the LTO code generation, through a linker plugin
+            lines.extend([f'if(CMAKE_{language}_COMPILER_ID STREQUAL "GNU")',
+                          "  list(REMOVE_ITEM CMAKEGEN_LINKERS lld)",
+                          "else()",
+                          "  list(REMOVE_ITEM CMAKEGEN_LINKERS gold)",
+                          "endif()"])
+        lines.extend(["foreach(linker IN LISTS CMAKEGEN_LINKERS)",
+                      f"  check_linker_flag({language} -fuse-ld=${{linker}} CMAKEGEN_HAVE_LINKER_${{linker}})",
+                      "  if(CMAKEGEN_HAVE_LINKER_${linker})",
+                      "    add_link_options(-fuse-ld=${linker})",
+                      "    break()",
+                      "  endif()",
+                      "endforeach()"])
+        return lines
+
+    def _sysroot(self):
+        for _, inv in self.compiles.values():
+            if inv.get("sysroot"):
+                return inv["sysroot"]
+        for inv in self.links.values():
+            if inv.get("sysroot"):
+                return inv["sysroot"]
+        return None
+
+
+class Target:
+    """One executable or library and the compile steps of its sources."""
+
+    def __init__(self, name: str, kind: str, link: Optional[dict]):
+        self.name = name
+        self.kind = kind  # "EXECUTABLE" or one of LIBRARY_KINDS
+        self.link = link
+        self.sources = {}  # basename -> source path
+        self.compiles = {}  # source path -> compile invocation
+        self.object_libraries = []  # OBJECT libraries whose objects this target links
+        self.library_targets = []   # targets or paths of the library files it links
+        self.cmake_version = (3, 10)  # minimum needed by render()
+
+    def add_source(self, src: str, inv: dict) -> None:
+        basename = os.path.basename(src)
+        if basename not in self.sources:
+            self.sources[basename] = src
+            self.compiles[src] = inv
+
+    def profiles(self, std: Optional[str] = None) -> tuple[dict, tuple]:
+        """({source: _compile_profile()}, the parts of the profile every source shares)."""
+        profiles = {src: _compile_profile(inv, std) for src, inv in self.compiles.items()}
+        return profiles, tuple(_common([p[i] for p in profiles.values()]) for i in range(4))
+
+    def uniform_sources(self, std: Optional[str] = None) -> list[str]:
+        """Sources built with exactly the target's flags, i.e. without source properties."""
+        profiles, common = self.profiles(std)
+        return [src for src, profile in profiles.items()
+                if all(len(values) == len(shared) for values, shared in zip(profile, common))]
+
+    def render(self, std: Optional[str] = None, plan=None, linker: Optional[str] = None,
+               shared_sources: Iterable[str] = ()) -> list[str]:
+        """CMake commands declaring this target.
+
+        Flags every source was compiled with go on the target; flags only
+        some sources had are set on just those sources, so each TU is built
+        with exactly the flags it was intercepted with. `std` is the project
+        wide -std= value, which needs no per-source flag. `plan` is an
+        optional speedup.TargetPlan. A `linker` other than None or "auto"
+        replaces the logged -fuse-ld= option. The flags of `shared_sources`,
+        which other targets compile too, are appended to the source
+        properties guarded to apply to this target only.
+        """
+        name = self.name
+        profiles, (include_dirs, system_dirs, defines, compile_opts) = self.profiles(std)
+        pthread = any(inv.get("pthread") for inv in self.compiles.values())
+
+        link = self.link or {}
+        libraries = dict.fromkeys(link.get("libraries", []))
+        lib_dirs = dict.fromkeys(link.get("lib_dirs", []))
+        link_opts = _link_options(link, keep_linker=linker in (None, "auto"))
+        pthread = pthread or link.get("pthread", False)
+
+        lines = []
+        sources = " ".join([*self.sources, *(f"$<TARGET_OBJECTS:{o}>" for o in self.object_libraries)])
+        if self.kind == "EXECUTABLE":
+            lines.append(f"add_executable({name} {sources})")
+        else:
+            lines.append(f"add_library({name} {self.kind} {sources})")
+
+        if include_dirs:
+            dirs_str = " ".join(include_dirs)
+            lines.append(f"target_include_directories({name} PRIVATE {dirs_str})")
+
+        if system_dirs:
+            dirs_str = " ".join(system_dirs)
+            lines.append(f"target_include_directories({name} SYSTEM PRIVATE {dirs_str})")
+
+        if defines:
+            defs_str = " ".join(defines)
+            lines.append(f"target_compile_definitions({name} PRIVATE {defs_str})")
+
+        if self.library_targets or libraries or pthread:
+            libs = [*dict.fromkeys(_cmake_arg(t) for t in self.library_targets), *libraries]
+            if pthread and "pthread" not in libs:
+                libs.append("pthread")
+            libs_str = " ".join(libs)
+            lines.append(f"target_link_libraries({name} PRIVATE {libs_str})")
+
+        if lib_dirs:
+            dirs_str = " ".join(lib_dirs)
+            lines.append(f"target_link_directories({name} PRIVATE {dirs_str})")
+
+        versions = _library_versions(name, link.get("output"), link.get("soname")) if self.kind == "SHARED" else ""
+        if versions:
+            lines.append(f"set_target_properties({name} PROPERTIES {versions})")
+
+        if link_opts:
+            opts_str = " ".join(_cmake_arg(o) for o in link_opts)
+            lines.append(f"target_link_options({name} PRIVATE {opts_str})")
+            self.cmake_version = max(self.cmake_version, (3, 13))
+
+        if compile_opts:
+            opts_str = " ".join(_cmake_arg(o) for o in compile_opts)
+            lines.append(f"target_compile_options({name} PRIVATE {opts_str})")
+
+        for src, (src_dirs, src_system_dirs, src_defines, src_opts) in profiles.items():
+            # Per-source properties have no SYSTEM flag; pass -isystem directly
+            src_opts = [f"-isystem{d}" for d in src_system_dirs if d not in system_dirs] + src_opts
+            properties = []
+            basename = os.path.basename(src)
+            shared = basename in shared_sources
+            for prop, values, common in (("INCLUDE_DIRECTORIES", src_dirs, include_dirs),
+                                         ("COMPILE_DEFINITIONS", src_defines, defines),
+                                         ("COMPILE_OPTIONS", src_opts, compile_opts)):
+                extra = [v for v in values if v not in common]
+                if prop == "COMPILE_OPTIONS":
+                    # Source properties don't understand SHELL: (nor de-duplicate)
+                    extra = [part for v in extra
+                             for part in (shlex.split(v[6:]) if v.startswith("SHELL:") else [v])]
+                if extra and shared:
+                    guarded = _cmake_list([_for_target(name, v) for v in extra])
+                    lines.append(f"set_property(SOURCE {basename} APPEND PROPERTY {prop} {guarded})")
+                    self.cmake_version = max(self.cmake_version, (3, 11))
+                elif extra:
+                    properties.append(f"{prop} {_cmake_list(extra)}")
+            language = _LANGUAGES.get(self.compiles[src].get("language"))
+            if language:
+                properties.append(f"LANGUAGE {language}")
+            if properties:
+                lines.append(f"set_source_files_properties({basename} PROPERTIES {' '.join(properties)})")
+                self.cmake_version = max(self.cmake_version, (3, 11))
+
+        if plan is not None and plan.unity_batch_size:
+            lines.append(f"set_target_properties({name} PROPERTIES UNITY_BUILD ON "
+                         f"UNITY_BUILD_BATCH_SIZE {plan.unity_batch_size})")
+            self.cmake_version = max(self.cmake_version, (3, 16))
+
+        if plan is not None and plan.precompile_headers:
+            headers_str = " ".join(_cmake_arg(h) for h in plan.precompile_headers)
+            lines.append(f"target_precompile_headers({name} PRIVATE {headers_str})")
+            self.cmake_version = max(self.cmake_version, (3, 16))
+
+        if any(o.startswith("SHELL:") for o in [*compile_opts, *link_opts]):
+            self.cmake_version = max(self.cmake_version, (3, 12))
+        return lines
+
+
+def _compile_profile(inv: dict, std: Optional[str]) -> tuple[list, list, list, list]:
+    """(include dirs, system include dirs, defines, other compile options) of one compile step.
+
+    Dependency file options (-MD, -MF ...) are left out; CMake generates its own.
+    """
+    opts = []
+    if inv.get("std") and inv["std"] != std:
+        opts.append(f"-std={inv['std']}")
+    for w in inv.get("warnings", []):
+        opts.append(f"-W{w}")
+    if inv.get("debug"):
+        opts.append("-g")
+    if inv.get("optimization"):
+        opts.append(f"-O{inv['optimization']}")
+    if inv.get("pic"):
+        opts.append("-fPIC")
+    opts.extend(_shell_options(inv.get("machine_flags", [])))
+    if inv.get("lto"):
+        opts.append(inv["lto"])
+    opts.extend(f"SHELL:-include {_shell_quote(f)}" for f in inv.get("forced_includes", []))
+    opts.extend(_shell_options(f for f in inv.get("other_flags", []) if f != "-shared"))
+    return (list(dict.fromkeys(inv.get("include_dirs", []))),
+            list(dict.fromkeys(inv.get("system_include_dirs", []))),
+            list(dict.fromkeys(inv.get("defines", []))),
+            list(dict.fromkeys(opts)))
+
+
+def _link_options(link: dict, keep_linker: bool = True) -> list[str]:
+    """Options of a link step that affect code generation or the linker driver.
+
+    -march and -flto go on the link too: with LTO the link step generates
+    the code. The -Wl,/-Xlinker flags become one LINKER: option, which keeps
+    them in order and stops CMake from de-duplicating repeated ones (say
+    the -rpath of two -Xlinker -rpath -Xlinker <dir> pairs).
+    """
+    opts = _shell_options(link.get("machine_flags", []))
+    if link.get("lto"):
+        opts.append(link["lto"])
+    if link.get("linker") and keep_linker:
+        opts.append(f"-fuse-ld={link['linker']}")
+    opts.extend(_shell_options(f for f in link.get("other_flags", []) if f != "-shared"))
+    linker_flags = [f[len("-Wl,"):] for f in link.get("linker_flags", [])
+                    if f not in _CMAKE_LINKER_FLAGS]
+    if linker_flags:
+        opts.append("LINKER:" + ",".join(linker_flags))
+    return list(dict.fromkeys(opts))
+
+
+def _shell_options(flags: Iterable[str]) -> list[str]:
+    """Keep options and their separate values together, e.g. "SHELL:-arch arm64".
+
+    CMake de-duplicates compile and link options one by one, which would
+    break up repeated pairs like -Xclang <arg>; a SHELL: group stays whole.
+    """
+    opts = []
+    flags = iter(flags)
+    for flag in flags:
+        if flag in SEPARATE_ARG_OPTIONS:
+            value = next(flags, None)
+            if value is not None:
+                flag = f"SHELL:{flag} {_shell_quote(value)}"
+        opts.append(flag)
+    return opts
+
+
+def _shell_quote(value: str) -> str:
+    """Quote a value inside a SHELL: option group if needed."""
+    if not value or any(c.isspace() or c in "\"'\\" for c in value):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return value
+
+
+def _launcher_lines(launcher: str, pch: bool) -> list[str]:
+    """Compile through ccache/sccache if the configuring machine has it."""
+    names = " ".join(n for n in COMPILER_LAUNCHERS if n != "auto") if launcher == "auto" else launcher
+    command = "${CMAKEGEN_COMPILER_LAUNCHER}"
+    if pch:
+        # Without this ccache won't cache TUs that use a precompiled header
+        command = "${CMAKE_COMMAND} -E env CCACHE_SLOPPINESS=pch_defines,time_macros " + command
+    return [f"find_program(CMAKEGEN_COMPILER_LAUNCHER NAMES {names})",
+            "if(CMAKEGEN_COMPILER_LAUNCHER)",
+            f"  set(CMAKE_C_COMPILER_LAUNCHER {command})",
+            f"  set(CMAKE_CXX_COMPILER_LAUNCHER {command})",
+            "endif()"]
+
+
+def _source_language(src: str, inv: dict) -> str:
+    """CMake language of a source, C or CXX, from -x or else its extension."""
+    if inv.get("language"):
+        return "C" if inv["language"] == "c" else "CXX"
+    return "C" if src.endswith(".c") else "CXX"
+
+
+def _common(lists: list[list]) -> dict:
+    """Items present in every list, as an ordered set in first-list order."""
+    if not lists:
+        return {}
+    shared = set(lists[0]).intersection(*lists[1:])
+    return {item: None for item in lists[0] if item in shared}
+
+
+def _cmake_list(items: list[str]) -> str:
+    """Quote items as a CMake ;-list argument."""
+    return '"' + ";".join(item.replace("\\", "\\\\").replace('"', '\\"') for item in items) + '"'
+
+
+def _for_target(name: str, value: str) -> str:
+    """`value` as a generator expression that is empty except when compiling target `name`."""
+    for char, escape in ((">", "$<ANGLE-R>"), (",", "$<COMMA>"), (";", "$<SEMICOLON>")):
+        value = value.replace(char, escape)
+    return f"$<$<STREQUAL:$<TARGET_PROPERTY:NAME>,{name}>:{value}>"
+
+
+def _cmake_arg(item: str) -> str:
+    """Quote an item as a single CMake command argument if needed."""
+    if any(c.isspace() or c in '";()#' for c in item):
+        return '"' + item.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return item
+
+
+def _object_key(inv: dict, src: str, source_count: int) -> str:
+    """The object file a compile step produces for `src`."""
+    if inv.get("output") and source_count == 1:
+        return inv["output"]
+    return os.path.splitext(os.path.basename(src))[0] + ".o"
+
+
+def _builds_nothing(inv: dict) -> bool:
+    """True for calls that only preprocess, emit assembly or query the compiler."""
+    return (any(f in _NO_BUILD_FLAGS for f in inv.get("other_flags", []))
+            or any(f in ("-M", "-MM") for f in inv.get("dependency_flags", [])))
+
+
+def _is_link(inv: dict) -> bool:
+    """True if a call without -c links (or archives) something."""
+    if inv.get("archive"):
+        return True
+    return bool(inv.get("output") or inv.get("source_files") or inv.get("object_files")
+                or inv.get("library_files"))
+
+
+def _target_kind(link: dict) -> str:
+    if link.get("archive"):
+        return "STATIC"
+    if "-shared" in link.get("other_flags", []):
+        return "SHARED"
+    return "EXECUTABLE"
+
+
+def _target_name(output: str, kind: str) -> str:
+    """CMake target name producing `output`, e.g. libfoo.so.1 -> foo."""
+    name = os.path.basename(output)
+    if kind in LIBRARY_KINDS:
+        if name.startswith("lib"):
+            name = name[3:]
+        name = name.split(".")[0] or name
+    return name
+
+
+def _archive_union(earlier: Optional[dict], inv: dict) -> dict:
+    """`inv`, with the members of an earlier ar step on the same archive added."""
+    if not (inv.get("archive") and earlier and earlier.get("archive")):
+        return inv
+    members = dict.fromkeys(earlier["object_files"])
+    members.update(dict.fromkeys(inv["object_files"]))
+    return dict(inv, object_files=list(members))
+
+
+def _absolute(inv: dict, path: str) -> str:
+    return os.path.normpath(os.path.join(inv.get("cwd") or "", path))
 
 
-def generate_cmake(invocations: list[dict]) -> str:
-    """Generate CMakeLists.txt content from a list of parsed invocations.
+def _library_versions(name: str, output: Optional[str], soname: Optional[str]) -> str:
+    """VERSION/SOVERSION properties reproducing e.g. libfoo.so.1.2 with soname libfoo.so.1."""
+    prefix = f"lib{name}.so."
+    properties = []
+    if output and os.path.basename(output).startswith(prefix):
+        properties.append(f"VERSION {os.path.basename(output)[len(prefix):]}")
+    if soname and soname.startswith(prefix):
+        properties.append(f"SOVERSION {soname[len(prefix):]}")
+    return " ".join(properties)
+
 
-    Separates compile and link invocations, aggregates flags, and produces
-    a complete CMakeLists.txt string.
+def _unique_name(name: str, taken: set) -> str:
+    unique = name
+    n = 2
+    while unique in taken:
+        unique = f"{name}_{n}"
+        n += 1
+    taken.add(unique)
+    return unique
+
+
+def _std_setting(std):
+    """Map a -std= value to ("C"|"CXX", number), e.g. gnu++14 -> ("CXX", "14")."""
+    if not std:
+        return None
+    # Extract numeric part from standards like c++11, gnu++14, c11, gnu11
+    if "c++" in std or "gnu++" in std:
+        std_num = std.replace("gnu++", "").replace("c++", "")
+        return ("CXX", std_num)
+    std_num = std.replace("gnu", "").replace("c", "")
+    return ("C", std_num)
+
+
+def aggregate_invocations(invocations: Iterable[dict]) -> BuildAggregate:
+    """Fold a stream of parsed invocations into a BuildAggregate in one pass."""
+    aggregate = BuildAggregate()
+    for inv in invocations:
+        aggregate.add(inv)
+    return aggregate
+
+
+def _aggregate_range(task: tuple[str, int, int]) -> BuildAggregate:
+    log_path, start, end = task
+    return aggregate_invocations(iter_invocations(log_path, start, end))
+
+
+def aggregate_log(log_path: str, jobs: int = 0, end: int = None) -> BuildAggregate:
+    """Aggregate the log at `log_path` using `jobs` worker processes.
+
+    A JSONL log is split into line-aligned byte ranges that workers decode
+    and aggregate on their own; the partial aggregates are merged in file
+    order, so the result is identical to a serial pass. Binary logs are read
+    serially. `jobs` 0 picks one per CPU for logs of PARALLEL_MIN_LOG_SIZE
+    or more and 1 otherwise. `end` limits a JSONL log to its first `end`
+    bytes, which must end at a line boundary.
     """
-    compile_invocations = [inv for inv in invocations if inv.get("compile_only")]
-    link_invocations = [inv for inv in invocations if not inv.get("compile_only")]
-
-    # Collect data from compile invocations
-    source_files = []
-    include_dirs = []
-    defines = []
-    std = None
-    warnings = []
-    debug = False
-    optimization = None
-    other_flags = []
-    pic = False
-    pthread = False
-
-    # Map .o files to source files for linking step resolution
-    obj_to_source = {}
-
-    for inv in compile_invocations:
-        for src in inv.get("source_files", []):
-            basename = os.path.basename(src)
-            if basename not in [os.path.basename(s) for s in source_files]:
-                source_files.append(src)
-            # Map output .o to this source
-            out = inv.get("output")
-            if out:
-                obj_to_source[out] = src
-
-        for d in inv.get("include_dirs", []):
-            if d not in include_dirs:
-                include_dirs.append(d)
-
-        for d in inv.get("defines", []):
-            if d not in defines:
-                defines.append(d)
-
-        if inv.get("std") and not std:
-            std = inv["std"]
-
-        for w in inv.get("warnings", []):
-            if w not in warnings:
-                warnings.append(w)
-
-        if inv.get("debug"):
-            debug = True
-
-        if inv.get("optimization") and not optimization:
-            optimization = inv["optimization"]
-
-        for f in inv.get("other_flags", []):
-            if f not in other_flags:
-                other_flags.append(f)
-
-        if inv.get("pic"):
-            pic = True
-
-        if inv.get("pthread"):
-            pthread = True
-
-    # Extract data from link invocations
-    target_name = None
-    libraries = []
-    lib_dirs = []
-    linker_flags = []
-
-    for inv in link_invocations:
-        if inv.get("output") and not target_name:
-            target_name = inv["output"]
-
-        for lib in inv.get("libraries", []):
-            if lib not in libraries:
-                libraries.append(lib)
-
-        for d in inv.get("lib_dirs", []):
-            if d not in lib_dirs:
-                lib_dirs.append(d)
-
-        for f in inv.get("linker_flags", []):
-            if f not in linker_flags:
-                linker_flags.append(f)
-
-        # If no compile invocations, get source files from link step via .o mapping
-        if not compile_invocations:
-            for src in inv.get("source_files", []):
-                basename = os.path.basename(src)
-                if basename not in [os.path.basename(s) for s in source_files]:
-                    source_files.append(src)
-
-        # Map .o files in link step back to sources from compile steps
-        for obj in inv.get("object_files", []):
-            if obj in obj_to_source:
-                src = obj_to_source[obj]
-                basename = os.path.basename(src)
-                if basename not in [os.path.basename(s) for s in source_files]:
-                    source_files.append(src)
-
-        if inv.get("pthread"):
-            pthread = True
-
-    # Default target name
-    if not target_name:
-        target_name = "project"
-
-    # Determine C vs C++ standard
-    std_setting = None
-    if std:
-        # Extract numeric part from standards like c++11, gnu++14, c11, gnu11
-        if "c++" in std or "gnu++" in std:
-            std_num = std.replace("gnu++", "").replace("c++", "")
-            std_setting = ("CXX", std_num)
-        else:
-            std_num = std.replace("gnu", "").replace("c", "")
-            std_setting = ("C", std_num)
-
-    # Use basenames for source files in CMake output
-    source_basenames = [os.path.basename(s) for s in source_files]
-
-    # Build CMakeLists.txt
-    lines = []
-    lines.append("cmake_minimum_required(VERSION 3.10)")
-    lines.append(f"project({target_name})")
-
-    if std_setting:
-        lang, num = std_setting
-        lines.append(f"set(CMAKE_{lang}_STANDARD {num})")
-
-    lines.append(f"add_executable({target_name} {' '.join(source_basenames)})")
-
-    if include_dirs:
-        dirs_str = " ".join(include_dirs)
-        lines.append(f"target_include_directories({target_name} PRIVATE {dirs_str})")
-
-    if defines:
-        defs_str = " ".join(defines)
-        lines.append(f"target_compile_definitions({target_name} PRIVATE {defs_str})")
-
-    if libraries or pthread:
-        libs = list(libraries)
-        if pthread and "pthread" not in libs:
-            libs.append("pthread")
-        libs_str = " ".join(libs)
-        lines.append(f"target_link_libraries({target_name} PRIVATE {libs_str})")
-
-    if lib_dirs:
-        dirs_str = " ".join(lib_dirs)
-        lines.append(f"target_link_directories({target_name} PRIVATE {dirs_str})")
-
-    compile_opts = []
-    for w in warnings:
-        compile_opts.append(f"-W{w}")
-    if debug:
-        compile_opts.append("-g")
-    if optimization:
-        compile_opts.append(f"-O{optimization}")
-    if pic:
-        compile_opts.append("-fPIC")
-    compile_opts.extend(other_flags)
-
-    if compile_opts:
-        opts_str = " ".join(compile_opts)
-        lines.append(f"target_compile_options({target_name} PRIVATE {opts_str})")
-
-    return "\n".join(lines) + "\n"
+    if not jobs:
+        large = os.path.exists(log_path) and os.path.getsize(log_path) >= PARALLEL_MIN_LOG_SIZE
+        jobs = (os.cpu_count() or 1) if large else 1
+    if not os.path.exists(log_path) or is_binary_log(log_path):
+        return aggregate_invocations(iter_invocations(log_path))
+    if jobs == 1:
+        return aggregate_invocations(iter_invocations(log_path, end=end))
+
+    import multiprocessing
+    # A few ranges per worker keeps them busy when ranges decode unevenly
+    tasks = [(log_path, start, stop) for start, stop in split_log(log_path, jobs * 4, end)]
+    aggregate = BuildAggregate()
+    with multiprocessing.Pool(jobs) as pool:
+        for partial in pool.imap(_aggregate_range, tasks):
+            aggregate.merge(partial)
+    return aggregate
+
+
+def generate_cmake(invocations: Iterable[dict], unity: bool = False, precompile_headers: bool = False,
+                   compiler_launcher: Optional[str] = None, linker: Optional[str] = None) -> str:
+    """Generate CMakeLists.txt content from parsed invocations.
+
+    `invocations` may be any iterable, e.g. iter_invocations() streaming
+    straight from the log; it is consumed exactly once. Every link step
+    becomes its own add_executable()/add_library() target. `unity` and
+    `precompile_headers` enable the speedups planned by speedup.plan_speedups;
+    `compiler_launcher` and `linker` are passed on to BuildAggregate.render.
+    """
+    aggregate = aggregate_invocations(invocations)
+    plans = None
+    if unity or precompile_headers:
+        from cmakegen.speedup import plan_speedups
+        plans = plan_speedups(aggregate, unity, precompile_headers)
+    return aggregate.render(plans, compiler_launcher, linker)
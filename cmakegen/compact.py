@@ -0,0 +1,175 @@
+"""Drop repeated invocations from a log, keeping the latest of each.
+
+Rebuilds and retries log the same compile over and over. Compaction hashes
+what identifies each step (everything but the fields in _RUN_FIELDS, which
+change from one run of a step to the next) and keeps only the last record
+with each hash, so generate sees the same flags and latest timings for
+every object and link output while reading far less.
+
+Kept records are written where their object or output first appeared in
+the log, not where they were last logged, so a partial rebuild doesn't
+reorder the targets generate emits. Records for the same object or output
+(its compile before and after a flag change, say) stay in the order of
+their last runs, so the latest still wins. Which records to keep, and in
+what order, is worked out in an on-disk SQLite index, so memory use
+doesn't grow with the log.
+
+Compaction may run during a build. Records appended after it started are
+copied over verbatim, and the compacted log replaces the old one while the
+append lock is held. Appenders waiting for that lock notice that the file
+was replaced and retry on the new one (see invocation_log._append).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import warnings
+
+from cmakegen.invocation_log import (
+    BINARY_MAGIC,
+    _encode,
+    _is_current,
+    fcntl,
+    iter_invocations_from,
+)
+
+_BATCH_SIZE = 4096
+# Fields describing one run of a step rather than the step itself
+_RUN_FIELDS = ("timing", "headers")
+
+
+def record_key(invocation: dict) -> bytes:
+    """Hash identifying the step a record logs, up to the order of its fields.
+
+    Its cwd, output, sources, flags and kind count; its timing and headers
+    don't, so reruns of a step share a key.
+    """
+    step = {k: v for k, v in invocation.items() if k not in _RUN_FIELDS}
+    normalized = json.dumps(step, sort_keys=True)
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def _step_group(invocation: dict) -> bytes:
+    """Hash of what generate keys a record by: the object or output it produces."""
+    identity = [invocation.get(k) for k in ("cwd", "compile_only", "archive", "output", "source_files")]
+    return hashlib.blake2b(json.dumps(identity).encode("utf-8"), digest_size=16).digest()
+
+
+def _complete_records(log_path: str, size: int):
+    """Yield (end offset, invocation) for the complete records in the first `size` bytes."""
+    with warnings.catch_warnings():
+        # A record still being written is expected here; it is carried over as-is
+        warnings.simplefilter("ignore")
+        for end, invocation in iter_invocations_from(log_path):
+            if end is None or end > size:
+                return
+            yield end, invocation
+
+
+def compact_log(log_path: str) -> tuple[int, int]:
+    """Compact the log in place. Returns (records read, records kept)."""
+    if not os.path.exists(log_path):
+        return 0, 0
+    with open(log_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        fmt = "binary" if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC else "jsonl"
+    size = st.st_size
+
+    index_path = f"{log_path}.{os.getpid()}.compact.sqlite"
+    tmp_path = f"{log_path}.{os.getpid()}.compact.tmp"
+    db = sqlite3.connect(index_path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute("CREATE TABLE records (key BLOB NOT NULL, step BLOB NOT NULL, "
+                   "archive INTEGER NOT NULL, position INTEGER PRIMARY KEY)")
+
+        # Pass 1: the key and step of every record, by position
+        end = 0
+        batch = []
+        total = 0
+        for end, invocation in _complete_records(log_path, size):
+            batch.append((record_key(invocation), _step_group(invocation),
+                          bool(invocation.get("archive")), total))
+            total += 1
+            if len(batch) == _BATCH_SIZE:
+                db.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", batch)
+                batch = []
+        db.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", batch)
+
+        # The last record of each key, ranked by where its step first appeared,
+        # then by its last run. Archives accumulate members in the order ar
+        # added them, so their records go by first run instead.
+        db.execute("""
+            CREATE TABLE kept AS
+            SELECT ROW_NUMBER() OVER (ORDER BY steps.first,
+                                      CASE WHEN runs.archive THEN runs.first ELSE runs.last END) AS rank,
+                   runs.last AS last
+            FROM (SELECT step, MAX(archive) AS archive, MIN(position) AS first, MAX(position) AS last
+                  FROM records GROUP BY key) AS runs
+            JOIN (SELECT step, MIN(position) AS first FROM records GROUP BY step) AS steps
+            USING (step)""")
+        db.execute("CREATE INDEX kept_last ON kept (last)")
+        db.execute("CREATE TABLE output (rank INTEGER PRIMARY KEY, record TEXT NOT NULL)")
+
+        # Pass 2: set the kept records aside, then write them out by rank
+        keep = db.execute("SELECT last, rank FROM kept ORDER BY last")
+        next_kept, rank = next(keep, (None, None))
+        batch = []
+        for position, (_, invocation) in enumerate(_complete_records(log_path, end)):
+            if position != next_kept:
+                continue
+            batch.append((rank, json.dumps(invocation)))
+            next_kept, rank = next(keep, (None, None))
+            if len(batch) == _BATCH_SIZE:
+                db.executemany("INSERT INTO output VALUES (?, ?)", batch)
+                batch = []
+        db.executemany("INSERT INTO output VALUES (?, ?)", batch)
+        kept = 0
+        with open(tmp_path, "wb") as out:
+            batch = []
+            for record, in db.execute("SELECT record FROM output ORDER BY rank"):
+                batch.append(json.loads(record))
+                kept += 1
+                if len(batch) == _BATCH_SIZE:
+                    out.write(_encode(batch, fmt))
+                    batch = []
+            if batch:
+                out.write(_encode(batch, fmt))
+        shutil.copymode(log_path, tmp_path)
+        _swap_in(log_path, tmp_path, st, end)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        db.close()
+        os.remove(index_path)
+    return total, kept
+
+
+def _swap_in(log_path: str, tmp_path: str, st: os.stat_result, end: int) -> None:
+    """Replace the log with `tmp_path`, carrying over what was appended after `end`.
+
+    Raises RuntimeError, leaving the log alone, if it was replaced, removed
+    or truncated since compaction started.
+    """
+    fd = os.open(log_path, os.O_RDONLY)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        current = os.fstat(fd)
+        if not _is_current(fd, log_path) or current.st_ino != st.st_ino or current.st_size < end:
+            raise RuntimeError(f"{log_path} was replaced or cleared during compaction")
+        with open(tmp_path, "ab") as out:
+            os.lseek(fd, end, os.SEEK_SET)
+            while True:
+                chunk = os.read(fd, 1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+        os.replace(tmp_path, log_path)
+    finally:
+        os.close(fd)
@@ -0,0 +1,202 @@
+"""Interception daemon: one long-lived process that parses and logs for the proxies.
+
+The proxy compilers send their raw argv and working directory over a Unix
+domain socket (see cmakegen.proxy.send_to_daemon). The daemon queues the
+messages and a single writer thread parses them (through a ParseCache, as
+most TUs share their flags) and appends them to the log in large batches,
+so parallel builds don't contend on the log file.
+"""
+
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from cmakegen.flag_parser import ParseCache, parse_ar_args
+from cmakegen.invocation_log import log_invocations
+
+DEFAULT_SOCKET_PATH = ".cmakegen.sock"
+BATCH_SIZE = 1024
+
+_STOP = object()
+
+
+def _is_invocation(message) -> bool:
+    """True if `message` is a well-formed {"argv": [...], "cwd": ...} message."""
+    return (isinstance(message, dict) and isinstance(message.get("argv"), list)
+            and all(isinstance(arg, str) for arg in message["argv"])
+            and isinstance(message.get("cwd", ""), (str, type(None))))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        data = self.rfile.read()
+        if not data:
+            return  # a liveness probe, see Daemon._remove_stale_socket
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        daemon = self.server.cmakegen_daemon
+        if isinstance(message, dict) and message.get("command") == "stop":
+            daemon.shutdown()
+            daemon.flush()
+        elif _is_invocation(message):
+            if not daemon.submit(message):
+                # The writer is gone: have the proxy log the invocation itself
+                self.wfile.write(b"error\n")
+                return
+        else:
+            self.wfile.write(b"error\n")
+            return
+        self.wfile.write(b"ok\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # Non-daemon handler threads are joined by server_close(), so every
+    # message acknowledged with "ok" is queued before the writer stops.
+    daemon_threads = False
+
+
+class Daemon:
+    """Accept invocations on `socket_path` and append them to `log_path`."""
+
+    def __init__(self, socket_path: str, log_path: str, batch_size: int = BATCH_SIZE):
+        self.socket_path = os.path.abspath(socket_path)
+        self.log_path = os.path.abspath(log_path)
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._parse_cache = ParseCache()
+        self._remove_stale_socket()
+        self._server = _Server(self.socket_path, _RequestHandler)
+        self._server.cmakegen_daemon = self
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+
+    def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+        else:
+            raise RuntimeError(f"a daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def submit(self, message: dict) -> bool:
+        """Queue a {"argv": [...], "cwd": ...} message for logging; False if it can't be."""
+        if not self._writer.is_alive():
+            return False
+        self._queue.put(message)
+        return True
+
+    def flush(self) -> None:
+        """Block until every message submitted so far has been written."""
+        written = threading.Event()
+        self._queue.put(written)
+        while not written.wait(1.0):
+            if not self._writer.is_alive():
+                return  # nothing left to wait for
+
+    def serve_forever(self) -> None:
+        """Serve until shutdown() is called, then flush and remove the socket."""
+        self._writer.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._queue.put(_STOP)
+            self._writer.join()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self) -> None:
+        """Stop serving; safe to call from any thread other than serve_forever's."""
+        threading.Thread(target=self._server.shutdown).start()
+
+    def _write_loop(self) -> None:
+        # Block for the first message, then take whatever else has queued up
+        # meanwhile. Under load batches grow; when idle every record is
+        # written as soon as it arrives.
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            barriers = [m for m in batch if not isinstance(m, dict)]
+            messages = [m for m in batch if isinstance(m, dict)]
+            try:
+                self._write_batch(messages)
+            except Exception as exc:
+                # Keep serving: one bad batch must not stop the writer
+                print(f"cmakegen daemon: could not log {len(messages)} invocations: {exc!r}",
+                      file=sys.stderr)
+            for barrier in barriers:
+                if barrier is _STOP:
+                    return
+                barrier.set()
+
+    def _write_batch(self, messages: list[dict]) -> None:
+        invocations = []
+        for message in messages:
+            try:
+                invocation = self._parse_message(message)
+            except Exception as exc:
+                print(f"cmakegen daemon: ignoring {message.get('argv')!r}: {exc!r}", file=sys.stderr)
+                continue
+            if invocation is not None:
+                invocations.append(invocation)
+        if invocations:
+            log_invocations(self.log_path, invocations)
+
+    def _parse_message(self, message: dict):
+        """The invocation to log for a message, or None for an ar command that adds nothing."""
+        if message.get("kind") == "archiver":
+            invocation = parse_ar_args(message["argv"])
+            if invocation is None:
+                return None
+        else:
+            invocation = self._parse_cache.parse(message["argv"])
+        invocation["cwd"] = message.get("cwd")
+        if "timing" in message:
+            invocation["timing"] = message["timing"]
+        if "headers" in message:
+            invocation["headers"] = message["headers"]
+        return invocation
+
+
+def serve(socket_path: str, log_path: str) -> None:
+    """Run a daemon in the foreground until SIGINT/SIGTERM or a stop request."""
+    daemon = Daemon(socket_path, log_path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    print(f"cmakegen daemon listening; export CMAKEGEN_SOCKET={daemon.socket_path}", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def stop(socket_path: str) -> bool:
+    """Ask the daemon on `socket_path` to flush and exit.
+
+    Returns once everything logged so far is on disk, or False if no daemon
+    is running.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(b'{"command": "stop"}\n')
+        client.shutdown(socket.SHUT_WR)
+        return client.recv(16).startswith(b"ok")
+    except OSError:
+        return False
+    finally:
+        client.close()
@@ -0,0 +1,84 @@
+"""Make-syntax depfiles: the headers a compile read.
+
+gcc and clang write one with -MD/-MMD (next to the object, or where -MF
+says). With CMAKEGEN_DEPS set the proxy reads it once the compile has
+finished and logs the headers with the invocation; compiles that don't
+write one get -MD -MF <temporary file> added for the duration of the call.
+Only what the proxy needs lives here, so importing it stays cheap.
+"""
+
+import os
+from typing import Optional
+
+
+def parse_depfile(text: str) -> list[str]:
+    """Prerequisites of the first rule of a Make-syntax depfile.
+
+    That is the source followed by every header it read, as gcc and clang
+    write them; the phony rules of -MP come after and are ignored.
+    """
+    rule = text.replace("\\\r\n", " ").replace("\\\n", " ").split("\n", 1)[0]
+    words = rule.split()
+    if "\\ " in rule:
+        # Escaped spaces inside paths
+        words = []
+        for word in rule.split():
+            if words and words[-1].endswith("\\"):
+                words[-1] = words[-1][:-1] + " " + word
+            else:
+                words.append(word)
+    for i, word in enumerate(words):
+        if word.endswith(":"):
+            words = words[i + 1:]
+            return [w.replace("$$", "$") for w in words] if "$$" in rule else words
+    return []
+
+
+def depfile_path(inv: dict) -> Optional[str]:
+    """The depfile a compile step wrote, relative to its cwd, if it wrote one."""
+    if inv.get("depfile"):
+        return inv["depfile"]
+    flags = inv.get("dependency_flags", [])
+    if "-MD" in flags or "-MMD" in flags:
+        # Without -MF the driver names it after the object
+        if inv.get("output"):
+            return os.path.splitext(inv["output"])[0] + ".d"
+        if len(inv.get("source_files", [])) == 1:
+            return os.path.splitext(os.path.basename(inv["source_files"][0]))[0] + ".d"
+    return None
+
+
+def capture(arguments: list[str], inv: dict) -> Optional[tuple[list[str], str, bool]]:
+    """How to learn the headers of compile step `inv` (the parsed `arguments`).
+
+    Returns (arguments to run the compiler with, depfile to read afterwards,
+    whether the depfile is ours to remove), or None for steps that compile
+    no single source to an object.
+    """
+    if not inv["compile_only"] or len(inv["source_files"]) != 1 or "-E" in inv["other_flags"]:
+        return None
+    flags = inv["dependency_flags"]
+    if "-M" in flags or "-MM" in flags:
+        return None  # preprocess only; the dependencies are the output
+    existing = depfile_path(inv)
+    if existing:
+        return arguments, existing, False
+    path = os.path.join(os.environ.get("TMPDIR") or "/tmp", f"cmakegen-{os.getpid()}.d")
+    return arguments + ["-MD", "-MF", path], path, True
+
+
+def read_headers(cwd: str, path: str, remove: bool = False) -> Optional[list[str]]:
+    """Headers listed in the depfile at `path` (relative to `cwd`), None if unreadable."""
+    path = os.path.join(cwd, path)
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return None
+    finally:
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return parse_depfile(text)[1:]
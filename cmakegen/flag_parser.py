@@ -1,10 +1,100 @@
-"""Parse compiler/linker flags into structured data."""
+"""Parse compiler/linker flags into structured data.
+
+Options are classified through two tables rather than a chain of checks:
+_EXACT maps whole arguments (e.g. "-c", "-MF", "-isystem") and _PREFIXES
+maps joined forms (e.g. "-I<dir>", "-std=<val>") grouped by their first two
+characters, longest prefix first. Each entry names the result field it
+fills and how; options taking a separate value consume the next argument.
+"""
 
 import os
-import re
 
 SOURCE_EXTENSIONS = {'.c', '.cpp', '.cc', '.cxx', '.C'}
 OBJECT_EXTENSION = '.o'
+LIBRARY_EXTENSIONS = {'.a', '.so', '.dylib'}
+# Inputs that are no file of the project: stdin and the null device
+_NON_FILE_INPUTS = {"-", "/dev/null", "NUL"}
+# Result fields that differ between TUs sharing the same flags
+PER_TU_FIELDS = ("source_files", "object_files", "output")
+
+# Actions: how an option's value lands in its result field
+_STORE = 0       # result[field] = value
+_APPEND = 1      # result[field].append(value)
+_KEEP = 2        # result[field] gets the option verbatim (and its separate value)
+_XLINKER = 3     # result[field].append("-Wl," + value)
+_STORE_ARG = 4   # result[field] = the whole argument
+
+# option -> (field, action, takes separate value, constant value)
+_EXACT = {
+    "-c": ("compile_only", _STORE, False, True),
+    "-o": ("output", _STORE, True, None),
+    "-I": ("include_dirs", _APPEND, True, None),
+    "-D": ("defines", _APPEND, True, None),
+    "-L": ("lib_dirs", _APPEND, True, None),
+    "-l": ("libraries", _APPEND, True, None),
+    "-isystem": ("system_include_dirs", _APPEND, True, None),
+    "-include": ("forced_includes", _APPEND, True, None),
+    "-x": ("language", _STORE, True, None),
+    "--sysroot": ("sysroot", _STORE, True, None),
+    "-g": ("debug", _STORE, False, True),
+    "-fPIC": ("pic", _STORE, False, True),
+    "-fpic": ("pic", _STORE, False, True),
+    "-pthread": ("pthread", _STORE, False, True),
+    "-flto": ("lto", _STORE_ARG, False, None),
+    "-Xlinker": ("linker_flags", _XLINKER, True, None),
+    "-MF": ("depfile", _STORE, True, None),
+    "-MT": ("dependency_flags", _KEEP, True, None),
+    "-MQ": ("dependency_flags", _KEEP, True, None),
+    "-arch": ("machine_flags", _KEEP, True, None),
+    "-target": ("machine_flags", _KEEP, True, None),
+}
+for _level in ("0", "1", "2", "3", "s", "g", "z", "fast"):
+    _EXACT["-O" + _level] = ("optimization", _STORE, False, _level)
+_EXACT["-O"] = ("optimization", _STORE, False, "1")
+for _option in ("-M", "-MM", "-MD", "-MMD", "-MP", "-MG"):
+    _EXACT[_option] = ("dependency_flags", _KEEP, False, None)
+# Options kept as-is that take a separate value, so the value is not
+# mistaken for an input file
+for _option in ("-Xclang", "-Xassembler", "-Xpreprocessor", "-mllvm", "-imacros", "-iquote",
+                "-idirafter", "-iprefix", "-iwithprefix", "-iwithprefixbefore", "-isysroot",
+                "-include-pch", "-aux-info", "--param", "-T", "-u", "-e", "-z", "-framework"):
+    _EXACT[_option] = ("other_flags", _KEEP, True, None)
+
+# joined prefix -> (field, action)
+_PREFIX_LIST = [
+    ("-o", "output", _STORE),
+    ("-I", "include_dirs", _APPEND),
+    ("-D", "defines", _APPEND),
+    ("-L", "lib_dirs", _APPEND),
+    ("-l", "libraries", _APPEND),
+    ("-std=", "std", _STORE),
+    ("--std=", "std", _STORE),
+    ("-isystem", "system_include_dirs", _APPEND),
+    ("-include", "forced_includes", _APPEND),
+    ("-x", "language", _STORE),
+    ("--sysroot=", "sysroot", _STORE),
+    ("-flto=", "lto", _STORE_ARG),
+    ("-fuse-ld=", "linker", _STORE),
+    ("-MF", "depfile", _STORE),
+    ("-MT", "dependency_flags", _KEEP),
+    ("-MQ", "dependency_flags", _KEEP),
+    ("-m", "machine_flags", _KEEP),
+    ("--target=", "machine_flags", _KEEP),
+    ("-Wl,-soname,", "soname", _STORE),
+    ("-Wl,-soname=", "soname", _STORE),
+    ("-Wl,-h,", "soname", _STORE),
+    ("-Wl,", "linker_flags", _KEEP),
+    ("-Wa,", "other_flags", _KEEP),
+    ("-Wp,", "other_flags", _KEEP),
+    ("-W", "warnings", _APPEND),
+]
+_PREFIXES = {}
+for _prefix, _field, _action in sorted(_PREFIX_LIST, key=lambda p: -len(p[0])):
+    _PREFIXES.setdefault(_prefix[:2], []).append((_prefix, _field, _action))
+
+OPTIMIZATION_FLAGS = {option for option, spec in _EXACT.items() if spec[0] == "optimization"}
+# Options whose value is the next argument
+SEPARATE_ARG_OPTIONS = {option for option, spec in _EXACT.items() if spec[2]}
 
 
 def parse_args(argv: list[str]) -> dict:
@@ -19,9 +109,12 @@ def parse_args(argv: list[str]) -> dict:
     result = {
         "source_files": [],
         "object_files": [],
+        "library_files": [],
         "output": None,
         "std": None,
         "include_dirs": [],
+        "system_include_dirs": [],
+        "forced_includes": [],
         "defines": [],
         "lib_dirs": [],
         "libraries": [],
@@ -31,90 +124,234 @@ def parse_args(argv: list[str]) -> dict:
         "pic": False,
         "pthread": False,
         "compile_only": False,
+        "language": None,
+        "sysroot": None,
+        "machine_flags": [],
+        "lto": None,
+        "linker": None,
+        "soname": None,
+        "depfile": None,
+        "dependency_flags": [],
         "linker_flags": [],
         "other_flags": [],
     }
 
+    n = len(argv)
     i = 0
-    while i < len(argv):
+    while i < n:
         arg = argv[i]
+        i += 1
 
-        if arg == "-c":
-            result["compile_only"] = True
+        spec = _EXACT.get(arg)
+        if spec is not None:
+            field, action, separate, value = spec
+            if separate:
+                if i >= n:
+                    break
+                value = argv[i]
+                i += 1
+            if action == _STORE:
+                result[field] = value
+            elif action == _APPEND:
+                result[field].append(value)
+            elif action == _KEEP:
+                result[field].append(arg)
+                if separate:
+                    result[field].append(value)
+            elif action == _XLINKER:
+                result[field].append("-Wl," + value)
+            else:
+                result[field] = arg
+            continue
 
-        elif arg == "-o":
-            i += 1
-            if i < len(argv):
-                result["output"] = argv[i]
+        # Source or object files (positional args)
+        if arg[:1] != "-" or arg == "-":
+            if arg in _NON_FILE_INPUTS:
+                continue  # e.g. the `cc -E -dM -x c /dev/null` probes of build systems
+            ext = os.path.splitext(arg)[1]
+            if ext in SOURCE_EXTENSIONS:
+                result["source_files"].append(arg)
+            elif ext == OBJECT_EXTENSION:
+                result["object_files"].append(arg)
+            elif result["language"] not in (None, "none"):
+                # -x <lang> makes any following input a source file
+                result["source_files"].append(arg)
+            elif ext in LIBRARY_EXTENSIONS or ".so." in os.path.basename(arg):
+                result["library_files"].append(arg)
+            # Ignore other positional args
+            continue
 
-        elif arg.startswith("-std="):
-            result["std"] = arg[5:]
+        for prefix, field, action in _PREFIXES.get(arg[:2], ()):
+            if arg.startswith(prefix):
+                if action == _STORE:
+                    result[field] = arg[len(prefix):]
+                elif action == _APPEND:
+                    result[field].append(arg[len(prefix):])
+                elif action == _KEEP:
+                    result[field].append(arg)
+                else:
+                    result[field] = arg
+                break
+        else:
+            result["other_flags"].append(arg)
 
-        # -I with space or joined
-        elif arg == "-I":
-            i += 1
-            if i < len(argv):
-                result["include_dirs"].append(argv[i])
-        elif arg.startswith("-I"):
-            result["include_dirs"].append(arg[2:])
+    return result
 
-        # -D with space or joined
-        elif arg == "-D":
-            i += 1
-            if i < len(argv):
-                result["defines"].append(argv[i])
-        elif arg.startswith("-D"):
-            result["defines"].append(arg[2:])
 
-        # -L with space or joined
-        elif arg == "-L":
-            i += 1
-            if i < len(argv):
-                result["lib_dirs"].append(argv[i])
-        elif arg.startswith("-L"):
-            result["lib_dirs"].append(arg[2:])
+# ar modifiers taking a positional argument before the archive: a/b/i name
+# a member to insert relative to, N an instance count
+_AR_POSITION_MODIFIERS = "abiN"
 
-        # -l with space or joined
-        elif arg == "-l":
+
+def parse_ar_args(argv: list[str]) -> dict | None:
+    """Parse the arguments of ar (or llvm-ar, gcc-ar) into a link-like record.
+
+    Returns None unless the command adds members to an archive (the r or q
+    operation). The record has "archive" set, the archive as "output" and
+    the members as "object_files".
+    """
+    operations = None
+    positional = []
+    i = 0
+    n = len(argv)
+    while i < n:
+        arg = argv[i]
+        i += 1
+        if arg in ("--plugin", "--target"):
             i += 1
-            if i < len(argv):
-                result["libraries"].append(argv[i])
-        elif arg.startswith("-l"):
-            result["libraries"].append(arg[2:])
+        elif arg[:2] in ("--", "-X"):
+            continue
+        elif operations is None:
+            operations = arg.lstrip("-")
+        elif arg[:1] == "-" and not positional:
+            operations += arg[1:]
+        else:
+            positional.append(arg)
+    if not operations or not ("r" in operations or "q" in operations):
+        return None
+    positional = positional[sum(1 for m in operations if m in _AR_POSITION_MODIFIERS):]
+    if not positional:
+        return None
+    return {
+        "archive": True,
+        "output": positional[0],
+        "object_files": positional[1:],
+        "source_files": [],
+        "compile_only": False,
+    }
 
-        # Optimization
-        elif re.match(r'^-O[0-3sg]$', arg):
-            result["optimization"] = arg[2:]
 
-        # Linker flags
-        elif arg.startswith("-Wl,"):
-            result["linker_flags"].append(arg)
+def split_per_tu_args(argv: list[str]) -> tuple[list[str], list[str], list[str]] | None:
+    """Split argv into (shared flags, per-TU args, per-TU dependency values).
 
-        # Warning flags
-        elif arg.startswith("-W"):
-            result["warnings"].append(arg[2:])
+    The per-TU args are the output (`-o <file>` or `-o<file>`) and the
+    source/object files; parsing them alone yields exactly the PER_TU_FIELDS
+    of parse_args(argv). The values of -MT, -MQ and -MF name the object
+    too, so they are taken out of the shared flags as well, each replaced
+    by a placeholder (see _fill_per_tu_values) that keeps its position.
+    Returns None if argv uses -x, which changes what counts as a source.
+    """
+    flags = []
+    per_tu = []
+    values = []
+    n = len(argv)
+    i = 0
+    while i < n:
+        arg = argv[i]
+        if arg[:2] == "-x":
+            return None
+        if arg in _PER_TU_VALUE_OPTIONS:
+            flags.append(arg)
+            if i + 1 < n:
+                i += 1
+                flags.append(f"{_PLACEHOLDER}{len(values)}")
+                values.append(argv[i])
+        elif arg in SEPARATE_ARG_OPTIONS:
+            target = per_tu if arg == "-o" else flags
+            target.append(arg)
+            if i + 1 < n:
+                i += 1
+                target.append(argv[i])
+        elif arg[:1] != "-":
+            if os.path.splitext(arg)[1] in _FILE_EXTENSIONS:
+                per_tu.append(arg)
+            else:
+                flags.append(arg)
+        elif arg[:2] == "-o":
+            per_tu.append(arg)
+        elif arg[:3] in _PER_TU_VALUE_OPTIONS:
+            flags.append(f"{arg[:3]}{_PLACEHOLDER}{len(values)}")
+            values.append(arg[3:])
+        else:
+            flags.append(arg)
+        i += 1
+    return flags, per_tu, values
 
-        elif arg == "-g":
-            result["debug"] = True
 
-        elif arg in ("-fPIC", "-fpic"):
-            result["pic"] = True
+def _fill_per_tu_values(result: dict, values: list[str]) -> None:
+    """Put the per-TU dependency values back in place of their placeholders."""
+    def fill(item):
+        marker = item.find(_PLACEHOLDER) if item else -1
+        if marker < 0:
+            return item
+        return item[:marker] + values[int(item[marker + 1:])]
 
-        elif arg == "-pthread":
-            result["pthread"] = True
+    result["depfile"] = fill(result["depfile"])
+    result["dependency_flags"] = [fill(f) for f in result["dependency_flags"]]
 
-        # Source or object files (positional args)
-        elif not arg.startswith("-"):
-            ext = os.path.splitext(arg)[1]
-            if ext in SOURCE_EXTENSIONS:
-                result["source_files"].append(arg)
-            elif ext == OBJECT_EXTENSION:
-                result["object_files"].append(arg)
-            # Ignore other positional args
 
+# Dependency options whose value is the TU's object or depfile
+_PER_TU_VALUE_OPTIONS = ("-MT", "-MQ", "-MF")
+# Stands in for a per-TU value in the shared flags; can't occur in a real argument
+_PLACEHOLDER = "\0"
+_FILE_EXTENSIONS = SOURCE_EXTENSIONS | {OBJECT_EXTENSION}
+
+
+class ParseCache:
+    """Memoize parse_args for argv vectors that share their flags.
+
+    Thousands of TUs typically differ only in their source and object file
+    (and the depfile options naming them), so the (long) shared flag vector
+    is parsed once and the per-TU parts are patched in. Entries are evicted
+    least-recently-used beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # insertion order doubles as recency order
+
+    def parse(self, argv: list[str]) -> dict:
+        """Return the same result as parse_args(argv)."""
+        split = split_per_tu_args(argv)
+        if split is None:
+            return parse_args(argv)
+        flags, per_tu, values = split
+        key = tuple(flags)
+        cached = self._entries.get(key)
+        if cached is None:
+            self.misses += 1
+            cached = parse_args(flags)
+            if len(self._entries) >= self.maxsize:
+                del self._entries[next(iter(self._entries))]
         else:
-            result["other_flags"].append(arg)
+            self.hits += 1
+            del self._entries[key]
+        self._entries[key] = cached
 
-        i += 1
+        result = {k: (v.copy() if v.__class__ is list else v) for k, v in cached.items()}
+        if per_tu:
+            tu_result = parse_args(per_tu)
+            for field in PER_TU_FIELDS:
+                result[field] = tu_result[field]
+        if values:
+            _fill_per_tu_values(result, values)
+        return result
 
-    return result
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
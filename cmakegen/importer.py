@@ -0,0 +1,258 @@
+"""Import build commands recorded by other tools instead of intercepting a build.
+
+Supported inputs are a compilation database (compile_commands.json) and
+shell command listings such as `ninja -t commands` or `make -n` output.
+Commands are streamed from the input, parsed by a pool of worker processes
+and appended to the invocation log, so nothing is compiled.
+"""
+
+import json
+import os
+import re
+import shlex
+import sys
+from typing import Iterable, Iterator, Optional, TextIO
+
+from cmakegen.flag_parser import ParseCache
+from cmakegen.invocation_log import log_invocations
+
+IMPORT_FORMATS = ("compile_commands", "ninja", "make")
+BATCH_SIZE = 256
+
+# cc, gcc-12, x86_64-linux-gnu-g++, clang++-17, ... (not ld, ar, cmake)
+_COMPILER_RE = re.compile(r"(?:.*-)?(?:cc|c\+\+|gcc|g\+\+|clang|clang\+\+)(?:-[0-9.]+)?(?:\.exe)?")
+# Wrappers that run the compiler given as their first argument
+LAUNCHERS = {"ccache", "sccache", "distcc", "icecc", "env"}
+_MAKE_DIRECTORY_RE = re.compile(r"make(?:\[\d+\])?: (Entering|Leaving) directory [`'](.*)'")
+_COMMAND_SEPARATORS = {"&&", "||", ";", "|", "(", ")"}
+
+_CHUNK_SIZE = 1 << 20
+
+
+def iter_compile_commands(f: TextIO, directory: str = ".") -> Iterator[tuple[list[str], str]]:
+    """Yield (argv without the compiler, working directory) per database entry.
+
+    The JSON array is decoded one entry at a time, so a database of any size
+    is read in bounded memory. `directory` resolves relative entry directories.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    while True:
+        # Skip whitespace, the opening bracket and separating commas
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        if pos < len(buffer):
+            try:
+                entry, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                pos = end
+                command = _database_command(entry)
+                if command:
+                    argv = compiler_arguments(command)
+                    yield (command[1:] if argv is None else argv), os.path.join(directory, entry.get("directory", ""))
+                continue
+        elif eof:
+            return
+        chunk = f.read(_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def _database_command(entry: dict) -> Optional[list[str]]:
+    if "arguments" in entry:
+        return list(entry["arguments"])
+    if "command" in entry:
+        try:
+            return shlex.split(entry["command"])
+        except ValueError:
+            return None
+    return None
+
+
+def iter_shell_commands(lines: Iterable[str], directory: str = ".") -> Iterator[tuple[list[str], str]]:
+    """Yield (argv without the compiler, working directory) per compiler command.
+
+    `lines` are shell commands as printed by `ninja -t commands` or `make -n`.
+    Commands chained with && or ; are split, `cd` changes the directory of the
+    commands after it on the same line, and make's "Entering directory"
+    messages change it for the lines that follow. The commands of CMake link
+    scripts are read from the script. Anything that doesn't run a C/C++
+    compiler is skipped.
+    """
+    directories = [directory]
+    pending = ""
+    for line in lines:
+        line = pending + line.rstrip("\r\n")
+        if line.endswith("\\"):
+            pending = line[:-1]
+            continue
+        pending = ""
+
+        match = _MAKE_DIRECTORY_RE.match(line)
+        if match:
+            if match.group(1) == "Entering":
+                directories.append(os.path.join(directories[-1], match.group(2)))
+            elif len(directories) > 1:
+                directories.pop()
+            continue
+
+        try:
+            lexer = shlex.shlex(line, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            continue  # unbalanced quotes: not a command we could replay anyway
+
+        cwd = directories[-1]
+        segment = []
+        for token in tokens + [";"]:
+            if token not in _COMMAND_SEPARATORS:
+                segment.append(token)
+                continue
+            if segment and segment[0] == "cd" and len(segment) > 1:
+                cwd = os.path.join(cwd, segment[1])
+            elif segment[1:3] == ["-E", "cmake_link_script"] and len(segment) > 3:
+                yield from _link_script_commands(os.path.join(cwd, segment[3]), cwd)
+            elif segment:
+                argv = compiler_arguments(segment)
+                if argv is not None:
+                    yield argv, cwd
+            segment = []
+
+
+def _link_script_commands(path: str, cwd: str) -> Iterator[tuple[list[str], str]]:
+    # CMake's Makefile generator keeps link commands in a link.txt script
+    # that `make -n` only names; it exists once the build tree is configured.
+    try:
+        with open(path) as f:
+            yield from iter_shell_commands(f, cwd)
+    except OSError:
+        return
+
+
+def compiler_arguments(command: list[str]) -> Optional[list[str]]:
+    """The compiler arguments of `command`, or None if it doesn't run a compiler.
+
+    Leading VAR=value assignments and launchers such as ccache are skipped.
+    """
+    i = 0
+    while i < len(command):
+        name = os.path.basename(command[i])
+        if "=" in command[i] or name in LAUNCHERS:
+            i += 1
+            continue
+        if _COMPILER_RE.fullmatch(name):
+            return command[i + 1:]
+        return None
+    return None
+
+
+def detect_format(path: str, head: str) -> str:
+    """Guess the format of an input from its path and first characters."""
+    if path.endswith(".json") or head.lstrip().startswith("["):
+        return "compile_commands"
+    if "make" in head and "directory" in head:
+        return "make"
+    return "ninja"
+
+
+_worker_cache = None
+
+
+def _parse_batch(batch: list[tuple[list[str], str]]) -> list[dict]:
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = ParseCache()
+    invocations = []
+    for argv, cwd in batch:
+        invocation = _worker_cache.parse(argv)
+        invocation["cwd"] = cwd
+        invocations.append(invocation)
+    return invocations
+
+
+def _batches(commands: Iterable[tuple[list[str], str]], size: int) -> Iterator[list]:
+    batch = []
+    for command in commands:
+        batch.append(command)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_commands(commands: Iterable[tuple[list[str], str]], log_path: str, jobs: int = None) -> int:
+    """Parse (argv, cwd) pairs with `jobs` processes and append them to the log.
+
+    Invocations are logged in input order. Returns how many were imported.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    count = 0
+    if jobs == 1:
+        for batch in _batches(commands, BATCH_SIZE):
+            invocations = _parse_batch(batch)
+            log_invocations(log_path, invocations)
+            count += len(invocations)
+        return count
+
+    import multiprocessing
+    with multiprocessing.Pool(jobs) as pool:
+        for invocations in pool.imap(_parse_batch, _batches(commands, BATCH_SIZE)):
+            log_invocations(log_path, invocations)
+            count += len(invocations)
+    return count
+
+
+def import_file(path: str, log_path: str, fmt: str = None, jobs: int = None) -> int:
+    """Import the commands in `path` ("-" for stdin) into the log at `log_path`.
+
+    `fmt` is one of IMPORT_FORMATS and is detected from the input if omitted.
+    Relative directories are resolved against the current directory for
+    listings and against the database's own directory for compile_commands.
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        head = f.read(4096)
+        fmt = fmt or detect_format(path, head)
+        rest = _Prepend(head, f)
+        if fmt == "compile_commands":
+            base = os.getcwd() if path == "-" else os.path.dirname(os.path.abspath(path))
+            commands = iter_compile_commands(rest, base)
+        else:
+            commands = iter_shell_commands(rest, os.getcwd())
+        return import_commands(commands, log_path, jobs)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class _Prepend:
+    """File-like wrapper replaying already-read text before the rest of `f`."""
+
+    def __init__(self, head: str, f: TextIO):
+        self._head = head
+        self._f = f
+
+    def read(self, size: int = -1) -> str:
+        if self._head:
+            head, self._head = self._head, ""
+            return head
+        return self._f.read(size)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._head:
+            head, self._head = self._head, ""
+            lines = head.splitlines(keepends=True)
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += self._f.readline()
+            yield from lines
+        yield from self._f
@@ -0,0 +1,236 @@
+"""On-disk index of which translation units read which headers.
+
+The index is an SQLite database built from the headers logged with
+CMAKEGEN_DEPS, or else the depfiles the build left behind, for the latest
+compile of each source. Rather than a row per (header, TU) edge, each
+header has posting lists: packed arrays of the ids of the TUs reading it,
+written out whenever POSTINGS_FLUSH_EDGES edges have piled up. Building
+thus holds a bounded number of edges in memory and writes a few rows per
+header, and "which TUs rebuild when this header changes" reads a handful
+of blobs. Each header's fan-out and rebuild cost (the summed compile time
+of the TUs reading it) is computed once when the index is built.
+"""
+
+import os
+import sqlite3
+import warnings
+from array import array
+from collections import Counter, defaultdict
+from typing import Iterator, Optional
+
+from cmakegen.depfile import depfile_path, read_headers
+from cmakegen.invocation_log import INDEX_SUFFIX, MappedLog, is_binary_log, iter_invocations
+from cmakegen.report import _format_table
+
+INDEX_VERSION = 1
+# Edges held in memory before their posting lists are written out
+POSTINGS_FLUSH_EDGES = 1 << 22
+
+_SCHEMA = """
+CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE tus (file INTEGER PRIMARY KEY, wall_ms REAL);
+CREATE TABLE postings (header INTEGER NOT NULL, tus BLOB NOT NULL);
+CREATE TABLE headers (file INTEGER PRIMARY KEY, fanout INTEGER NOT NULL, cost_ms REAL);
+"""
+
+
+def index_path(log_path: str) -> str:
+    return log_path + INDEX_SUFFIX
+
+
+# The fields _source() reads
+_SOURCE_FIELDS = ("source_files", "archive", "cwd")
+
+
+def _source(inv: dict) -> Optional[str]:
+    """Absolute path of the one source a compile step read, else None."""
+    sources = inv.get("source_files", [])
+    if len(sources) != 1 or inv.get("archive"):
+        return None
+    return os.path.normpath(os.path.join(inv.get("cwd") or "", sources[0]))
+
+
+def _latest_compiles(log_path: str) -> Iterator[dict]:
+    """The latest compile of each source in the log, in log order.
+
+    A JSONL log is read through MappedLog: the first pass decodes only the
+    fields naming the source of each record, and the second decodes just
+    the records it picked, found through the offset index.
+    """
+    if not os.path.exists(log_path) or is_binary_log(log_path):
+        latest = {}  # source -> number of its latest compile in the log
+        for n, inv in enumerate(iter_invocations(log_path)):
+            source = _source(inv)
+            if source is not None:
+                latest[source] = n
+        wanted = set(latest.values())
+        for n, inv in enumerate(iter_invocations(log_path)):
+            if n in wanted:
+                yield inv
+        return
+    with MappedLog(log_path) as mapped:
+        latest = {}  # source -> offset of its latest compile in the log
+        for offset in mapped.offsets:
+            try:
+                source = _source(mapped.fields(offset, _SOURCE_FIELDS))
+            except ValueError:
+                warnings.warn(f"{log_path}: ignoring malformed record at byte {offset}")
+                continue
+            if source is not None:
+                latest[source] = offset
+        for offset in sorted(latest.values()):
+            try:
+                yield mapped.record_at(offset)
+            except ValueError:
+                warnings.warn(f"{log_path}: ignoring malformed record at byte {offset}")
+
+
+def build_index(log_path: str, path: str = None) -> tuple[int, int]:
+    """(Re)build the index of the log at `log_path`; returns (TUs, edges) indexed.
+
+    Sources whose headers were neither logged nor left in a depfile are
+    left out. The index is written next to the log unless `path` is given,
+    and replaced atomically.
+    """
+    path = path or index_path(log_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+        files = {}     # absolute path -> id
+        resolved = {}  # cwd -> {path as logged: id}; TUs mostly read the same headers
+        postings = defaultdict(lambda: array("I"))  # header id -> TU ids not yet written
+        fanout = Counter()  # header id -> TUs reading it
+        cost = Counter()    # header id -> their summed compile ms
+        times = {}          # TU id -> compile ms, 0 when untimed
+        tus = edges = pending = 0
+
+        def file_id(p):
+            fid = files.get(p)
+            if fid is None:
+                fid = files[p] = len(files) + 1
+            return fid
+
+        def flush():
+            for hid, ids in postings.items():
+                fanout[hid] += len(ids)
+                cost[hid] += sum(map(times.__getitem__, ids))
+            conn.executemany("INSERT INTO postings VALUES (?, ?)",
+                             ((h, ids.tobytes()) for h, ids in postings.items()))
+            postings.clear()
+
+        for inv in _latest_compiles(log_path):
+            cwd = inv.get("cwd") or ""
+            headers = inv.get("headers")
+            if headers is None:
+                depfile = depfile_path(inv)
+                headers = read_headers(cwd, depfile) if depfile else None
+                if headers is None:
+                    continue
+            tu = file_id(_source(inv))
+            timing = inv.get("timing")
+            times[tu] = timing["wall_ms"] if timing else 0
+            conn.execute("INSERT INTO tus VALUES (?, ?)", (tu, timing["wall_ms"] if timing else None))
+            tus += 1
+
+            cache = resolved.setdefault(cwd, {})
+            header_ids = set(map(cache.get, headers))
+            if None in header_ids:
+                header_ids.discard(None)
+                for header in headers:
+                    if header not in cache:
+                        cache[header] = file_id(os.path.normpath(os.path.join(cwd, header)))
+                        header_ids.add(cache[header])
+            header_ids.discard(tu)
+            for hid in header_ids:
+                postings[hid].append(tu)
+            edges += len(header_ids)
+            pending += len(header_ids)
+            if pending >= POSTINGS_FLUSH_EDGES:
+                flush()
+                pending = 0
+        flush()
+        conn.executemany("INSERT INTO files VALUES (?, ?)", ((fid, p) for p, fid in files.items()))
+        timed = any(times.values())
+        conn.executemany("INSERT INTO headers VALUES (?, ?, ?)",
+                         ((h, count, cost[h] if timed else None) for h, count in fanout.items()))
+        conn.execute("CREATE INDEX postings_by_header ON postings (header)")
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp)
+        raise
+    conn.close()
+    os.replace(tmp, path)
+    return tus, edges
+
+
+def open_index(log_path: str, path: str = None) -> sqlite3.Connection:
+    """The index of the log at `log_path`, rebuilt first if missing or older than the log."""
+    path = path or index_path(log_path)
+    try:
+        stale = os.path.getmtime(path) < os.path.getmtime(log_path)
+    except OSError:
+        stale = True
+    if not stale:
+        conn = sqlite3.connect(path)
+        if conn.execute("PRAGMA user_version").fetchone()[0] == INDEX_VERSION:
+            return conn
+        conn.close()
+    build_index(log_path, path)
+    return sqlite3.connect(path)
+
+
+def find_headers(conn: sqlite3.Connection, header: str) -> list[str]:
+    """Indexed headers matching `header`: its absolute path, else paths ending in /`header`."""
+    exact = conn.execute("SELECT path FROM files JOIN headers ON headers.file = files.id WHERE path = ?",
+                         (os.path.abspath(header),)).fetchall()
+    if exact:
+        return [exact[0][0]]
+    pattern = "%/" + header.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    rows = conn.execute("SELECT path FROM files JOIN headers ON headers.file = files.id "
+                        "WHERE path LIKE ? ESCAPE '\\' ORDER BY path", (pattern,))
+    return [path for path, in rows]
+
+
+def rebuilt_by(conn: sqlite3.Connection, header: str) -> list[tuple[str, Optional[float]]]:
+    """(source, compile ms or None) of every TU that reads the header at absolute path `header`."""
+    ids = set()
+    for blob, in conn.execute("SELECT tus FROM postings JOIN files ON files.id = postings.header "
+                              "WHERE path = ?", (header,)):
+        postings = array("I")
+        postings.frombytes(blob)
+        ids.update(postings)
+    if not ids:
+        return []
+    rows = conn.execute("SELECT file, path, wall_ms FROM tus JOIN files ON files.id = tus.file ORDER BY path")
+    return [(path, wall_ms) for tu, path, wall_ms in rows if tu in ids]
+
+
+def costliest_headers(conn: sqlite3.Connection, top: int = 20) -> list[tuple[str, int, Optional[float]]]:
+    """(header, TUs reading it, their summed compile ms) of the `top` costliest headers.
+
+    Without timings the order is by fan-out alone.
+    """
+    return conn.execute(
+        "SELECT path, fanout, cost_ms FROM headers JOIN files ON files.id = headers.file "
+        "ORDER BY cost_ms DESC, fanout DESC, path LIMIT ?", (top,)).fetchall()
+
+
+def index_summary(conn: sqlite3.Connection) -> tuple[int, int]:
+    """(TUs, headers) in the index."""
+    return (conn.execute("SELECT COUNT(*) FROM tus").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM headers").fetchone()[0])
+
+
+def format_costliest(rows: list[tuple[str, int, Optional[float]]], tus: int, headers: int) -> str:
+    """Human-readable form of a costliest_headers() result."""
+    lines = [f"Costliest headers (top {len(rows)} of {headers}, read by {tus} TUs):"]
+    lines.extend(_format_table(
+        ["header", "TUs", "share", "rebuild s"],
+        [[path, fanout, f"{fanout / tus:.0%}", "-" if cost_ms is None else f"{cost_ms / 1000:.1f}"]
+         for path, fanout, cost_ms in rows]))
+    return "\n".join(lines) + "\n"
@@ -1,32 +1,464 @@
-"""Append/read compiler invocations to a JSONL log file."""
+"""Append/read compiler invocations to a JSONL (or compact binary) log file.
+
+Many proxy processes append to the same log during a parallel build. Each
+record (or batch of records) is written with a single write() on an O_APPEND
+descriptor while holding an exclusive flock, so records never interleave
+regardless of their size.
+
+New logs are JSONL unless the path ends in BINARY_LOG_EXTENSION or
+CMAKEGEN_LOG_FORMAT=binary is set, in which case the binary_log format is
+used. An existing log keeps the format it was created with, and readers
+detect the format from the file contents.
+"""
 
-import json
 import os
+from _collections_abc import Iterator  # already loaded by os; typing costs ~15 ms
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, rely on O_APPEND alone
+    fcntl = None
 
 
 DEFAULT_LOG_PATH = ".cmakegen_log.jsonl"
+CHECKPOINT_SUFFIX = ".checkpoint"  # saved generate state, see cmakegen.checkpoint
+INDEX_SUFFIX = ".deps.sqlite"  # include-graph index, see cmakegen.include_graph
+BINARY_LOG_EXTENSION = ".cglog"
+LOG_FORMATS = ("jsonl", "binary")
+BINARY_MAGIC = b"CGB1"  # first bytes of every binary_log block
+
+# json (and the re module it imports) is only loaded when reading the log or
+# encoding unusual values, so the proxy compilers stay cheap to start.
+_STRING_ESCAPES = {i: f"\\u{i:04x}" for i in range(0x20)}
+_STRING_ESCAPES.update({
+    ord('"'): '\\"',
+    ord("\\"): "\\\\",
+    ord("\n"): "\\n",
+    ord("\r"): "\\r",
+    ord("\t"): "\\t",
+    ord("\b"): "\\b",
+    ord("\f"): "\\f",
+})
+
+
+def _dumps(value) -> str:
+    """Serialize a value exactly like json.dumps() with default settings."""
+    if isinstance(value, str):
+        if value.isascii():
+            return '"' + value.translate(_STRING_ESCAPES) + '"'
+    elif value is None:
+        return "null"
+    elif value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif isinstance(value, int):
+        return int.__repr__(value)
+    elif isinstance(value, float):
+        if value - value == 0:
+            return float.__repr__(value)
+    elif isinstance(value, (list, tuple)):
+        return "[" + ", ".join([_dumps(v) for v in value]) + "]"
+    elif isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return "{" + ", ".join([_dumps(k) + ": " + _dumps(v) for k, v in value.items()]) + "}"
+    import json
+    return json.dumps(value)
+
+
+def log_format(log_path: str) -> str:
+    """Return the format a new log at `log_path` is created in."""
+    if log_path.endswith(BINARY_LOG_EXTENSION) or os.environ.get("CMAKEGEN_LOG_FORMAT") == "binary":
+        return "binary"
+    return "jsonl"
+
+
+def _encode(invocations: list[dict], fmt: str) -> bytes:
+    if fmt == "binary":
+        from cmakegen.binary_log import encode_block
+        return encode_block(invocations)
+    if len(invocations) > 1:
+        # Batches come from the daemon, convert and compact, not the proxy
+        # fast path, so json's C encoder is worth importing.
+        import json
+        dumps = json.dumps
+    else:
+        dumps = _dumps
+    return "".join([dumps(inv) + "\n" for inv in invocations]).encode("utf-8")
+
+
+def _append(log_path: str, invocations: list[dict], fmt: str = None) -> None:
+    """Append `invocations` to the log as one uninterrupted write.
+
+    `fmt` only applies if the log is new or empty; otherwise the format of
+    the existing file is kept.
+    """
+    while True:
+        fd = os.open(log_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if not _is_current(fd, log_path):
+                    continue  # replaced (e.g. by compaction) while we waited
+            head = os.read(fd, len(BINARY_MAGIC))
+            if head:
+                fmt = "binary" if head == BINARY_MAGIC else "jsonl"
+            fmt = fmt or log_format(log_path)
+            data = _encode(invocations, fmt)
+            if fmt == "jsonl" and head and fcntl is not None:
+                # A writer killed mid-record left a partial line: end it, so
+                # only that record is lost and not the one appended to it
+                size = os.fstat(fd).st_size
+                if os.pread(fd, 1, size - 1) != b"\n":
+                    data = b"\n" + data
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            return
+        finally:
+            os.close(fd)  # also releases the lock
+
+
+def _is_current(fd: int, log_path: str) -> bool:
+    """True if `fd` is still the file at `log_path`."""
+    try:
+        st = os.stat(log_path)
+    except FileNotFoundError:
+        return False
+    fd_st = os.fstat(fd)
+    return (fd_st.st_ino, fd_st.st_dev) == (st.st_ino, st.st_dev)
 
 
 def log_invocation(log_path: str, invocation: dict) -> None:
-    """Append a parsed invocation as a JSON line to the log file."""
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(invocation) + "\n")
+    """Append a parsed invocation to the log file."""
+    _append(log_path, [invocation])
 
 
-def read_invocations(log_path: str) -> list[dict]:
-    """Read all logged invocations from the log file."""
+def log_invocations(log_path: str, invocations: list[dict]) -> None:
+    """Append several parsed invocations to the log file with a single write."""
+    _append(log_path, invocations)
+
+
+def iter_invocations(log_path: str, start: int = 0, end: int = None) -> Iterator[dict]:
+    """Yield logged invocations one at a time without loading the whole log.
+
+    A final record cut short (e.g. a proxy killed mid-write) is skipped with a
+    warning, and so is a malformed or damaged record anywhere else. For a JSONL
+    log, `start` and `end` restrict reading to the records beginning in that
+    byte range (see split_log).
+    """
+    import json
+    import warnings
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            if start or end is not None:
+                raise ValueError("byte ranges are only supported for JSONL logs")
+            from cmakegen.binary_log import read_blocks
+            f.seek(0)
+            try:
+                for _, invocations in read_blocks(f, log_path):
+                    yield from invocations
+            except EOFError:
+                warnings.warn(f"{log_path}: ignoring truncated record at end of log")
+            return
+        f.seek(start)
+        pos = start
+        for line in f:
+            if end is not None and pos >= end:
+                return
+            pos += len(line)
+            complete = line.endswith(b"\n")
+            raw, line = line, line.strip()
+            if not line:
+                continue
+            try:
+                invocation = json.loads(line)
+            except ValueError:
+                if complete:
+                    warnings.warn(f"{log_path}: ignoring malformed record at byte {pos - len(raw)}")
+                    continue
+                warnings.warn(f"{log_path}: ignoring truncated record at end of log")
+                return
+            yield invocation
+
+
+def split_log(log_path: str, parts: int, end: int = None) -> list[tuple[int, int]]:
+    """Split a JSONL log into at most `parts` (start, end) byte ranges of whole lines.
+
+    The ranges are in file order and together cover the file (or its first
+    `end` bytes), so reading each with iter_invocations() and concatenating
+    gives the whole log.
+    """
+    size = os.path.getsize(log_path) if end is None else end
+    bounds = [0]
+    with open(log_path, "rb") as f:
+        for i in range(1, parts):
+            pos = size * i // parts
+            if pos <= bounds[-1]:
+                continue
+            # Move to the start of the next line (pos itself if one starts there)
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def iter_invocations_from(log_path: str, offset: int = 0) -> Iterator[tuple[int, dict]]:
+    """Yield (end offset, invocation) for the records from byte `offset` on.
+
+    The end offset is where the next unread record starts, so reading can
+    resume there later; for a binary log it is the end of the record's
+    block. A final JSONL record with no newline yet (it may still be being
+    written) is yielded with an end offset of None. Records cut short or
+    malformed are skipped with a warning, as in iter_invocations().
+    """
+    import json
+    import warnings
     if not os.path.exists(log_path):
-        return []
-    invocations = []
-    with open(log_path, "r", encoding="utf-8") as f:
+        return
+    with open(log_path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            from cmakegen.binary_log import read_blocks
+            f.seek(offset)
+            try:
+                for end, invocations in read_blocks(f, log_path):
+                    for invocation in invocations:
+                        yield end, invocation
+            except EOFError:
+                warnings.warn(f"{log_path}: ignoring truncated record at end of log")
+            return
+        f.seek(offset)
+        pos = offset
         for line in f:
-            line = line.strip()
-            if line:
-                invocations.append(json.loads(line))
-    return invocations
+            pos += len(line)
+            complete = line.endswith(b"\n")
+            raw, line = line, line.strip()
+            if not line:
+                continue
+            try:
+                invocation = json.loads(line)
+            except ValueError:
+                if complete:
+                    warnings.warn(f"{log_path}: ignoring malformed record at byte {pos - len(raw)}")
+                    continue
+                warnings.warn(f"{log_path}: ignoring truncated record at end of log")
+                return
+            yield (pos if complete else None), invocation
+
+
+def complete_size(log_path: str) -> int:
+    """Size of the JSONL log up to and including its last newline."""
+    with open(log_path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def is_binary_log(log_path: str) -> bool:
+    """True if the log at `log_path` exists and is in the binary format."""
+    try:
+        with open(log_path, "rb") as f:
+            return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except FileNotFoundError:
+        return False
+
+
+class MappedLog:
+    """Random access to the records of a JSONL log through mmap.
+
+    Record boundaries are found by scanning the mapped file for newlines,
+    and records are decoded straight from the mapping only when asked for.
+    The offsets index gives the start of every record, so a later pass can
+    seek to a record with record_at() instead of reading the log again.
+    Binary logs are not supported.
+    """
+
+    def __init__(self, log_path: str):
+        import mmap
+        self.log_path = log_path
+        self._file = open(log_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # An empty file can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if self._map[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+            self.close()
+            raise ValueError(f"{log_path} is a binary log")
+        self._offsets = None
+
+    def __enter__(self) -> "MappedLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not isinstance(self._map, bytes):
+            self._map.close()
+        self._file.close()
+
+    @property
+    def offsets(self):
+        """array of the byte offset of each record, in log order."""
+        if self._offsets is None:
+            from array import array
+            offsets = array("Q")
+            mm = self._map
+            find = mm.find
+            size = len(mm)
+            pos = 0
+            while pos < size:
+                end = find(b"\n", pos)
+                if end < 0:
+                    end = size
+                # Records start with "{"; only look closer at anything else
+                if mm[pos] == 0x7B or mm[pos:end].strip():
+                    offsets.append(pos)
+                pos = end + 1
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> dict:
+        return self.record_at(self.offsets[index])
+
+    def _end(self, offset: int) -> int:
+        end = self._map.find(b"\n", offset)
+        return len(self._map) if end < 0 else end
+
+    def record_at(self, offset: int) -> dict:
+        """Decode the record starting at byte `offset`."""
+        import json
+        return json.loads(self._map[offset:self._end(offset)])
+
+    def fields(self, offset: int, keys: tuple[str, ...]) -> dict:
+        """The top-level `keys` the record at `offset` has, decoding just their values.
+
+        Much cheaper than record_at() for a few short fields of a long record.
+        Raises ValueError if a value is malformed.
+        """
+        import json
+        decoder = json.JSONDecoder()
+        mm = self._map
+        end = self._end(offset)
+        found = {}
+        for key in keys:
+            pos = self._value_at(_dumps(key).encode("utf-8"), offset, end)
+            if pos < 0:
+                continue
+            # Decode a window that grows until it holds the whole value
+            window = 256
+            while True:
+                stop = min(end, pos + window)
+                try:
+                    found[key] = decoder.raw_decode(mm[pos:stop].decode("utf-8"))[0]
+                    break
+                except ValueError:
+                    if stop == end:
+                        raise
+                    window *= 4
+        return found
+
+    def _value_at(self, key: bytes, start: int, end: int) -> int:
+        """Offset of the JSON value of top-level `key` in [start, end), or -1."""
+        mm = self._map
+        pos = start
+        while True:
+            pos = mm.find(key, pos, end)
+            if pos < 0:
+                return -1
+            pos += len(key)
+            # A key is followed by a colon; the same text as a value is not
+            while pos < end and mm[pos] in b" \t":
+                pos += 1
+            if pos < end and mm[pos] == 0x3A:  # ":"
+                pos += 1
+                while pos < end and mm[pos] in b" \t":
+                    pos += 1
+                return pos
+
+    def iter_records(self, compile_only: bool = None, output: str = None) -> Iterator[tuple[int, dict]]:
+        """Yield (offset, record) for the records matching the filters.
+
+        `compile_only` selects compile (True) or link (False) steps and
+        `output` a single output path. Candidates are picked by searching the
+        mapped bytes, so records that don't match are never decoded. Records
+        cut short or malformed are skipped with a warning, as in
+        iter_invocations().
+        """
+        import json
+        mm = self._map
+        offsets = self.offsets
+        output_value = _dumps(output).encode("utf-8") if output is not None else None
+        for i, start in enumerate(offsets):
+            end = self._end(start)
+            if compile_only is not None:
+                pos = self._value_at(b'"compile_only"', start, end)
+                is_compile = pos >= 0 and mm[pos:pos + 4] == b"true"
+                if is_compile != compile_only:
+                    continue
+            if output_value is not None:
+                pos = self._value_at(b'"output"', start, end)
+                if pos < 0 or mm[pos:pos + len(output_value)] != output_value:
+                    continue
+            try:
+                record = json.loads(mm[start:end])
+            except ValueError:
+                import warnings
+                if end < len(mm) or i + 1 < len(offsets):
+                    warnings.warn(f"{self.log_path}: ignoring malformed record at byte {start}")
+                    continue
+                warnings.warn(f"{self.log_path}: ignoring truncated record at end of log")
+                return
+            yield start, record
+
+
+def read_invocations(log_path: str) -> list[dict]:
+    """Read all logged invocations from the log file."""
+    return list(iter_invocations(log_path))
+
+
+def convert_log(src_path: str, dst_path: str, fmt: str = None, batch_size: int = 4096) -> int:
+    """Rewrite the log at `src_path` to `dst_path` in format `fmt`.
+
+    `fmt` defaults to log_format(dst_path). Records are written in batches,
+    which for the binary format means one string table per batch. Returns
+    the number of records converted.
+    """
+    if os.path.abspath(src_path) == os.path.abspath(dst_path):
+        raise ValueError("cannot convert a log in place")
+    fmt = fmt or log_format(dst_path)
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    count = 0
+    batch = []
+    for invocation in iter_invocations(src_path):
+        batch.append(invocation)
+        if len(batch) == batch_size:
+            _append(dst_path, batch, fmt)
+            count += len(batch)
+            batch = []
+    if batch or not count:
+        _append(dst_path, batch, fmt)
+        count += len(batch)
+    return count
 
 
 def clear_log(log_path: str) -> None:
-    """Reset the log file."""
-    if os.path.exists(log_path):
-        os.remove(log_path)
+    """Reset the log file and drop the checkpoint and index derived from it."""
+    for path in (log_path, log_path + CHECKPOINT_SUFFIX, log_path + INDEX_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,71 @@
+"""Writing generated files without disturbing builds that use them.
+
+CMake reconfigures whenever CMakeLists.txt is newer than its cache, which
+can cascade into a full rebuild, and a job reading the file while generate
+writes it (a parallel CI job, say) must never see half of it. So a
+generated file is written only if its content changed, going by size and
+then SHA-256 against the file already there, and then through a temporary
+file in the same directory that is renamed over it. With several files,
+all the changed ones are written out before any is renamed into place.
+"""
+
+import hashlib
+import os
+
+_CHUNK_SIZE = 1 << 20
+
+
+def _unchanged(path: str, data: bytes) -> bool:
+    """True if the file at `path` holds exactly `data`."""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return False
+    return digest.digest() == hashlib.sha256(data).digest()
+
+
+def _stage(path: str, data: bytes) -> str:
+    """Write `data` to a new temporary file next to `path`; returns its path."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Unique across processes and hosts sharing the directory
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)  # keep the replaced file's permissions
+        except FileNotFoundError:
+            pass
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp
+
+
+def write_outputs(files: dict) -> list[str]:
+    """Write generated `files` {path: text}; returns the paths whose content changed."""
+    staged = []
+    try:
+        for path, content in files.items():
+            data = content.encode("utf-8")
+            if not _unchanged(path, data):
+                staged.append((_stage(path, data), path))
+    except BaseException:
+        for tmp, _ in staged:
+            os.remove(tmp)
+        raise
+    for tmp, path in staged:
+        os.replace(tmp, path)
+    return [path for _, path in staged]
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """Write one generated file as write_outputs() does; True if it changed."""
+    return bool(write_outputs({path: content}))
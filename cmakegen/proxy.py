@@ -0,0 +1,191 @@
+"""Proxy compiler fast path: log the invocation, then exec the real compiler.
+
+This module runs once per translation unit, so it only imports what it needs
+to log. Replacing the Python process with the real compiler (instead of
+waiting on a child) also means the exit status reaches the build tool as-is.
+"""
+
+import os
+import sys
+
+from cmakegen.flag_parser import parse_ar_args, parse_args
+from cmakegen.invocation_log import log_invocation, DEFAULT_LOG_PATH, _dumps
+
+
+def main(compiler: str, kind: str = "compiler") -> None:
+    """Entry point for the proxy scripts in compilers/."""
+    run(compiler, sys.argv[1:], kind)
+
+
+def wrap(argv: list[str]) -> None:
+    """`python -m cmakegen wrap <real-compiler> [arguments...]`."""
+    if not argv:
+        print("usage: python -m cmakegen wrap <real-compiler> [arguments...]", file=sys.stderr)
+        sys.exit(2)
+    run(argv[0], argv[1:])
+
+
+def launch(tools: dict) -> None:
+    """Entry point of the launcher of a wrapper directory (see cmakegen.wrappers).
+
+    `tools` maps the names the launcher is linked as to (real tool path,
+    wrappers.tool_kind), resolved when the directory was set up, so a call
+    costs a dict lookup instead of a PATH search. Compilers and archivers
+    are logged; other tools are only passed through.
+    """
+    name = os.path.basename(sys.argv[0])
+    tool = tools.get(name)
+    if tool is None:
+        print(f"cmakegen: no real tool known for {name}; set up the wrapper directory again",
+              file=sys.stderr)
+        sys.exit(127)
+    path, kind = tool
+    if kind in ("compiler", "archiver"):
+        run(path, sys.argv[1:], kind)
+    else:
+        exec_compiler([path] + sys.argv[1:])
+
+
+def run(compiler: str, arguments: list[str], kind: str = "compiler") -> None:
+    """Log the invocation of `compiler` with `arguments`, then hand off to it.
+
+    `kind` "archiver" parses the arguments as an ar command line instead.
+
+    When CMAKEGEN_SOCKET names a running daemon the raw arguments are sent
+    there; otherwise the invocation is parsed and logged directly. With
+    CMAKEGEN_TIMING set, the compiler runs as a child instead and the record,
+    logged once it has finished, includes its resource usage (see run_timed).
+    CMAKEGEN_DEPS does the same and also logs the headers a compile read,
+    from its depfile (see cmakegen.depfile).
+    """
+    cwd = os.getcwd()
+    deps = kind == "compiler" and os.environ.get("CMAKEGEN_DEPS")
+    if (deps or os.environ.get("CMAKEGEN_TIMING")) and hasattr(os, "wait4"):
+        capture = headers = None
+        if deps:
+            from cmakegen import depfile
+            capture = depfile.capture(arguments, parse_args(arguments))
+        status, timing = run_timed([compiler] + (capture[0] if capture else arguments))
+        if capture:
+            headers = depfile.read_headers(cwd, capture[1], capture[2])
+        record(arguments, cwd, timing, kind, headers if status == 0 else None)
+        sys.exit(status)
+    record(arguments, cwd, kind=kind)
+    exec_compiler([compiler] + arguments)
+
+
+def record(arguments: list[str], cwd: str, timing: dict = None, kind: str = "compiler",
+           headers: list[str] = None) -> None:
+    """Log one invocation, through the daemon if there is one.
+
+    ar commands that don't add members to an archive aren't logged.
+    """
+    if kind == "archiver":
+        invocation = parse_ar_args(arguments)
+        if invocation is None:
+            return
+    socket_path = os.environ.get("CMAKEGEN_SOCKET")
+    if socket_path and send_to_daemon(socket_path, arguments, cwd, timing, kind, headers):
+        return
+    if kind != "archiver":
+        invocation = parse_args(arguments)
+    invocation["cwd"] = cwd
+    if timing is not None:
+        invocation["timing"] = timing
+    if headers is not None:
+        invocation["headers"] = headers
+    log_path = os.environ.get("CMAKEGEN_LOG", DEFAULT_LOG_PATH)
+    log_invocation(log_path, invocation)
+
+
+def send_to_daemon(socket_path: str, arguments: list[str], cwd: str, timing: dict = None,
+                   kind: str = "compiler", headers: list[str] = None) -> bool:
+    """Send an invocation to the daemon. Returns False if it could not be delivered."""
+    # The C-level module avoids the ~10 ms it takes to import socket (and enum).
+    import _socket
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        message = {"argv": arguments, "cwd": cwd}
+        if kind != "compiler":
+            message["kind"] = kind
+        if timing is not None:
+            message["timing"] = timing
+        if headers is not None:
+            message["headers"] = headers
+        client.sendall(_dumps(message).encode("utf-8"))
+        client.shutdown(_socket.SHUT_WR)
+        return client.recv(16).startswith(b"ok")
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+def exec_compiler(command: list[str]) -> None:
+    """Replace the current process with `command`; never returns."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.name == "nt":
+        # os.exec* on Windows spawns a new process and exits immediately,
+        # which would make the build tool stop waiting for the compile.
+        import subprocess
+        sys.exit(subprocess.run(command).returncode)
+    try:
+        os.execvp(command[0], command)
+    except OSError as e:
+        print(f"cmakegen: {command[0]}: {e.strerror}", file=sys.stderr)
+        sys.exit(127)
+
+
+def run_timed(command: list[str]) -> tuple[int, dict]:
+    """Run `command` as a child and return (exit status, timing record).
+
+    The record holds the compiler's start time (seconds since the epoch),
+    wall time, user and system CPU time and peak RSS (from wait4), its exit
+    status, the size of the file it wrote with -o, and the CPU time the
+    proxy process itself used so far.
+    """
+    import time
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        pid = os.posix_spawnp(command[0], command, os.environ)
+    except OSError as e:
+        print(f"cmakegen: {command[0]}: {e.strerror}", file=sys.stderr)
+        sys.exit(127)
+    while True:
+        try:
+            _, wait_status, usage = os.wait4(pid, 0)
+            break
+        except KeyboardInterrupt:
+            continue  # the compiler got the signal too; report how it ended
+    wall = time.perf_counter() - start
+    status = os.waitstatus_to_exitcode(wait_status)
+    if status < 0:
+        status = 128 - status  # killed by a signal, as a shell reports it
+    own = os.times()
+    return status, {
+        "start": started_at,
+        "wall_ms": round(wall * 1000, 3),
+        "user_ms": round(usage.ru_utime * 1000, 3),
+        "sys_ms": round(usage.ru_stime * 1000, 3),
+        # kilobytes on Linux, bytes on macOS
+        "max_rss_kb": usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss,
+        "exit_status": status,
+        "output_bytes": _output_size(command[1:]),
+        "proxy_cpu_ms": round((own.user + own.system) * 1000, 3),
+    }
+
+
+def _output_size(arguments: list[str]):
+    output = None
+    for i, arg in enumerate(arguments):
+        if arg == "-o" and i + 1 < len(arguments):
+            output = arguments[i + 1]
+        elif arg.startswith("-o") and len(arg) > 2:
+            output = arg[2:]
+    try:
+        return os.stat(output).st_size if output else None
+    except OSError:
+        return None
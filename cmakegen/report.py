@@ -0,0 +1,77 @@
+"""Build profile from the timing records of CMAKEGEN_TIMING builds."""
+
+import os
+from typing import Optional
+
+from cmakegen.cmake_generator import BuildAggregate
+
+
+def _timing(inv: Optional[dict]) -> Optional[dict]:
+    return inv.get("timing") if inv else None
+
+
+def _cpu_ms(timing: dict) -> float:
+    return timing["user_ms"] + timing["sys_ms"]
+
+
+def _format_table(header: list[str], rows: list[list]) -> list[str]:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    lines = ["  ".join(str(cell).rjust(w) if i else str(cell).ljust(w)
+                       for i, (cell, w) in enumerate(zip(row, widths)))
+             for row in [header] + rows]
+    return [line.rstrip() for line in lines]
+
+
+def build_report(aggregate: BuildAggregate, top: int = 10) -> Optional[str]:
+    """Slowest TUs, heaviest targets and proxy overhead, or None without timings.
+
+    Like generate, only the latest compile of each object and link of each
+    output counts.
+    """
+    compiles = [(src, inv["timing"]) for src, inv in aggregate.compiles.values() if _timing(inv)]
+    links = [(inv.get("output") or os.path.basename(output), inv["timing"])
+             for output, inv in aggregate.links.items() if _timing(inv)]
+    if not compiles and not links:
+        return None
+
+    lines = []
+    if compiles:
+        slowest = sorted(compiles, key=lambda c: c[1]["wall_ms"], reverse=True)[:top]
+        lines.append(f"Slowest translation units (top {len(slowest)} of {len(compiles)}):")
+        lines.extend(_format_table(
+            ["source", "wall ms", "cpu ms", "peak RSS MB", "output KB", "status"],
+            [[src, f"{t['wall_ms']:.0f}", f"{_cpu_ms(t):.0f}", f"{t['max_rss_kb'] / 1024:.0f}",
+              "-" if t.get("output_bytes") is None else f"{t['output_bytes'] / 1024:.0f}", t["exit_status"]]
+             for src, t in slowest]))
+        lines.append("")
+
+    rows = []
+    for target in aggregate.targets():
+        timings = [t for t in map(_timing, target.compiles.values()) if t]
+        link = _timing(target.link)
+        if not timings and not link:
+            continue
+        compile_ms = sum(t["wall_ms"] for t in timings)
+        link_ms = link["wall_ms"] if link else 0.0
+        rows.append((compile_ms + link_ms, [
+            target.name, len(timings), f"{compile_ms / 1000:.1f}", f"{link_ms / 1000:.1f}",
+            f"{sum(_cpu_ms(t) for t in timings) / 1000:.1f}",
+            f"{max([t['max_rss_kb'] for t in timings] + [link['max_rss_kb'] if link else 0]) / 1024:.0f}",
+        ]))
+    rows.sort(key=lambda r: r[0], reverse=True)
+    lines.append(f"Heaviest targets (top {min(top, len(rows))} of {len(rows)}):")
+    lines.extend(_format_table(["target", "TUs", "compile s", "link s", "cpu s", "peak RSS MB"],
+                               [row for _, row in rows[:top]]))
+    lines.append("")
+
+    steps = [t for _, t in compiles + links]
+    proxy_ms = sum(t["proxy_cpu_ms"] for t in steps)
+    wall_ms = sum(t["wall_ms"] for t in steps)
+    failed = sum(1 for t in steps if t["exit_status"])
+    lines.append("Proxy overhead:")
+    lines.append(f"  {len(steps)} timed steps, {wall_ms / 1000:.1f} s in the compiler and linker, "
+                 f"{proxy_ms / 1000:.1f} s of proxy CPU ({proxy_ms / len(steps):.1f} ms per step, "
+                 f"{proxy_ms / (wall_ms or 1):.1%} of compiler time)")
+    if failed:
+        lines.append(f"  {failed} step(s) failed")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+"""Plan a faster build than the logged one: unity builds and precompiled headers.
+
+Unity (jumbo) builds compile several sources of a target as one TU, so
+the headers they share are parsed once per batch instead of once per
+source. Batch sizes come from the logged compile times when the build ran
+with CMAKEGEN_TIMING, aiming at batches of about UNITY_BATCH_SECONDS.
+
+Precompiled headers are chosen from the headers each TU actually read, as
+logged with CMAKEGEN_DEPS or else listed in the depfile its compile wrote
+(-MD, -MMD or -MF). A header goes into a target's PCH when it is
+- #include <...>d directly by at least one of the target's sources, so it
+  is known to be includable on its own and how it is spelled;
+- read, directly or not, by at least PCH_MIN_SHARE of the target's sources
+  whose headers are known;
+- outside the target's own -I directories and the source's directory.
+  Editing a project header would rebuild the PCH and every TU using it.
+
+Every choice is recorded as a note on the target's plan; format_plan()
+turns them into a report.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+from cmakegen.cmake_generator import _source_language
+from cmakegen.depfile import depfile_path, parse_depfile
+
+# Aim for unity batches taking about this long when the build was timed
+UNITY_BATCH_SECONDS = 30
+# Batch size without timings; CMake's own default
+UNITY_DEFAULT_BATCH_SIZE = 8
+UNITY_MAX_BATCH_SIZE = 32
+# Targets with fewer sources sharing their flags aren't unity built
+UNITY_MIN_SOURCES = 4
+PCH_MIN_SHARE = 0.75
+# Targets with fewer sources whose headers are known get no PCH
+PCH_MIN_SOURCES = 3
+# Sources to scan before the scan runs in parallel when jobs is automatic
+PARALLEL_MIN_SOURCES = 2000
+
+_ANGLE_INCLUDE_RE = re.compile(rb"^[ \t]*#[ \t]*include[ \t]*<([^>\n]+)>", re.MULTILINE)
+
+
+class TargetPlan:
+    """Speedups for one target, and why they were chosen."""
+
+    def __init__(self, name: str, sources: int):
+        self.name = name
+        self.sources = sources
+        self.unity_batch_size = 0       # 0: no unity build
+        self.precompile_headers = []    # target_precompile_headers() arguments
+        self.notes = []                 # explanation, one line each
+
+
+# cwd -> {path: normalized absolute path}; TUs mostly read the same headers
+_resolved = {}
+
+
+def _resolve_all(cwd: str, paths: list[str]) -> list[str]:
+    cache = _resolved.setdefault(cwd, {})
+    get = cache.get
+    resolved = [get(p) for p in paths]
+    if None in resolved:
+        for i, path in enumerate(resolved):
+            if path is None:
+                path = resolved[i] = os.path.normpath(os.path.join(cwd, paths[i]))
+                cache[paths[i]] = path
+    return resolved
+
+
+def _scan_source(task: tuple) -> Optional[tuple[list[str], dict]]:
+    """(headers read, {header: <spelling>} of external direct includes) of one TU.
+
+    The headers are the logged ones, if any, else those of its depfile.
+    None when the depfile or the source can't be read.
+    """
+    cwd, src, depfile, include_dirs, headers = task
+    try:
+        if headers is None:
+            with open(os.path.join(cwd, depfile), encoding="utf-8", errors="surrogateescape") as f:
+                headers = parse_depfile(f.read())[1:]
+        with open(os.path.join(cwd, src), "rb") as f:
+            spellings = _ANGLE_INCLUDE_RE.findall(f.read())
+    except OSError:
+        return None
+    headers = _resolve_all(cwd, headers)
+    if not spellings:
+        return headers, {}
+
+    project_dirs = tuple(d + os.sep for d in _resolve_all(cwd, include_dirs + [os.path.dirname(src) or "."]))
+    direct = {}
+    for spelling in spellings:
+        spelling = spelling.decode("utf-8", "surrogateescape").strip()
+        suffix = "/" + spelling
+        # The first header read with a matching path is the one the include found
+        for header in headers:
+            if header.endswith(suffix):
+                if not header.startswith(project_dirs):
+                    direct.setdefault(header, f"<{spelling}>")
+                break
+    return headers, direct
+
+
+def _scan_results(tasks: list[tuple], jobs: int):
+    """Yield _scan_source() of each task, in order."""
+    if not jobs:
+        jobs = (os.cpu_count() or 1) if len(tasks) >= PARALLEL_MIN_SOURCES else 1
+    if jobs == 1:
+        yield from map(_scan_source, tasks)
+        return
+    import multiprocessing
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(_scan_source, tasks, chunksize=max(1, len(tasks) // (jobs * 16)))
+
+
+class _HeaderUsage:
+    """Header counts over the sources of one language of a target."""
+
+    def __init__(self):
+        self.sources = 0
+        self.scanned = 0
+        self.counts = Counter()  # header -> sources that read it
+        self.spellings = {}      # header -> <spelling> of an external direct include
+
+    def add(self, result: Optional[tuple[list[str], dict]]) -> None:
+        self.sources += 1
+        if result is None:
+            return
+        headers, direct = result
+        self.scanned += 1
+        self.counts.update(headers)
+        for header, spelling in direct.items():
+            self.spellings.setdefault(header, spelling)
+
+
+def _unity_batch_size(plan: TargetPlan, target, std: Optional[str], batch_size: int) -> None:
+    uniform = target.uniform_sources(std)
+    if len(uniform) < UNITY_MIN_SOURCES:
+        plan.notes.append(f"unity build: no, only {len(uniform)} source(s) share the target's flags "
+                          f"(needs {UNITY_MIN_SOURCES})")
+        return
+    if len(uniform) < len(target.compiles):
+        reason = (f"{len(target.compiles) - len(uniform)} source(s) with their own flags "
+                  f"are built on their own")
+    else:
+        reason = "all sources share the target's flags"
+    if batch_size:
+        why = "as requested"
+    else:
+        times = [target.compiles[src]["timing"]["wall_ms"] / 1000 for src in uniform
+                 if target.compiles[src].get("timing")]
+        if times:
+            mean = sum(times) / len(times)
+            batch_size = min(UNITY_MAX_BATCH_SIZE, max(2, int(UNITY_BATCH_SECONDS / (mean or 1e-3))))
+            why = f"about {UNITY_BATCH_SECONDS} s per batch at {mean:.1f} s per source"
+        else:
+            batch_size = UNITY_DEFAULT_BATCH_SIZE
+            why = "the default without timings"
+    plan.unity_batch_size = min(batch_size, len(uniform))
+    plan.notes.append(f"unity build: batches of {plan.unity_batch_size} ({why}); {reason}")
+
+
+def _precompile_headers(plan: TargetPlan, languages: dict, min_share: float) -> None:
+    """Pick the PCH of each language from `languages` {language: _HeaderUsage}."""
+    mixed = len(languages) > 1
+    for language, usage in languages.items():
+        label = f"precompiled headers ({language})" if mixed else "precompiled headers"
+        if usage.scanned < PCH_MIN_SOURCES:
+            plan.notes.append(f"{label}: no, {usage.scanned} of {usage.sources} source(s) have logged "
+                              f"headers or a readable depfile (needs {PCH_MIN_SOURCES})")
+            continue
+        # Stable sort: equally shared headers keep the order they were first included in
+        candidates = sorted(((usage.counts[h] / usage.scanned, spelling)
+                             for h, spelling in usage.spellings.items()), key=lambda c: -c[0])
+        chosen = [c for c in candidates if c[0] >= min_share]
+        plan.notes.append(f"{label}: {len(chosen)} header(s) read by at least {min_share:.0%} of the "
+                          f"{usage.scanned} source(s) with known headers ({usage.sources} in all)")
+        plan.notes.extend(f"  {share:4.0%}  {spelling}" for share, spelling in chosen)
+        plan.notes.extend(f"  {share:4.0%}  {spelling}  (left out, below {min_share:.0%})"
+                          for share, spelling in candidates[len(chosen):len(chosen) + 5])
+        for _, spelling in chosen:
+            # A C++ header in a C PCH, or vice versa, wouldn't compile. Inside
+            # the generator expression the closing > must be escaped.
+            plan.precompile_headers.append(
+                f"$<$<COMPILE_LANGUAGE:{language}>:{spelling[:-1]}$<ANGLE-R>>" if mixed else spelling)
+
+
+def plan_speedups(aggregate, unity: bool = True, precompile_headers: bool = True,
+                  batch_size: int = 0, min_share: float = PCH_MIN_SHARE, jobs: int = 0) -> dict:
+    """{target name: TargetPlan} for the targets of a BuildAggregate.
+
+    `batch_size` 0 picks unity batch sizes per target. Depfiles and sources
+    are scanned by `jobs` processes; 0 picks one per CPU for large builds.
+    """
+    std = aggregate._std()
+    targets = aggregate.targets()
+    plans = {target.name: TargetPlan(target.name, len(target.compiles)) for target in targets}
+    if unity:
+        for target in targets:
+            _unity_batch_size(plans[target.name], target, std, batch_size)
+    if not precompile_headers:
+        return plans
+
+    tasks = []
+    owners = []
+    for target in targets:
+        for src, inv in target.compiles.items():
+            headers = inv.get("headers")
+            depfile = depfile_path(inv) if headers is None else None
+            scanned = headers is not None or depfile is not None
+            owners.append((target.name, _source_language(src, inv), scanned))
+            if scanned:
+                tasks.append((inv.get("cwd") or ".", src, depfile, inv.get("include_dirs", []), headers))
+    results = _scan_results(tasks, jobs)
+    languages = {}  # target name -> {language: _HeaderUsage}
+    for name, language, scanned in owners:
+        usage = languages.setdefault(name, {}).setdefault(language, _HeaderUsage())
+        usage.add(next(results) if scanned else None)
+    for name, by_language in languages.items():
+        _precompile_headers(plans[name], by_language, min_share)
+    return plans
+
+
+def format_plan(plans: dict) -> str:
+    """Human-readable account of the speedups chosen for each target."""
+    lines = []
+    for plan in plans.values():
+        lines.append(f"{plan.name} ({plan.sources} sources):")
+        lines.extend(f"  {note}" for note in plan.notes)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,211 @@
+"""Regenerate CMakeLists.txt while the build runs: `generate --watch`.
+
+LogTail follows the invocation log, folding records into a BuildAggregate
+as they are appended; the log is read from the start only once, or again
+when it is truncated or replaced (e.g. by `cmakegen clear`). Changes are
+noticed through inotify on Linux and by polling the log's size elsewhere.
+Once the log has been quiet for `debounce` seconds, or at the latest
+every `max_delay` seconds while records keep coming, the output is
+rendered and written as cmakegen.output does it: atomically, and only if
+it changed.
+"""
+
+import os
+import select
+import struct
+import sys
+import time
+import warnings
+from typing import Callable, Optional
+
+from cmakegen.cmake_generator import BuildAggregate, aggregate_log
+from cmakegen.invocation_log import complete_size, is_binary_log, iter_invocations_from
+from cmakegen.output import write_if_changed
+
+DEBOUNCE_SECONDS = 1.0
+# Regenerate at least this often while records keep arriving
+MAX_DELAY_SECONDS = 10.0
+POLL_SECONDS = 0.5
+# Least time between reads of the log, so a busy build's appends are read in batches
+READ_INTERVAL_SECONDS = 0.1
+
+# inotify(7)
+_IN_MODIFY = 0x2
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class LogTail:
+    """A BuildAggregate of a log that grows while it is watched."""
+
+    def __init__(self, log_path: str, jobs: int = 0):
+        self.log_path = log_path
+        self.jobs = jobs
+        self.aggregate = BuildAggregate()
+        self.offset = 0
+        self._identity = None  # (device, inode) of the log read so far
+
+    def read(self) -> bool:
+        """Fold in the records appended since the last call; True if there were any.
+
+        A final JSONL record without its newline yet is left for the next
+        call. A log that shrank or was replaced is read again from the start.
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            st = None
+        identity = (st.st_dev, st.st_ino) if st else None
+        changed = False
+        if identity != self._identity or (st and st.st_size < self.offset):
+            changed = self.aggregate.count > 0
+            self.aggregate = BuildAggregate()
+            self.offset = 0
+            self._identity = identity
+        if st is None or st.st_size == self.offset:
+            return changed
+        if self.offset == 0 and not is_binary_log(self.log_path):
+            # The first read may be a large log: use the parallel reader
+            self.offset = complete_size(self.log_path)
+            self.aggregate = aggregate_log(self.log_path, self.jobs, end=self.offset)
+            changed = changed or self.aggregate.count > 0
+        with warnings.catch_warnings():
+            # A record still being written is expected here, not a truncated log
+            warnings.simplefilter("ignore")
+            for end, invocation in iter_invocations_from(self.log_path, self.offset):
+                if end is None:
+                    break
+                self.aggregate.add(invocation)
+                self.offset = end
+                changed = True
+        return changed
+
+
+class _Inotify:
+    """Changes to one file, from inotify events on its directory."""
+
+    def __init__(self, path: str):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._name = os.fsencode(os.path.basename(path))
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # The directory, so the log is followed when created, removed or replaced
+        directory = os.fsencode(os.path.dirname(os.path.abspath(path)))
+        mask = _IN_MODIFY | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(self._fd, directory, mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Wait up to `timeout` seconds for the file to change; True if it did."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not select.select([self._fd], [], [], remaining)[0]:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self) -> bool:
+        """Read the queued events; True if any was about the file."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, pos)
+                name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                pos += _EVENT.size + length
+                if name == self._name or mask & _IN_Q_OVERFLOW:
+                    changed = True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Poller:
+    """Changes to one file, from its size, mtime and inode every POLL_SECONDS."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._last = self._state()
+
+    def _state(self):
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._state()
+            if state != self._last:
+                self._last = state
+                return True
+            remaining = POLL_SECONDS if deadline is None else min(POLL_SECONDS, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            time.sleep(remaining)
+
+    def close(self) -> None:
+        pass
+
+
+def _watcher(path: str):
+    if sys.platform.startswith("linux"):
+        try:
+            return _Inotify(path)
+        except (OSError, AttributeError):
+            pass  # e.g. out of inotify instances; fall back to polling
+    return _Poller(path)
+
+
+def watch(log_path: str, output: str, render: Callable[[BuildAggregate], str], jobs: int = 0,
+          debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_DELAY_SECONDS,
+          stop: Callable[[], bool] = lambda: False) -> None:
+    """Keep `output` up to date with render() of the log's aggregate until stop() is true.
+
+    stop() is checked at least every `debounce` seconds.
+    """
+    tail = LogTail(log_path, jobs)
+    watcher = _watcher(log_path)
+
+    def update():
+        if tail.aggregate.count and write_if_changed(output, render(tail.aggregate)):
+            print(f"{output} updated ({tail.aggregate.count} invocations)", file=sys.stderr)
+
+    try:
+        tail.read()
+        update()
+        while not stop():
+            if not watcher.wait(debounce):
+                continue
+            first = last = time.monotonic()
+            changed = tail.read()
+            while not stop():
+                time.sleep(READ_INTERVAL_SECONDS)
+                now = time.monotonic()
+                if not watcher.wait(max(0.0, min(last + debounce, first + max_delay) - now)):
+                    break  # quiet for `debounce`, or busy for `max_delay`
+                changed = tail.read() or changed
+                last = time.monotonic()
+                if last - first >= max_delay:
+                    break
+            if changed:
+                update()
+    finally:
+        watcher.close()
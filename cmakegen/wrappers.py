@@ -0,0 +1,99 @@
+"""A directory of wrappers that intercept every compiler of a build.
+
+install_wrappers() writes one launcher script into the directory and links
+each wrapped tool's name (gcc, clang++, aarch64-linux-gnu-g++, ar, ...) to
+it. The launcher picks the real tool by the name it was run as, from a map
+resolved once at install time and embedded in the script, and runs with
+`python -S` so a call imports nothing beyond the proxy itself. Putting the
+directory first on PATH, or pointing CC/CXX into it, intercepts the build.
+
+Archivers are logged as well (see flag_parser.parse_ar_args), so the
+generator can tell which objects end up in which static library; ranlib
+is only passed through.
+"""
+
+import os
+import re
+import sys
+
+from cmakegen.importer import _COMPILER_RE
+
+LAUNCHER_NAME = "cmakegen-launcher"
+_ARCHIVER_RE = re.compile(r"(?:.*-)?ar(?:-[0-9.]+)?(?:\.exe)?")
+_RANLIB_RE = re.compile(r"(?:.*-)?ranlib(?:-[0-9.]+)?(?:\.exe)?")
+
+_LAUNCHER_TEMPLATE = """\
+#!{python} -S
+# Generated by `python -m cmakegen wrappers`; run it again to pick up new tools.
+import sys
+sys.path.insert(0, {package_dir!r})
+from cmakegen.proxy import launch
+launch({tools!r})
+"""
+
+
+def tool_kind(name: str):
+    """What a tool name like gcc-12 or llvm-ar is: "compiler", "archiver", "ranlib" or None."""
+    if _COMPILER_RE.fullmatch(name):
+        return "compiler"
+    if _ARCHIVER_RE.fullmatch(name):
+        return "archiver"
+    if _RANLIB_RE.fullmatch(name):
+        return "ranlib"
+    return None
+
+
+def find_tools(names=None, exclude: str = None) -> dict:
+    """{name: path} of tools on PATH, skipping the `exclude` directory.
+
+    Without `names`, every compiler and archiver on PATH is found; the
+    first of each name wins, as in a shell.
+    """
+    exclude = os.path.realpath(exclude) if exclude else None
+    wanted = set(names) if names is not None else None
+    tools = {}
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        if not directory or not os.path.isdir(directory) or os.path.realpath(directory) == exclude:
+            continue
+        candidates = wanted if wanted is not None else os.listdir(directory)
+        for name in sorted(candidates):
+            if name in tools or (wanted is None and tool_kind(name) is None):
+                continue
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                tools[name] = path
+    return tools
+
+
+def install_wrappers(directory: str, tools: dict = None) -> dict:
+    """Set up `directory` to wrap `tools` {name: real path}; returns the tools wrapped.
+
+    Without `tools` every compiler and archiver on PATH is wrapped. Tools
+    with a name tool_kind() doesn't know are taken to be compilers. Links
+    left from an earlier install for tools no longer wrapped are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if tools is None:
+        tools = find_tools(exclude=directory)
+    entries = {name: (os.path.abspath(path), tool_kind(name) or "compiler")
+               for name, path in sorted(tools.items())}
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    launcher = os.path.join(directory, LAUNCHER_NAME)
+    tmp = f"{launcher}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(_LAUNCHER_TEMPLATE.format(python=sys.executable, package_dir=package_dir, tools=entries))
+    os.chmod(tmp, 0o755)
+    os.replace(tmp, launcher)
+
+    for name in os.listdir(directory):
+        link = os.path.join(directory, name)
+        if os.path.islink(link) and os.readlink(link) == LAUNCHER_NAME and name not in entries:
+            os.remove(link)
+    for name in entries:
+        link = os.path.join(directory, name)
+        if os.path.lexists(link):
+            if os.path.islink(link) and os.readlink(link) == LAUNCHER_NAME:
+                continue
+            os.remove(link)
+        os.symlink(LAUNCHER_NAME, link)
+    return tools
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+# Add parent directory to path so we can import cmakegen
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmakegen.proxy import main
+
+main("ar", "archiver")
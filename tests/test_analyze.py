@@ -0,0 +1,127 @@
+"""Tests for cmakegen.analyze."""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from cmakegen.analyze import analyze, build_graph, chrome_trace, critical_path
+from cmakegen.cmake_generator import aggregate_invocations
+from cmakegen.flag_parser import parse_ar_args, parse_args
+from cmakegen.invocation_log import log_invocations
+
+
+def _timed(argv, start, seconds):
+    invocation = parse_args(argv)
+    invocation["timing"] = {"start": 1000.0 + start, "wall_ms": seconds * 1000}
+    return invocation
+
+
+def _example():
+    # 2 cores: a (0-4) and b (0-1), c (1-2); libutil links c (2-3); app links a, b and util (4-6)
+    return build_graph(aggregate_invocations([
+        _timed(["-c", "-o", "a.o", "a.cpp"], 0, 4),
+        _timed(["-c", "-o", "b.o", "b.cpp"], 0, 1),
+        _timed(["-c", "-o", "c.o", "c.cpp"], 1, 1),
+        _timed(["-shared", "c.o", "-o", "libutil.so"], 2, 1),
+        _timed(["a.o", "b.o", "-lutil", "-o", "app"], 4, 2),
+    ]))
+
+
+def test_dependencies_and_critical_path():
+    graph = _example()
+    app = graph.names.index("app")
+    assert sorted(graph.names[d] for d in graph.deps[app]) == ["a.cpp", "b.cpp", "libutil.so"]
+    length, path = critical_path(graph)
+    assert length == 6
+    assert [graph.names[n] for n in path] == ["a.cpp", "app"]
+
+
+def test_archive_dependency_by_path():
+    graph = build_graph(aggregate_invocations([
+        _timed(["-c", "-o", "a.o", "a.cpp"], 0, 1),
+        dict(parse_ar_args(["rcs", "lib/liba.a", "a.o"]), timing={"start": 1001.0, "wall_ms": 100}),
+        _timed(["-c", "-o", "main.o", "main.cpp"], 0, 2),
+        _timed(["main.o", "lib/liba.a", "-o", "app"], 2, 1),
+    ]))
+    length, path = critical_path(graph)
+    assert [graph.names[n] for n in path] == ["main.cpp", "app"]
+    assert graph.deps[graph.names.index("app")] == [graph.names.index("main.cpp"), graph.names.index("lib/liba.a")]
+
+
+def test_executables_are_not_libraries():
+    # A tool named like a library doesn't satisfy -lutil
+    graph = build_graph(aggregate_invocations([
+        _timed(["-c", "-o", "util.o", "util.cpp"], 0, 1),
+        _timed(["util.o", "-o", "bin/util"], 1, 1),
+        _timed(["-c", "-o", "main.o", "main.cpp"], 0, 1),
+        _timed(["main.o", "-lutil", "-o", "app"], 1, 1),
+    ]))
+    assert graph.deps[graph.names.index("app")] == [graph.names.index("main.cpp")]
+
+
+def _cyclic_links():
+    return [
+        _timed(["-shared", "-lb", "-o", "liba.so"], 0, 1),
+        _timed(["-shared", "-la", "-o", "libb.so"], 1, 1),
+    ]
+
+
+def test_dependency_cycle_is_reported():
+    graph = build_graph(aggregate_invocations(_cyclic_links()))
+    with pytest.raises(ValueError, match="cycle between link steps: liba.so -> libb.so -> liba.so"):
+        critical_path(graph)
+
+
+def test_cli_reports_dependency_cycle(tmp_path):
+    log = str(tmp_path / "log.jsonl")
+    log_invocations(log, _cyclic_links())
+    proc = subprocess.run([sys.executable, "-m", "cmakegen", "analyze", "--log", log],
+                          capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert "Traceback" not in proc.stderr
+    assert "dependency cycle between link steps" in proc.stderr
+
+
+def test_parallelism_and_idle_cores():
+    result = analyze(_example(), cores=2)
+    assert result["span_s"] == 6
+    assert result["work_s"] == 9
+    assert result["achieved_parallelism"] == 1.5
+    assert result["available_parallelism"] == 1.5
+    # Two steps run until 3, then only a.cpp and finally the app link
+    assert result["idle_core_s"] == 3
+    assert result["underutilized_s"] == 3
+
+
+def test_chrome_trace_rows_do_not_overlap():
+    graph = _example()
+    trace = chrome_trace(graph, critical_path(graph)[1])
+    events = trace["traceEvents"]
+    assert len(events) == 5
+    assert {e["tid"] for e in events} == {0, 1}
+    for row in (0, 1):
+        spans = sorted((e["ts"], e["ts"] + e["dur"]) for e in events if e["tid"] == row)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    assert [e["name"] for e in events if e["args"]["critical"]] == ["a.cpp", "app"]
+
+
+def test_untimed_steps_are_ignored():
+    graph = build_graph(aggregate_invocations([parse_args(["-c", "a.cpp"]), _timed(["-c", "b.cpp"], 0, 1)]))
+    assert graph.names == ["b.cpp"]
+
+
+def test_large_graph_is_fast():
+    def timing(start, seconds):
+        return {"start": start, "wall_ms": seconds * 1000}
+    invocations = [{"compile_only": True, "source_files": [f"f{i}.cpp"], "output": f"f{i}.o",
+                    "timing": timing((i // 64) * 0.5, 0.5)} for i in range(100_000)]
+    invocations += [{"object_files": [f"f{i}.o" for i in range(t, 100_000, 100)], "output": f"app{t}",
+                     "timing": timing(800, 1)} for t in range(100)]
+    graph = build_graph(aggregate_invocations(invocations))
+    start = time.perf_counter()
+    result = analyze(graph, cores=64)
+    chrome_trace(graph, result["critical_path"])
+    assert time.perf_counter() - start < 5
+    assert result["critical_path_s"] == 1.5
@@ -0,0 +1,33 @@
+"""Smoke tests for the benchmark helpers in benchmarks/."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from run import regressions  # noqa: E402
+from synthetic import synthetic_argvs, write_log  # noqa: E402
+
+from cmakegen.cmake_generator import aggregate_log  # noqa: E402
+
+
+def test_synthetic_log_shape(tmp_path):
+    argvs = synthetic_argvs(100, targets=4, include_dirs=3, defines=5)
+    assert len(argvs) == 104
+    assert sum("-c" in argv for argv in argvs) == 100
+    assert sum(arg.startswith("-I") for arg in argvs[0]) == 3
+
+    log = str(tmp_path / "build.jsonl")
+    assert write_log(log, 100, targets=4) == 104
+    aggregate = aggregate_log(log, jobs=1)
+    assert len(aggregate.compiles) == 100
+    assert [t.name for t in aggregate.targets()] == ["target0", "target1", "target2", "app"]
+
+
+def test_regressions_respect_direction_and_tolerance():
+    baseline = {"parse": {"parse_args_per_s": 1000.0, "hits": 5},
+                "proxy": {"proxy_ms": 10.0, "direct_ms": 1.0, "cmakegen_ms": 0.1}}
+    results = {"parse": {"parse_args_per_s": 850.0, "hits": 1},
+               "proxy": {"proxy_ms": 13.0, "direct_ms": 9.0, "cmakegen_ms": 2.0}}
+    assert regressions(baseline, results, 0.2) == ["proxy.proxy_ms: 10 -> 13 (+30% worse)"]
+    assert len(regressions(baseline, results, 0.1)) == 2
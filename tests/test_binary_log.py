@@ -0,0 +1,113 @@
+"""Tests for cmakegen.binary_log."""
+
+import pytest
+
+from cmakegen.binary_log import decode_block, encode_block, HEADER
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import (convert_log, iter_invocations, log_invocation, log_invocations,
+                                     read_invocations)
+
+
+def roundtrip(invocations):
+    block = encode_block(invocations)
+    return decode_block(block[HEADER.size:])
+
+
+def test_roundtrip_parsed_invocations():
+    invocations = [
+        parse_args(["-g", "-std=c++17", "-I/usr/include/foo", "-DX=1", "-c", "-o", "a.o", "a.cpp"]),
+        parse_args(["-g", "-std=c++17", "-I/usr/include/foo", "-DX=1", "-c", "-o", "b.o", "b.cpp"]),
+        parse_args(["a.o", "b.o", "-o", "app", "-lm"]),
+    ]
+    assert roundtrip(invocations) == invocations
+
+
+def test_roundtrip_value_types():
+    invocations = [{
+        "none": None, "true": True, "false": False, "int": 42, "negative": -1,
+        "float": 1.5, "empty": [], "strings": ["a", "", "café"], "nested": {"wall": 0.25},
+        "mixed": [1, "a"], "nul": "a\0b",
+    }]
+    assert roundtrip(invocations) == invocations
+
+
+def test_decoded_records_are_independent():
+    inv = {"include_dirs": ["/a", "/b"]}
+    first, second = roundtrip([inv, dict(inv)])
+    first["include_dirs"].append("/c")
+    assert second["include_dirs"] == ["/a", "/b"]
+
+
+def test_interning_shrinks_repeated_flags():
+    common = [f"-I/very/long/include/path/number/{i}" for i in range(50)]
+    invocations = [parse_args(common + ["-c", "-o", f"f{i}.o", f"f{i}.cpp"]) for i in range(100)]
+    assert len(encode_block(invocations)) * 20 < len(encode_block(invocations[:1])) * 100
+
+
+def test_log_selected_by_extension(tmp_path):
+    log_path = str(tmp_path / "build.cglog")
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    log_invocations(log_path, [{"source_files": ["a.cpp"]}, {"source_files": ["b.cpp"]}])
+    with open(log_path, "rb") as f:
+        assert f.read(4) == b"CGB1"
+    assert [inv["source_files"] for inv in read_invocations(log_path)] == [["main.cpp"], ["a.cpp"], ["b.cpp"]]
+
+
+def test_log_selected_by_env(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "build.jsonl")
+    monkeypatch.setenv("CMAKEGEN_LOG_FORMAT", "binary")
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    with open(log_path, "rb") as f:
+        assert f.read(4) == b"CGB1"
+
+
+def test_existing_log_keeps_its_format(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "build.jsonl")
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    monkeypatch.setenv("CMAKEGEN_LOG_FORMAT", "binary")
+    log_invocation(log_path, {"source_files": ["impl0.cpp"]})
+    with open(log_path) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_truncated_trailing_block(tmp_path):
+    log_path = str(tmp_path / "build.cglog")
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    with open(log_path, "ab") as f:
+        f.write(encode_block([{"source_files": ["impl0.cpp"]}])[:-3])
+    with pytest.warns(UserWarning, match="truncated"):
+        assert list(iter_invocations(log_path)) == [{"source_files": ["main.cpp"]}]
+
+
+def test_damaged_blocks_skipped(tmp_path):
+    from cmakegen.invocation_log import iter_invocations_from
+    log_path = str(tmp_path / "build.cglog")
+    log_invocation(log_path, {"source_files": ["a.cpp"]})
+    block = encode_block([{"source_files": ["lost.cpp"]}])
+    with open(log_path, "ab") as f:
+        f.write(block[:-3])  # writer killed mid-block
+        f.write(block[:HEADER.size] + b"not zlib" + block[HEADER.size + 8:])
+    log_invocation(log_path, {"source_files": ["b.cpp"]})
+    expected = [{"source_files": ["a.cpp"]}, {"source_files": ["b.cpp"]}]
+    with pytest.warns(UserWarning, match="damaged bytes"):
+        assert list(iter_invocations(log_path)) == expected
+    with pytest.warns(UserWarning, match="damaged bytes"):
+        assert [inv for _, inv in iter_invocations_from(log_path)] == expected
+
+
+def test_convert_both_ways(tmp_path):
+    jsonl = str(tmp_path / "build.jsonl")
+    binary = str(tmp_path / "build.cglog")
+    back = str(tmp_path / "back.jsonl")
+    invocations = [parse_args(["-c", "-o", f"f{i}.o", f"f{i}.cpp"]) for i in range(10)]
+    log_invocations(jsonl, invocations)
+    assert convert_log(jsonl, binary, batch_size=3) == 10
+    assert read_invocations(binary) == invocations
+    assert convert_log(binary, back) == 10
+    with open(jsonl) as a, open(back) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_in_place_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        convert_log(str(tmp_path / "build.jsonl"), str(tmp_path / "build.jsonl"))
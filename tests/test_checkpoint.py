@@ -0,0 +1,74 @@
+"""Tests for cmakegen.checkpoint."""
+
+import os
+
+import pytest
+
+from cmakegen.checkpoint import aggregate_incremental, checkpoint_path, load_checkpoint
+from cmakegen.cmake_generator import aggregate_log
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import clear_log, log_invocations
+
+
+def _compile(name, *flags):
+    return parse_args(["-c", *flags, "-o", f"{name}.o", f"{name}.cpp"])
+
+
+@pytest.fixture(params=["build.jsonl", "build.cglog"])
+def log(tmp_path, request):
+    return str(tmp_path / request.param)
+
+
+def test_only_new_records_are_read(log, monkeypatch):
+    log_invocations(log, [_compile("a"), _compile("b"), parse_args(["a.o", "b.o", "-o", "app"])])
+    first = aggregate_incremental(log)
+    assert first.render() == aggregate_log(log, jobs=1).render()
+    _, offset = load_checkpoint(log)
+    assert offset == os.path.getsize(log)
+
+    log_invocations(log, [_compile("a", "-O2")])
+    seen = []
+    import cmakegen.checkpoint as checkpoint
+    original = checkpoint.iter_invocations_from
+    monkeypatch.setattr(checkpoint, "iter_invocations_from",
+                        lambda path, start: (seen.append(start), original(path, start))[1])
+    second = aggregate_incremental(log)
+    assert seen == [offset]
+    assert second.count == 4
+    assert second.render() == aggregate_log(log, jobs=1).render()
+
+
+def test_truncation_and_clear_invalidate(log):
+    log_invocations(log, [_compile("a"), _compile("b")])
+    aggregate_incremental(log)
+    with open(log, "r+b") as f:
+        f.truncate(0)
+    log_invocations(log, [_compile("c")])
+    assert list(aggregate_incremental(log).compiles) == ["c.o"]
+
+    clear_log(log)
+    assert not os.path.exists(checkpoint_path(log))
+    log_invocations(log, [_compile("d")])
+    assert list(aggregate_incremental(log).compiles) == ["d.o"]
+
+
+def test_replaced_log_invalidates(log, tmp_path):
+    log_invocations(log, [_compile("a"), _compile("b")])
+    aggregate_incremental(log)
+    other = str(tmp_path / ("other" + os.path.splitext(log)[1]))
+    log_invocations(other, [_compile("x"), _compile("y"), _compile("z")])
+    os.replace(other, log)
+    assert list(aggregate_incremental(log).compiles) == ["x.o", "y.o", "z.o"]
+
+
+def test_unfinished_record_is_read_again(tmp_path):
+    log = str(tmp_path / "build.jsonl")
+    log_invocations(log, [_compile("a")])
+    with open(log, "a") as f:
+        f.write('{"compile_only": true, "source_files": ["b.cpp"], "output": "b.o"}')
+    assert list(aggregate_incremental(log).compiles) == ["a.o", "b.o"]
+    with open(log, "a") as f:
+        f.write("\n")
+    aggregate = aggregate_incremental(log)
+    assert aggregate.count == 2
+    assert list(aggregate.compiles) == ["a.o", "b.o"]
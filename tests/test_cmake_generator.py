@@ -1,7 +1,7 @@
 """Tests for cmakegen.cmake_generator."""
 
 from cmakegen.cmake_generator import generate_cmake
-from cmakegen.flag_parser import parse_args
+from cmakegen.flag_parser import parse_ar_args, parse_args
 
 
 def test_single_source():
@@ -139,3 +139,372 @@ def test_c_standard():
     ]
     result = generate_cmake(invocations)
     assert "set(CMAKE_C_STANDARD 11)" in result
+
+
+def test_accepts_a_generator():
+    invocations = (parse_args(a) for a in [
+        ["main.o", "-o", "myapp"],
+        ["-c", "-std=c++11", "-o", "main.o", "main.cpp"],
+    ])
+    result = generate_cmake(invocations)
+    assert "add_executable(myapp main.cpp)" in result
+
+
+def test_aggregate_count():
+    from cmakegen.cmake_generator import aggregate_invocations
+    aggregate = aggregate_invocations([
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+    ])
+    assert aggregate.count == 2
+    assert aggregate.render() == generate_cmake([
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+    ])
+
+
+def test_deduplicates_in_first_seen_order():
+    invocations = [
+        parse_args(["-c", "-Ib", "-Ia", "-DY", "-Wall", "-o", "b.o", "src/b.cpp"]),
+        parse_args(["-c", "-Ia", "-Ic", "-DX", "-DY", "-Wall", "-o", "a.o", "src/a.cpp"]),
+        parse_args(["-c", "-Ib", "-o", "b2.o", "other/b.cpp"]),
+        parse_args(["b.o", "a.o", "b2.o", "-o", "myapp", "-lm", "-lz", "-lm"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "add_executable(myapp b.cpp a.cpp)" in result
+    assert "target_include_directories(myapp PRIVATE a)" in result
+    assert "target_compile_definitions(myapp PRIVATE Y)" in result
+    assert "target_compile_options(myapp PRIVATE -Wall)" in result
+    assert 'set_source_files_properties(b.cpp PROPERTIES INCLUDE_DIRECTORIES "b")' in result
+    assert 'set_source_files_properties(a.cpp PROPERTIES INCLUDE_DIRECTORIES "c" COMPILE_DEFINITIONS "X")' in result
+    assert "target_link_libraries(myapp PRIVATE m z)" in result
+
+
+def test_one_target_per_link_output():
+    invocations = [
+        parse_args(["-c", "-DSERVER", "-o", "server.o", "server.cpp"]),
+        parse_args(["-c", "-DCLIENT", "-o", "client.o", "client.cpp"]),
+        parse_args(["-c", "-o", "util.o", "util.cpp"]),
+        parse_args(["server.o", "util.o", "-o", "bin/server", "-lssl"]),
+        parse_args(["client.o", "util.o", "-o", "bin/client"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "project(server)" in result
+    # util.cpp is compiled once, for both executables
+    assert "add_executable(server server.cpp $<TARGET_OBJECTS:shared_objects>)" in result
+    assert "add_executable(client client.cpp $<TARGET_OBJECTS:shared_objects>)" in result
+    assert "add_library(shared_objects OBJECT util.cpp)" in result
+    assert "target_compile_definitions(server PRIVATE SERVER)" in result
+    assert "target_compile_definitions(client PRIVATE CLIENT)" in result
+    assert "target_link_libraries(server PRIVATE ssl)" in result
+    assert "target_link_libraries(client" not in result
+
+
+def test_shared_library_target():
+    invocations = [
+        parse_args(["-c", "-fPIC", "-o", "foo.o", "foo.cpp"]),
+        parse_args(["-shared", "foo.o", "-o", "libfoo.so.1"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "project(foo)" in result
+    assert "add_library(foo SHARED foo.cpp)" in result
+    assert "-shared" not in result
+
+
+def test_unlinked_compiles_go_to_first_target():
+    invocations = [
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["-c", "-o", "extra.o", "extra.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+    ]
+    assert "add_executable(myapp main.cpp extra.cpp)" in generate_cmake(invocations)
+
+
+def test_duplicate_target_names_are_disambiguated():
+    invocations = [
+        parse_args(["-c", "-o", "a.o", "a.cpp"]),
+        parse_args(["-c", "-o", "b.o", "b.cpp"]),
+        parse_args(["a.o", "-o", "x/app"]),
+        parse_args(["b.o", "-o", "y/app"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "add_executable(app a.cpp)" in result
+    assert "add_executable(app_2 b.cpp)" in result
+
+
+def test_compile_and_link_in_one_step():
+    invocations = [
+        parse_args(["-c", "-o", "lib.o", "lib.cpp"]),
+        parse_args(["-O2", "main.cpp", "lib.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "add_executable(myapp lib.cpp main.cpp)" in result
+    assert "-O2" in result
+
+
+def test_compiler_probes_are_ignored():
+    invocations = [
+        parse_args(["--version"]),
+        parse_args(["-dumpversion"]),
+        parse_args(["-E", "-dM", "-x", "c", "/dev/null"]),
+        parse_args(["-E", "-MM", "main.cpp"]),
+        parse_args(["-S", "main.cpp"]),
+        parse_args(["-c", "-E", "-o", "main.i", "main.cpp"]),
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "app"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "a.out" not in result
+    assert "-E" not in result and "null" not in result
+    assert "project(app)" in result
+    assert "add_executable(app main.cpp)" in result
+
+
+def test_same_object_name_in_two_directories():
+    def step(args, cwd):
+        return dict(parse_args(args), cwd=cwd)
+
+    invocations = [
+        step(["-c", "-DA", "-o", "main.o", "main.cpp"], "/src/a"),
+        step(["-c", "-DB", "-o", "main.o", "main.cpp"], "/src/b"),
+        step(["main.o", "-o", "a"], "/src/a"),
+        step(["main.o", "-o", "b"], "/src/b"),
+    ]
+    result = generate_cmake(invocations)
+    assert "shared_objects" not in result
+    assert "add_executable(a main.cpp)" in result
+    assert "add_executable(b main.cpp)" in result
+    assert "target_compile_definitions(a PRIVATE A)" in result
+    assert "target_compile_definitions(b PRIVATE B)" in result
+
+
+def test_source_of_two_targets_gets_guarded_properties():
+    invocations = [
+        parse_args(["-c", "-o", "server.o", "server.cpp"]),
+        parse_args(["-c", "-DSRV", "-o", "srv_util.o", "util.cpp"]),
+        parse_args(["-c", "-o", "client.o", "client.cpp"]),
+        parse_args(["-c", "-DCLI", "-DLIST=a,b", "-o", "cli_util.o", "util.cpp"]),
+        parse_args(["server.o", "srv_util.o", "-o", "server"]),
+        parse_args(["client.o", "cli_util.o", "-o", "client"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "set_source_files_properties(util.cpp" not in result
+    assert ('set_property(SOURCE util.cpp APPEND PROPERTY COMPILE_DEFINITIONS '
+            '"$<$<STREQUAL:$<TARGET_PROPERTY:NAME>,server>:SRV>")') in result
+    assert ('set_property(SOURCE util.cpp APPEND PROPERTY COMPILE_DEFINITIONS '
+            '"$<$<STREQUAL:$<TARGET_PROPERTY:NAME>,client>:CLI>;'
+            '$<$<STREQUAL:$<TARGET_PROPERTY:NAME>,client>:LIST=a$<COMMA>b>")') in result
+
+
+def test_recompiled_object_uses_latest_flags():
+    invocations = [
+        parse_args(["-c", "-O0", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+        parse_args(["-c", "-O2", "-o", "main.o", "main.cpp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "target_compile_options(myapp PRIVATE -O2)" in result
+
+
+def test_many_targets():
+    invocations = []
+    for i in range(2000):
+        invocations.append(parse_args(["-c", "-o", f"t{i}.o", f"t{i}.cpp"]))
+        invocations.append(parse_args([f"t{i}.o", "common.o", "-o", f"tool{i}"]))
+    invocations.append(parse_args(["-c", "-o", "common.o", "common.cpp"]))
+    result = generate_cmake(invocations)
+    assert result.count("add_executable(") == 2000
+    assert "add_executable(tool1999 t1999.cpp $<TARGET_OBJECTS:shared_objects>)" in result
+    assert result.count("common.cpp") == 1
+
+
+def test_per_source_flags_only_where_they_differ():
+    invocations = [
+        parse_args(["-c", "-O2", "-Wall", "-o", "hot.o", "hot.cpp"]),
+        parse_args(["-c", "-O0", "-g", "-Wall", "-o", "debug.o", "debug.cpp"]),
+        parse_args(["-c", "-O2", "-Wall", "-fPIC", "-o", "plugin.o", "plugin.cpp"]),
+        parse_args(["hot.o", "debug.o", "plugin.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "cmake_minimum_required(VERSION 3.11)" in result
+    assert "target_compile_options(myapp PRIVATE -Wall)" in result
+    assert 'set_source_files_properties(hot.cpp PROPERTIES COMPILE_OPTIONS "-O2")' in result
+    assert 'set_source_files_properties(debug.cpp PROPERTIES COMPILE_OPTIONS "-g;-O0")' in result
+    assert 'set_source_files_properties(plugin.cpp PROPERTIES COMPILE_OPTIONS "-O2;-fPIC")' in result
+
+
+def test_uniform_flags_need_no_source_properties():
+    invocations = [
+        parse_args(["-c", "-O2", "-DX", "-o", "a.o", "a.cpp"]),
+        parse_args(["-c", "-O2", "-DX", "-o", "b.o", "b.cpp"]),
+        parse_args(["a.o", "b.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "cmake_minimum_required(VERSION 3.10)" in result
+    assert "set_source_files_properties" not in result
+
+
+def test_per_source_standard():
+    invocations = [
+        parse_args(["-c", "-std=c++17", "-o", "main.o", "main.cpp"]),
+        parse_args(["-c", "-std=c99", "-o", "legacy.o", "legacy.c"]),
+        parse_args(["main.o", "legacy.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "set(CMAKE_CXX_STANDARD 17)" in result
+    assert "set(CMAKE_CXX_EXTENSIONS OFF)" in result
+    assert 'set_source_files_properties(legacy.c PROPERTIES COMPILE_OPTIONS "-std=c99")' in result
+
+
+def test_gnu_standard_keeps_extensions():
+    invocations = [
+        parse_args(["-c", "-std=gnu++11", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+    ]
+    assert "EXTENSIONS" not in generate_cmake(invocations)
+
+
+def test_source_property_quoting():
+    invocations = [
+        parse_args(["-c", '-DMSG="hi"', "-o", "a.o", "a.cpp"]),
+        parse_args(["-c", "-o", "b.o", "b.cpp"]),
+        parse_args(["a.o", "b.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert 'set_source_files_properties(a.cpp PROPERTIES COMPILE_DEFINITIONS "MSG=\\"hi\\"")' in result
+
+
+def test_machine_and_lto_flags_reach_compile_and_link():
+    invocations = [
+        parse_args(["-c", "-march=native", "-flto", "-o", "main.o", "main.cpp"]),
+        parse_args(["-march=native", "-flto", "main.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "target_compile_options(myapp PRIVATE -march=native -flto)" in result
+    assert "target_link_options(myapp PRIVATE -march=native -flto)" in result
+    assert "cmake_minimum_required(VERSION 3.13)" in result
+
+
+def test_linker_flags_reach_link():
+    invocations = [
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-Wl,--as-needed", "-Xlinker", "-rpath", "-Xlinker", "/opt/a",
+                    "-Xlinker", "-rpath", "-Xlinker", "/opt/b", "-Wl,-z,now", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "target_link_options(myapp PRIVATE LINKER:--as-needed,-rpath,/opt/a,-rpath,/opt/b,-z,now)" in result
+    assert "cmake_minimum_required(VERSION 3.13)" in result
+
+
+def test_system_includes_forced_includes_and_sysroot():
+    invocations = [
+        parse_args(["-c", "--sysroot=/sdk", "-isystem", "/opt/inc", "-include", "config.h",
+                    "-MD", "-MF", "main.o.d", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "set(CMAKE_SYSROOT /sdk)" in result
+    assert result.index("CMAKE_SYSROOT") < result.index("project(")
+    assert "target_include_directories(myapp SYSTEM PRIVATE /opt/inc)" in result
+    assert 'target_compile_options(myapp PRIVATE "SHELL:-include config.h")' in result
+    assert "main.o.d" not in result and "-MD" not in result
+
+
+def test_separate_value_options_are_grouped():
+    invocations = [
+        parse_args(["-c", "-Xclang", "-fno-pch-timestamp", "-o", "a.o", "a.cpp"]),
+        parse_args(["-c", "-Xclang", "-fno-pch-timestamp", "-Xclang", "-fno-color-diagnostics", "-o", "b.o", "b.cpp"]),
+        parse_args(["a.o", "b.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert 'target_compile_options(myapp PRIVATE "SHELL:-Xclang -fno-pch-timestamp")' in result
+    assert 'set_source_files_properties(b.cpp PROPERTIES COMPILE_OPTIONS "-Xclang;-fno-color-diagnostics")' in result
+
+
+def test_language_source_property():
+    invocations = [
+        parse_args(["-x", "c++", "-c", "-o", "gen.o", "gen.inc"]),
+        parse_args(["gen.o", "-o", "myapp"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "set_source_files_properties(gen.inc PROPERTIES LANGUAGE CXX)" in result
+
+
+def test_parallel_aggregation_matches_serial(tmp_path):
+    from cmakegen.cmake_generator import aggregate_invocations, aggregate_log
+    from cmakegen.invocation_log import iter_invocations, log_invocations
+    log = str(tmp_path / "build.jsonl")
+    invocations = []
+    for rebuild in range(3):  # repeated objects must keep their first position
+        for i in range(200):
+            invocations.append(parse_args(["-c", f"-DREBUILD={rebuild}", "-o", f"f{i}.o", f"f{i}.cpp"]))
+        invocations.append(parse_args([f"f{i}.o" for i in range(0, 200, 3)] + ["-o", f"app{rebuild % 2}"]))
+    log_invocations(log, invocations)
+    serial = aggregate_invocations(iter_invocations(log))
+    parallel = aggregate_log(log, jobs=3)
+    assert parallel.count == serial.count
+    assert list(parallel.compiles.items()) == list(serial.compiles.items())
+    assert list(parallel.links.items()) == list(serial.links.items())
+    assert parallel.render() == serial.render()
+
+
+def test_compiler_launcher():
+    invocations = [parse_args(["-c", "-o", "a.o", "a.cpp"]), parse_args(["a.o", "-o", "app"])]
+    result = generate_cmake(invocations, compiler_launcher="auto")
+    assert "find_program(CMAKEGEN_COMPILER_LAUNCHER NAMES ccache sccache)" in result
+    assert "  set(CMAKE_CXX_COMPILER_LAUNCHER ${CMAKEGEN_COMPILER_LAUNCHER})" in result
+    # Set before any target picks it up
+    assert result.index("CMAKE_CXX_COMPILER_LAUNCHER") < result.index("add_executable")
+    assert "NAMES sccache)" in generate_cmake(invocations, compiler_launcher="sccache")
+
+
+def test_fast_linker():
+    compile_step = parse_args(["-flto", "-march=haswell", "-c", "-o", "a.o", "a.cpp"])
+    link = parse_args(["a.o", "-flto", "-march=haswell", "-o", "app"])
+    result = generate_cmake([compile_step, link], linker="auto")
+    assert result.startswith("cmake_minimum_required(VERSION 3.18)")
+    assert "set(CMAKEGEN_LINKERS mold lld gold)" in result
+    assert "check_linker_flag(CXX -fuse-ld=${linker} CMAKEGEN_HAVE_LINKER_${linker})" in result
+    # GCC's LTO objects need a linker with its plugin
+    assert "list(REMOVE_ITEM CMAKEGEN_LINKERS lld)" in result
+    assert "target_link_options(app PRIVATE -march=haswell -flto)" in result
+
+    logged = parse_args(["a.o", "-fuse-ld=gold", "-o", "app"])
+    kept = generate_cmake([compile_step, logged], linker="auto")
+    assert "CheckLinkerFlag" not in kept
+    assert "-fuse-ld=gold" in kept
+    replaced = generate_cmake([compile_step, logged], linker="mold")
+    assert "set(CMAKEGEN_LINKERS mold)" in replaced
+    assert "-fuse-ld=gold" not in replaced
+
+
+def test_static_library_target():
+    invocations = [
+        parse_args(["-c", "-o", "a.o", "a.cpp"]),
+        parse_args(["-c", "-o", "b.o", "b.cpp"]),
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        # Long member lists are split over several ar calls
+        parse_ar_args(["qc", "libutil.a", "a.o"]),
+        parse_ar_args(["q", "libutil.a", "b.o"]),
+        parse_args(["main.o", "libutil.a", "-o", "app"]),
+        parse_args(["main.o", "-L.", "-lutil", "-lm", "-o", "app2"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "add_library(util STATIC a.cpp b.cpp)" in result
+    assert "target_link_libraries(app PRIVATE util)" in result
+    # -l names a target already
+    assert "target_link_libraries(app2 PRIVATE util m)" in result
+    assert "add_library(shared_objects OBJECT main.cpp)" in result
+
+
+def test_shared_library_versions():
+    invocations = [
+        parse_args(["-c", "-fPIC", "-o", "foo.o", "foo.cpp"]),
+        parse_args(["-shared", "foo.o", "-Wl,-soname,libfoo.so.1", "-o", "libfoo.so.1.2"]),
+        parse_args(["-c", "-o", "main.o", "main.cpp"]),
+        parse_args(["main.o", "libfoo.so.1.2", "/usr/lib/libz.so", "-o", "app"]),
+    ]
+    result = generate_cmake(invocations)
+    assert "set_target_properties(foo PROPERTIES VERSION 1.2 SOVERSION 1)" in result
+    assert "target_link_libraries(app PRIVATE foo /usr/lib/libz.so)" in result
+    assert "-soname" not in result
@@ -0,0 +1,92 @@
+"""Tests for cmakegen.compact."""
+
+import multiprocessing
+import os
+
+import pytest
+
+from cmakegen.cmake_generator import aggregate_log
+from cmakegen.compact import compact_log
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import log_invocation, log_invocations, read_invocations
+
+
+def _compile(name, *flags):
+    return parse_args(["-c", *flags, "-o", f"{name}.o", f"{name}.cpp"])
+
+
+@pytest.fixture(params=["build.jsonl", "build.cglog"])
+def log(tmp_path, request):
+    return str(tmp_path / request.param)
+
+
+def test_keeps_latest_record_per_key(log):
+    a, b, a2 = _compile("a"), _compile("b"), _compile("a", "-O2")
+    link = parse_args(["a.o", "b.o", "-o", "app"])
+    log_invocations(log, [a, b, link, a2, a, b, link])
+    before = aggregate_log(log, jobs=1)
+    assert compact_log(log) == (7, 4)
+    assert read_invocations(log) == [a2, a, b, link]
+    after = aggregate_log(log, jobs=1)
+    assert {obj: inv for obj, (_, inv) in after.compiles.items()} == \
+        {obj: inv for obj, (_, inv) in before.compiles.items()}
+    assert after.links == before.links
+    assert not [name for name in os.listdir(os.path.dirname(log)) if "compact" in name]
+
+
+def test_field_order_does_not_matter(log):
+    log_invocations(log, [{"output": "a.o", "compile_only": True}, {"compile_only": True, "output": "a.o"}])
+    assert compact_log(log) == (2, 1)
+
+
+def test_timed_reruns_keep_latest_timing(log):
+    def timed(inv, start, wall_ms):
+        return dict(inv, timing={"start": start, "wall_ms": wall_ms}, headers=[f"gen{start}.h"])
+
+    a, b = _compile("a"), _compile("b")
+    log_invocations(log, [timed(a, 1, 10.0), timed(b, 2, 20.0), timed(a, 3, 30.0)])
+    assert compact_log(log) == (3, 2)
+    assert read_invocations(log) == [timed(a, 3, 30.0), timed(b, 2, 20.0)]
+
+
+def test_partial_rebuild_keeps_generated_output(log):
+    x = _compile("x", "-fPIC")
+    main = _compile("main")
+    libx = parse_args(["-shared", "x.o", "-o", "libx.so"])
+    app = parse_args(["main.o", "libx.so", "-o", "app"])
+    log_invocations(log, [x, main, libx, app, x, libx])
+    before = aggregate_log(log, jobs=1).render()
+    assert compact_log(log) == (6, 4)
+    assert read_invocations(log) == [x, main, libx, app]
+    assert aggregate_log(log, jobs=1).render() == before
+    assert "project(x)" in before
+
+
+def test_unfinished_record_is_carried_over(tmp_path):
+    log = str(tmp_path / "build.jsonl")
+    log_invocations(log, [_compile("a"), _compile("a")])
+    with open(log, "a") as f:
+        f.write('{"output": "b.o"')
+    assert compact_log(log) == (2, 1)
+    with open(log) as f:
+        assert f.read().endswith('\n{"output": "b.o"')
+
+
+def _append_many(log, start, count):
+    for i in range(start, start + count):
+        log_invocation(log, _compile(f"f{i}"))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork and flock")
+def test_safe_while_appending(log):
+    log_invocations(log, [_compile(f"f{i % 50}") for i in range(2000)])
+    ctx = multiprocessing.get_context("fork")
+    writers = [ctx.Process(target=_append_many, args=(log, 1000 + 200 * n, 200)) for n in range(3)]
+    for writer in writers:
+        writer.start()
+    compact_log(log)
+    for writer in writers:
+        writer.join()
+    outputs = [inv["output"] for inv in read_invocations(log)]
+    assert sorted(o for o in outputs if int(o[1:-2]) >= 1000) == sorted(f"f{i}.o" for i in range(1000, 1600))
+    assert len(set(outputs)) == len(outputs) == 650
@@ -0,0 +1,133 @@
+"""Tests for cmakegen.daemon."""
+
+import os
+import threading
+
+import pytest
+
+from cmakegen.daemon import _STOP, Daemon, stop
+from cmakegen.invocation_log import read_invocations
+from cmakegen.proxy import send_to_daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires Unix domain sockets")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    d = Daemon(str(tmp_path / "d.sock"), str(tmp_path / "build.jsonl"))
+    thread = threading.Thread(target=d.serve_forever)
+    thread.start()
+    yield d
+    stop(d.socket_path)
+    thread.join(timeout=10)
+
+
+def test_logs_sent_invocations(daemon):
+    assert send_to_daemon(daemon.socket_path, ["-c", "-o", "main.o", "main.cpp"], "/src")
+    assert send_to_daemon(daemon.socket_path, ["main.o", "-o", "app"], "/src")
+    assert stop(daemon.socket_path)
+    invocations = read_invocations(daemon.log_path)
+    assert [inv["output"] for inv in invocations] == ["main.o", "app"]
+    assert invocations[0]["source_files"] == ["main.cpp"]
+    assert invocations[0]["cwd"] == "/src"
+
+
+def test_concurrent_clients(daemon):
+    def client(n):
+        for i in range(20):
+            assert send_to_daemon(daemon.socket_path, ["-c", f"file{n}_{i}.cpp"], "/src")
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stop(daemon.socket_path)
+    assert len(read_invocations(daemon.log_path)) == 160
+
+
+def test_removes_socket_on_exit(tmp_path):
+    d = Daemon(str(tmp_path / "d.sock"), str(tmp_path / "build.jsonl"))
+    thread = threading.Thread(target=d.serve_forever)
+    thread.start()
+    assert stop(d.socket_path)
+    thread.join(timeout=10)
+    assert not os.path.exists(d.socket_path)
+
+
+def test_send_without_daemon(tmp_path):
+    assert send_to_daemon(str(tmp_path / "missing.sock"), ["-c", "main.cpp"], "/src") is False
+
+
+def test_stop_without_daemon(tmp_path):
+    assert stop(str(tmp_path / "missing.sock")) is False
+
+
+def test_refuses_second_daemon(daemon, tmp_path):
+    with pytest.raises(RuntimeError):
+        Daemon(daemon.socket_path, str(tmp_path / "other.jsonl"))
+
+
+def test_timing_is_passed_through(daemon):
+    timing = {"wall_ms": 12.5, "exit_status": 0}
+    assert send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src", timing)
+    assert stop(daemon.socket_path)
+    assert read_invocations(daemon.log_path)[0]["timing"] == timing
+
+
+def test_headers_are_passed_through(daemon):
+    assert send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src", headers=["main.h"])
+    assert stop(daemon.socket_path)
+    assert read_invocations(daemon.log_path)[0]["headers"] == ["main.h"]
+
+
+def test_archiver_messages(daemon):
+    assert send_to_daemon(daemon.socket_path, ["rcs", "libfoo.a", "a.o"], "/src", kind="archiver")
+    assert send_to_daemon(daemon.socket_path, ["t", "libfoo.a"], "/src", kind="archiver")
+    assert stop(daemon.socket_path)
+    invocations = read_invocations(daemon.log_path)
+    assert len(invocations) == 1
+    assert invocations[0]["archive"] and invocations[0]["object_files"] == ["a.o"]
+
+
+def _send_raw(socket_path, data):
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(data)
+        client.shutdown(socket.SHUT_WR)
+        return client.recv(16)
+    finally:
+        client.close()
+
+
+def test_rejects_malformed_argv(daemon):
+    assert _send_raw(daemon.socket_path, b'{"argv": [1, 2], "cwd": "/src"}') == b"error\n"
+    assert send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src")
+    assert stop(daemon.socket_path)
+    assert [inv["source_files"] for inv in read_invocations(daemon.log_path)] == [["main.cpp"]]
+
+
+def test_writer_survives_failing_message(daemon, monkeypatch, capsys):
+    parse = daemon._parse_cache.parse
+
+    def failing_parse(argv):
+        if "bad.cpp" in argv:
+            raise RuntimeError("boom")
+        return parse(argv)
+
+    monkeypatch.setattr(daemon._parse_cache, "parse", failing_parse)
+    assert send_to_daemon(daemon.socket_path, ["-c", "bad.cpp"], "/src")
+    daemon.flush()
+    assert send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src")
+    assert stop(daemon.socket_path)
+    assert [inv["source_files"] for inv in read_invocations(daemon.log_path)] == [["main.cpp"]]
+    assert "boom" in capsys.readouterr().err
+
+
+def test_no_ack_without_writer(daemon):
+    assert send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src")  # writer started
+    daemon._queue.put(_STOP)
+    daemon._writer.join(timeout=10)
+    assert not send_to_daemon(daemon.socket_path, ["-c", "main.cpp"], "/src")
@@ -0,0 +1,44 @@
+"""Tests for cmakegen.depfile."""
+
+from cmakegen.depfile import capture, depfile_path, parse_depfile, read_headers
+from cmakegen.flag_parser import parse_args
+
+
+def test_parse_depfile():
+    text = ("obj/a.o: src/a.cpp /usr/include/c++/12/vector \\\n"
+            "  include/my\\ header.h /opt/lib$$/x.h\n"
+            "/usr/include/c++/12/vector:\n")
+    assert parse_depfile(text) == ["src/a.cpp", "/usr/include/c++/12/vector",
+                                   "include/my header.h", "/opt/lib$/x.h"]
+    assert parse_depfile("") == []
+
+
+def test_depfile_path():
+    assert depfile_path(parse_args(["-MD", "-MF", "a.d", "-c", "-o", "a.o", "a.cpp"])) == "a.d"
+    assert depfile_path(parse_args(["-MMD", "-c", "-o", "obj/a.o", "a.cpp"])) == "obj/a.d"
+    assert depfile_path(parse_args(["-MMD", "-c", "src/a.cpp"])) == "a.d"
+    assert depfile_path(parse_args(["-c", "-o", "a.o", "a.cpp"])) is None
+
+
+def test_capture(monkeypatch):
+    monkeypatch.setenv("TMPDIR", "/scratch")
+    arguments = ["-c", "-o", "a.o", "a.cpp"]
+    command, path, remove = capture(arguments, parse_args(arguments))
+    assert command[:4] == arguments and command[4:6] == ["-MD", "-MF"]
+    assert path.startswith("/scratch/cmakegen-") and remove
+
+    # The build's own depfile is read and left alone
+    arguments = ["-MMD", "-c", "-o", "a.o", "a.cpp"]
+    assert capture(arguments, parse_args(arguments)) == (arguments, "a.d", False)
+
+    for arguments in (["a.o", "-o", "app"], ["-c", "a.cpp", "b.cpp"], ["-E", "a.cpp"], ["-MM", "-c", "a.cpp"]):
+        assert capture(arguments, parse_args(arguments)) is None
+
+
+def test_read_headers(tmp_path):
+    (tmp_path / "a.d").write_text("a.o: a.cpp a.h \\\n /usr/include/stdio.h\n")
+    assert read_headers(str(tmp_path), "a.d") == ["a.h", "/usr/include/stdio.h"]
+    assert (tmp_path / "a.d").exists()
+    assert read_headers(str(tmp_path), "a.d", remove=True) == ["a.h", "/usr/include/stdio.h"]
+    assert not (tmp_path / "a.d").exists()
+    assert read_headers(str(tmp_path), "a.d") is None
@@ -1,6 +1,6 @@
 """Tests for cmakegen.flag_parser."""
 
-from cmakegen.flag_parser import parse_args
+from cmakegen.flag_parser import parse_ar_args, parse_args
 
 
 def test_compile_only():
@@ -122,3 +122,142 @@ def test_combined():
     assert result["compile_only"] is True
     assert result["output"] == "main.o"
     assert result["source_files"] == ["main.cpp"]
+
+
+def test_system_and_forced_includes():
+    result = parse_args(["-isystem", "/opt/inc", "-isystem/usr/x", "-include", "pch.h", "-c", "a.cpp"])
+    assert result["system_include_dirs"] == ["/opt/inc", "/usr/x"]
+    assert result["forced_includes"] == ["pch.h"]
+    assert result["include_dirs"] == []
+
+
+def test_machine_lto_and_sysroot():
+    result = parse_args(["-march=native", "-m64", "-arch", "arm64", "-flto=thin",
+                         "--sysroot=/sdk", "--target=aarch64-linux-gnu", "-c", "a.c"])
+    assert result["machine_flags"] == ["-march=native", "-m64", "-arch", "arm64", "--target=aarch64-linux-gnu"]
+    assert result["lto"] == "-flto=thin"
+    assert result["sysroot"] == "/sdk"
+    assert result["other_flags"] == []
+
+
+def test_linker_choice():
+    result = parse_args(["a.o", "-fuse-ld=mold", "-o", "app"])
+    assert result["linker"] == "mold"
+    assert result["other_flags"] == []
+
+
+def test_dependency_flags_values_are_not_inputs():
+    result = parse_args(["-MMD", "-MP", "-MF", "main.o.d", "-MT", "main.o", "-c", "-o", "main.o", "main.cpp"])
+    assert result["depfile"] == "main.o.d"
+    assert result["dependency_flags"] == ["-MMD", "-MP", "-MT", "main.o"]
+    assert result["object_files"] == []
+    assert result["source_files"] == ["main.cpp"]
+
+
+def test_separate_values_stay_with_their_option():
+    result = parse_args(["-Xclang", "-fcolor-diagnostics", "-Xlinker", "--as-needed", "-T", "link.ld", "-O", "a.o"])
+    assert result["other_flags"] == ["-Xclang", "-fcolor-diagnostics", "-T", "link.ld"]
+    assert result["linker_flags"] == ["-Wl,--as-needed"]
+    assert result["optimization"] == "1"
+    assert result["object_files"] == ["a.o"]
+
+
+def test_language_makes_any_input_a_source():
+    result = parse_args(["-x", "c++", "-c", "gen.inc"])
+    assert result["language"] == "c++"
+    assert result["source_files"] == ["gen.inc"]
+
+
+def test_null_device_and_stdin_are_not_sources():
+    probe = parse_args(["-E", "-dM", "-x", "c", "/dev/null"])
+    assert probe["source_files"] == []
+    assert probe["other_flags"] == ["-E", "-dM"]
+    stdin = parse_args(["-x", "c++", "-c", "-", "-o", "out.o"])
+    assert stdin["source_files"] == []
+    assert stdin["other_flags"] == []
+
+
+def test_split_per_tu_args():
+    from cmakegen.flag_parser import split_per_tu_args
+    flags, per_tu, values = split_per_tu_args(["-I", "gen.c", "-O2", "-c", "-o", "main.o", "main.cpp", "lib.o"])
+    assert flags == ["-I", "gen.c", "-O2", "-c"]
+    assert per_tu == ["-o", "main.o", "main.cpp", "lib.o"]
+    assert values == []
+
+
+def test_parse_cache_hits_on_cmake_command_lines():
+    from cmakegen.flag_parser import ParseCache
+    cache = ParseCache()
+    argvs = []
+    for i in range(100):
+        obj = f"CMakeFiles/app.dir/src/f{i}.cpp.o"
+        argvs.append(["-DAPP", "-I/src/include", "-O2", "-g", "-std=gnu++17", "-MD", "-MT", obj,
+                      "-MF", f"{obj}.d", "-o", obj, "-c", f"/src/f{i}.cpp"])
+    argvs.append(["-MD", "-MTjoined.o", "-MQ", "$(objdir)/q.o", "-MFjoined.d", "-c", "joined.cpp"])
+    for argv in argvs:
+        assert cache.parse(argv) == parse_args(argv)
+    assert (cache.hits, cache.misses) == (99, 2)
+
+
+def test_parse_cache_matches_parse_args():
+    from cmakegen.flag_parser import ParseCache
+    cache = ParseCache()
+    argvs = [
+        ["-g", "-O2", "-Iinc", "-DX", "-c", "-o", "a.o", "a.cpp"],
+        ["-g", "-O2", "-Iinc", "-DX", "-c", "-o", "b.o", "b.cpp"],
+        ["-g", "-O2", "-Iinc", "-DX", "-c", "c.cpp"],
+        ["a.o", "b.o", "-o", "app", "-lm", "-Wl,-z,now"],
+        ["-I", "gen.c", "-c", "-o"],
+        ["-g", "-O2", "-Iinc", "-DX", "-c", "-oa.o", "a.cpp"],
+        ["-x", "c", "-c", "-o", "gen.o", "gen.inc"],
+        ["-x", "c", "-c", "-o", "gen2.o", "gen2.inc"],
+        [],
+    ]
+    for argv in argvs + argvs:
+        assert cache.parse(argv) == parse_args(argv)
+    assert cache.hits >= len(argvs)
+
+
+def test_parse_cache_results_are_independent():
+    from cmakegen.flag_parser import ParseCache
+    cache = ParseCache()
+    first = cache.parse(["-Iinc", "-c", "a.cpp"])
+    first["include_dirs"].append("other")
+    assert cache.parse(["-Iinc", "-c", "b.cpp"])["include_dirs"] == ["inc"]
+
+
+def test_parse_cache_evicts_least_recently_used():
+    from cmakegen.flag_parser import ParseCache
+    cache = ParseCache(maxsize=2)
+    cache.parse(["-DA", "-c", "x.cpp"])
+    cache.parse(["-DB", "-c", "x.cpp"])
+    cache.parse(["-DA", "-c", "y.cpp"])  # refreshes A
+    cache.parse(["-DC", "-c", "x.cpp"])  # evicts B
+    assert len(cache) == 2
+    misses = cache.misses
+    cache.parse(["-DA", "-c", "z.cpp"])
+    assert cache.misses == misses
+    cache.parse(["-DB", "-c", "z.cpp"])
+    assert cache.misses == misses + 1
+
+
+def test_library_files_and_soname():
+    result = parse_args(["-shared", "a.o", "libdep.a", "/opt/lib/libx.so.2", "-Wl,-soname,libfoo.so.1",
+                         "-o", "libfoo.so.1.2"])
+    assert result["object_files"] == ["a.o"]
+    assert result["library_files"] == ["libdep.a", "/opt/lib/libx.so.2"]
+    assert result["soname"] == "libfoo.so.1"
+    assert parse_args(["-shared", "-Wl,-h,libbar.so", "-o", "libbar.so"])["soname"] == "libbar.so"
+
+
+def test_parse_ar_args():
+    assert parse_ar_args(["qc", "libfoo.a", "a.o", "b.o"]) == {
+        "archive": True, "output": "libfoo.a", "object_files": ["a.o", "b.o"],
+        "source_files": [], "compile_only": False,
+    }
+    assert parse_ar_args(["-rcs", "libfoo.a", "a.o"])["object_files"] == ["a.o"]
+    assert parse_ar_args(["--plugin", "liblto.so", "rcs", "libfoo.a", "a.o"])["output"] == "libfoo.a"
+    # b takes the member to insert before
+    assert parse_ar_args(["rb", "x.o", "libfoo.a", "a.o"])["output"] == "libfoo.a"
+    assert parse_ar_args(["t", "libfoo.a"]) is None
+    assert parse_ar_args(["x", "libfoo.a", "a.o"]) is None
@@ -0,0 +1,92 @@
+"""Tests for cmakegen.importer."""
+
+import io
+import json
+
+from cmakegen import importer
+from cmakegen.flag_parser import parse_args
+from cmakegen.importer import compiler_arguments, import_file, iter_compile_commands, iter_shell_commands
+from cmakegen.invocation_log import read_invocations
+
+
+def test_compile_commands_arguments_and_command():
+    database = [
+        {"directory": "/build", "file": "a.cpp", "arguments": ["/usr/bin/c++", "-O2", "-c", "a.cpp", "-o", "a.o"]},
+        {"directory": "sub", "file": "b.c", "command": 'ccache gcc -DMSG="a b" -c b.c -o b.o'},
+    ]
+    commands = list(iter_compile_commands(io.StringIO(json.dumps(database, indent=2)), "/root"))
+    assert commands == [
+        (["-O2", "-c", "a.cpp", "-o", "a.o"], "/build"),
+        (["-DMSG=a b", "-c", "b.c", "-o", "b.o"], "/root/sub"),
+    ]
+
+
+def test_compile_commands_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(importer, "_CHUNK_SIZE", 7)
+    database = [{"directory": "/b", "arguments": ["cc", "-c", f"f{i}.c"]} for i in range(50)]
+    commands = list(iter_compile_commands(io.StringIO(json.dumps(database))))
+    assert [argv[-1] for argv, _ in commands] == [f"f{i}.c" for i in range(50)]
+
+
+def test_ninja_commands():
+    lines = [
+        "cd /build/sub && /usr/bin/c++ -Iinc -c ../a.cpp -o a.o\n",
+        "/usr/bin/cmake -E echo hi\n",
+        ": && /usr/bin/c++ -O2 a.o -o app && :\n",
+        "/usr/bin/ar qc libx.a a.o\n",
+    ]
+    assert list(iter_shell_commands(lines, "/build")) == [
+        (["-Iinc", "-c", "../a.cpp", "-o", "a.o"], "/build/sub"),
+        (["-O2", "a.o", "-o", "app"], "/build"),
+    ]
+
+
+def test_make_dry_run_directories_and_continuations():
+    lines = [
+        "make[1]: Entering directory '/src/lib'\n",
+        "gcc -c -o x.o \\\n",
+        "    x.c\n",
+        "make[1]: Leaving directory '/src/lib'\n",
+        "echo gcc done\n",
+        "CCACHE_DIR=/tmp ccache x86_64-linux-gnu-g++-12 -c main.cpp\n",
+    ]
+    assert list(iter_shell_commands(lines, "/src")) == [
+        (["-c", "-o", "x.o", "x.c"], "/src/lib"),
+        (["-c", "main.cpp"], "/src"),
+    ]
+
+
+def test_compiler_detection():
+    assert compiler_arguments(["clang++-17", "-c", "a.cpp"]) == ["-c", "a.cpp"]
+    assert compiler_arguments(["sccache", "cc", "-c", "a.c"]) == ["-c", "a.c"]
+    assert compiler_arguments(["gcc-ar", "rcs", "lib.a"]) is None
+    assert compiler_arguments(["clang-tidy", "a.cpp"]) is None
+
+
+def test_import_file_writes_the_log(tmp_path):
+    database = tmp_path / "compile_commands.json"
+    database.write_text(json.dumps([
+        {"directory": str(tmp_path), "arguments": ["cc", "-Iinc", "-c", f"f{i}.c", "-o", f"f{i}.o"]}
+        for i in range(600)
+    ]))
+    log = tmp_path / "build.jsonl"
+    assert import_file(str(database), str(log), jobs=2) == 600
+    invocations = read_invocations(str(log))
+    assert [inv["source_files"] for inv in invocations] == [[f"f{i}.c"] for i in range(600)]
+    expected = parse_args(["-Iinc", "-c", "f0.c", "-o", "f0.o"])
+    expected["cwd"] = str(tmp_path)
+    assert invocations[0] == expected
+
+
+def test_import_detects_command_listings(tmp_path):
+    listing = tmp_path / "commands.txt"
+    listing.write_text("cd /b && cc -c a.c -o a.o\ncc a.o -o app\n")
+    log = tmp_path / "build.jsonl"
+    assert import_file(str(listing), str(log), jobs=1) == 2
+    assert [inv["output"] for inv in read_invocations(str(log))] == ["a.o", "app"]
+
+
+def test_cmake_link_scripts_are_followed(tmp_path):
+    (tmp_path / "link.txt").write_text("/usr/bin/c++ -O2 main.o -o app -lm\n")
+    lines = [f"cd {tmp_path} && /usr/bin/cmake -E cmake_link_script link.txt --verbose=\n"]
+    assert list(iter_shell_commands(lines)) == [(["-O2", "main.o", "-o", "app", "-lm"], str(tmp_path))]
@@ -0,0 +1,76 @@
+"""Tests for cmakegen.include_graph."""
+
+import os
+
+import pytest
+
+from cmakegen import include_graph
+from cmakegen.include_graph import (build_index, costliest_headers, find_headers, format_costliest,
+                                    index_summary, open_index, rebuilt_by)
+from cmakegen.invocation_log import log_invocations
+
+
+def _compile(source, headers, wall_ms=None, cwd="/src"):
+    invocation = {"source_files": [source], "compile_only": True, "output": source + ".o",
+                  "cwd": cwd, "headers": headers}
+    if wall_ms is not None:
+        invocation["timing"] = {"wall_ms": wall_ms}
+    return invocation
+
+
+@pytest.mark.parametrize("log_name", ["build.jsonl", "build.cglog"])
+def test_queries(tmp_path, log_name):
+    log_path = str(tmp_path / log_name)
+    log_invocations(log_path, [
+        _compile("a.cpp", ["a.h", "/usr/include/vector"], 1000),
+        _compile("b.cpp", ["include/../a.h", "/usr/include/vector", "/usr/include/vector"], 3000),
+        _compile("c.cpp", ["/usr/include/vector"], 500),
+        # A rebuild of c.cpp that no longer reads vector
+        _compile("c.cpp", ["c.h"], 400),
+        {"source_files": [], "object_files": ["a.cpp.o"], "output": "app", "cwd": "/src"},
+    ])
+    assert build_index(log_path) == (3, 5)
+    conn = open_index(log_path)
+    assert index_summary(conn) == (3, 3)
+    assert find_headers(conn, "/src/a.h") == ["/src/a.h"]
+    assert find_headers(conn, "include/vector") == ["/usr/include/vector"]
+    assert find_headers(conn, "h") == []
+    assert rebuilt_by(conn, "/usr/include/vector") == [("/src/a.cpp", 1000), ("/src/b.cpp", 3000)]
+    assert rebuilt_by(conn, "/src/nothing.h") == []
+    assert costliest_headers(conn) == [("/src/a.h", 2, 4000), ("/usr/include/vector", 2, 4000),
+                                       ("/src/c.h", 1, 400)]
+    report = format_costliest(costliest_headers(conn, 1), 3, 3)
+    assert report.startswith("Costliest headers (top 1 of 3, read by 3 TUs):")
+    assert "/src/a.h    2    67%        4.0" in report
+
+
+def test_depfiles_and_posting_flushes(tmp_path, monkeypatch):
+    monkeypatch.setattr(include_graph, "POSTINGS_FLUSH_EDGES", 2)
+    (tmp_path / "a.d").write_text("a.o: a.cpp common.h a.h\n")
+    (tmp_path / "b.d").write_text("b.o: b.cpp common.h\n")
+    log_path = str(tmp_path / "build.jsonl")
+    cwd = str(tmp_path)
+    log_invocations(log_path, [
+        {"source_files": ["a.cpp"], "compile_only": True, "output": "a.o", "depfile": "a.d", "cwd": cwd},
+        {"source_files": ["b.cpp"], "compile_only": True, "output": "b.o", "dependency_flags": ["-MD"],
+         "cwd": cwd},
+        # No depfile to read
+        {"source_files": ["c.cpp"], "compile_only": True, "output": "c.o", "cwd": cwd},
+    ])
+    conn = open_index(log_path)
+    assert os.path.exists(log_path + ".deps.sqlite")
+    assert index_summary(conn) == (2, 2)
+    common = os.path.join(cwd, "common.h")
+    assert [source for source, _ in rebuilt_by(conn, common)] == [os.path.join(cwd, "a.cpp"),
+                                                                  os.path.join(cwd, "b.cpp")]
+    # Untimed builds rank by fan-out alone
+    assert costliest_headers(conn) == [(common, 2, None), (os.path.join(cwd, "a.h"), 1, None)]
+
+
+def test_index_is_rebuilt_when_the_log_changes(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    log_invocations(log_path, [_compile("a.cpp", ["a.h"])])
+    assert index_summary(open_index(log_path)) == (1, 1)
+    log_invocations(log_path, [_compile("b.cpp", ["b.h"])])
+    os.utime(log_path, (os.path.getmtime(log_path) + 10,) * 2)
+    assert index_summary(open_index(log_path)) == (2, 2)
@@ -47,3 +47,147 @@ def test_read_nonexistent(log_path):
 def test_clear_nonexistent(log_path):
     # Should not raise
     clear_log(log_path)
+
+
+@pytest.mark.parametrize("value", [
+    {"source_files": ["main.cpp"], "output": None, "debug": True, "pic": False},
+    {"defines": ['MSG="hi there"', "PATH=C:\\dir", "TAB=\t", "CTRL=\x01"]},
+    {"other_flags": ["-DNAME=caf\u00e9", "\U0001f600"], "count": 3, "time": 1.5},
+    [1, 2.25, -7, "x"],
+])
+def test_dumps_matches_json(value):
+    import json
+    from cmakegen.invocation_log import _dumps
+    assert _dumps(value) == json.dumps(value)
+
+
+def test_truncated_trailing_record(log_path):
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    with open(log_path, "a") as f:
+        f.write('{"source_files": ["imp')
+    with pytest.warns(UserWarning, match="truncated"):
+        result = read_invocations(log_path)
+    assert result == [{"source_files": ["main.cpp"]}]
+
+
+def test_corrupt_record_in_middle_skipped(log_path):
+    with open(log_path, "w") as f:
+        f.write('{"source_files": ["imp\n')
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    with pytest.warns(UserWarning, match="malformed record at byte 0"):
+        assert read_invocations(log_path) == [{"source_files": ["main.cpp"]}]
+
+
+def test_append_after_partial_record(log_path):
+    from cmakegen.invocation_log import iter_invocations_from
+    log_invocation(log_path, {"source_files": ["a.cpp"]})
+    with open(log_path, "a") as f:
+        f.write('{"source_files": ["imp')  # writer killed mid-record
+    log_invocation(log_path, {"source_files": ["b.cpp"]})
+    with pytest.warns(UserWarning, match="malformed"):
+        assert read_invocations(log_path) == [{"source_files": ["a.cpp"]}, {"source_files": ["b.cpp"]}]
+    with pytest.warns(UserWarning, match="malformed"):
+        ends = [end for end, _ in iter_invocations_from(log_path)]
+    assert ends[-1] == os.path.getsize(log_path)
+
+
+def _stress_writer(log_path, writer_id, records):
+    for i in range(records):
+        # Far beyond PIPE_BUF, like a compile line with thousands of -D flags
+        defines = [f"WRITER_{writer_id}_RECORD_{i}_DEFINE_{n}=1" for n in range(2000)]
+        log_invocation(log_path, {"writer": writer_id, "record": i, "defines": defines})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="forks hundreds of writer processes")
+def test_concurrent_writers(log_path):
+    import multiprocessing
+
+    writers, records = 200, 3
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_stress_writer, args=(log_path, w, records)) for w in range(writers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    result = read_invocations(log_path)
+    assert len(result) == writers * records
+    assert {(inv["writer"], inv["record"]) for inv in result} == {
+        (w, i) for w in range(writers) for i in range(records)}
+    for inv in result:
+        assert len(inv["defines"]) == 2000
+        assert inv["defines"][-1] == f"WRITER_{inv['writer']}_RECORD_{inv['record']}_DEFINE_1999=1"
+
+
+def test_iter_invocations_is_lazy(log_path):
+    from cmakegen.invocation_log import iter_invocations
+    log_invocation(log_path, {"source_files": ["main.cpp"]})
+    log_invocation(log_path, {"source_files": ["impl0.cpp"]})
+    records = iter_invocations(log_path)
+    assert next(records) == {"source_files": ["main.cpp"]}
+    assert list(records) == [{"source_files": ["impl0.cpp"]}]
+
+
+def test_split_log_ranges_cover_whole_lines(tmp_path):
+    from cmakegen.invocation_log import iter_invocations, log_invocations, split_log
+    log = str(tmp_path / "build.jsonl")
+    log_invocations(log, [{"n": i, "pad": "x" * (i % 17)} for i in range(500)])
+    for parts in (1, 2, 7, 64, 5000):
+        ranges = split_log(log, parts)
+        assert len(ranges) <= parts
+        assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(log)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        records = [inv["n"] for start, end in ranges for inv in iter_invocations(log, start, end)]
+        assert records == list(range(500))
+
+
+def test_mapped_log_index_and_filters(tmp_path):
+    from cmakegen.invocation_log import MappedLog, log_invocations
+    log = str(tmp_path / "build.jsonl")
+    records = [
+        {"compile_only": True, "output": "a.o", "other_flags": ["\"output\": \"app\""]},
+        {"compile_only": True, "output": "b.o"},
+        {"compile_only": False, "output": "app"},
+        {"output": "app.o", "compile_only": False},
+    ]
+    log_invocations(log, records)
+    with open(log, "a") as f:
+        f.write("\n")
+    with MappedLog(log) as mapped:
+        assert len(mapped) == 4
+        assert [mapped[i] for i in range(4)] == records
+        assert [r for _, r in mapped.iter_records(compile_only=True)] == records[:2]
+        assert [r for _, r in mapped.iter_records(compile_only=False)] == records[2:]
+        matches = list(mapped.iter_records(output="app"))
+        assert [r for _, r in matches] == [records[2]]
+        assert mapped.record_at(matches[0][0]) == records[2]
+
+
+def test_mapped_log_fields(tmp_path):
+    from cmakegen.invocation_log import MappedLog, log_invocations
+    log = str(tmp_path / "build.jsonl")
+    long_sources = [f"src/file{i}.cpp" for i in range(200)]
+    log_invocations(log, [
+        {"other_flags": ['"cwd": "/wrong"'], "cwd": "/src", "source_files": ["a.cpp"]},
+        {"source_files": long_sources, "archive": True},
+    ])
+    with MappedLog(log) as mapped:
+        first, second = mapped.offsets
+        assert mapped.fields(first, ("source_files", "cwd", "archive")) == \
+            {"cwd": "/src", "source_files": ["a.cpp"]}
+        assert mapped.fields(second, ("source_files", "archive")) == \
+            {"source_files": long_sources, "archive": True}
+
+
+def test_mapped_log_truncated_tail_and_empty(tmp_path):
+    from cmakegen.invocation_log import MappedLog
+    log = tmp_path / "build.jsonl"
+    log.write_text('{"output": "a.o"}\n{"output": "b')
+    with MappedLog(str(log)) as mapped:
+        with pytest.warns(UserWarning, match="truncated"):
+            assert [r for _, r in mapped.iter_records()] == [{"output": "a.o"}]
+    log.write_text("")
+    with MappedLog(str(log)) as mapped:
+        assert len(mapped) == 0
+        assert list(mapped.iter_records()) == []
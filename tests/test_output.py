@@ -0,0 +1,73 @@
+"""Tests for cmakegen.output."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cmakegen import output
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import log_invocations
+from cmakegen.output import write_if_changed, write_outputs
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unchanged_content_is_not_rewritten(tmp_path):
+    path = str(tmp_path / "CMakeLists.txt")
+    assert write_if_changed(path, "project(a)\n")
+    os.utime(path, (0, 0))
+    assert not write_if_changed(path, "project(a)\n")
+    assert os.stat(path).st_mtime == 0
+    # Same size, different content
+    assert write_if_changed(path, "project(b)\n")
+    assert open(path).read() == "project(b)\n"
+    assert os.listdir(tmp_path) == ["CMakeLists.txt"]
+
+
+def test_permissions_are_kept(tmp_path):
+    path = tmp_path / "CMakeLists.txt"
+    path.write_text("old")
+    path.chmod(0o640)
+    assert write_if_changed(str(path), "new")
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_several_files(tmp_path):
+    files = {str(tmp_path / "CMakeLists.txt"): "add_subdirectory(lib)\n",
+             str(tmp_path / "lib" / "CMakeLists.txt"): "add_library(lib lib.cpp)\n"}
+    assert write_outputs(files) == list(files)
+    files[str(tmp_path / "lib" / "CMakeLists.txt")] = "add_library(lib STATIC lib.cpp)\n"
+    assert write_outputs(files) == [str(tmp_path / "lib" / "CMakeLists.txt")]
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("old")
+    staged = output._stage
+
+    def stage(path, data):
+        if path.endswith("b.txt"):
+            raise OSError("disk full")
+        return staged(path, data)
+
+    monkeypatch.setattr(output, "_stage", stage)
+    with pytest.raises(OSError):
+        write_outputs({str(tmp_path / "a.txt"): "new", str(tmp_path / "b.txt"): "new"})
+    # Nothing is renamed into place unless every file could be written
+    assert sorted(os.listdir(tmp_path)) == ["a.txt"]
+    assert (tmp_path / "a.txt").read_text() == "old"
+
+
+def test_generate_skips_unchanged_output(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    log_invocations(log_path, [parse_args(["-c", "-o", "a.o", "a.cpp"])])
+    out = str(tmp_path / "CMakeLists.txt")
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    command = [sys.executable, "-m", "cmakegen", "generate", "--log", log_path, "-o", out]
+    first = subprocess.run(command, env=env, capture_output=True, text=True)
+    assert first.stdout.startswith("CMakeLists.txt written")
+    os.utime(out, (0, 0))
+    second = subprocess.run(command, env=env, capture_output=True, text=True)
+    assert second.stdout == f"{out} is up to date\n"
+    assert os.stat(out).st_mtime == 0
@@ -0,0 +1,101 @@
+"""Tests for cmakegen.proxy."""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from cmakegen.invocation_log import read_invocations
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses POSIX true/false as the real compiler")
+
+
+def run_proxy(compiler, args, log_path):
+    code = f"import sys; from cmakegen.proxy import main; main({compiler!r})"
+    env = dict(os.environ, CMAKEGEN_LOG=log_path, PYTHONPATH=ROOT_DIR)
+    return subprocess.run([sys.executable, "-c", code] + args, env=env)
+
+
+def test_logs_and_forwards(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    proc = run_proxy("true", ["-std=c++17", "-c", "-o", "main.o", "main.cpp"], log_path)
+    assert proc.returncode == 0
+    invocations = read_invocations(log_path)
+    assert len(invocations) == 1
+    assert invocations[0]["source_files"] == ["main.cpp"]
+    assert invocations[0]["std"] == "c++17"
+
+
+def test_propagates_exit_status(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    proc = run_proxy("false", ["-c", "main.cpp"], log_path)
+    assert proc.returncode == 1
+    assert len(read_invocations(log_path)) == 1
+
+
+def test_missing_compiler(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    proc = run_proxy("cmakegen-no-such-compiler", ["-c", "main.cpp"], log_path)
+    assert proc.returncode == 127
+
+
+def test_does_not_import_json_or_re(tmp_path):
+    code = ("import sys; from cmakegen.proxy import run; "
+            "print(' '.join(m for m in ('json', 're', 'subprocess') if m in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    proc = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert proc.stdout.strip() == ""
+
+
+def test_falls_back_without_daemon(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    code = "from cmakegen.proxy import main; main('true')"
+    env = dict(os.environ, CMAKEGEN_LOG=log_path, PYTHONPATH=ROOT_DIR,
+               CMAKEGEN_SOCKET=str(tmp_path / "missing.sock"))
+    proc = subprocess.run([sys.executable, "-c", code, "-c", "main.cpp"], env=env, cwd=str(tmp_path))
+    assert proc.returncode == 0
+    invocations = read_invocations(log_path)
+    assert invocations[0]["source_files"] == ["main.cpp"]
+    assert invocations[0]["cwd"] == str(tmp_path)
+
+
+def test_timing_records_the_compile(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    code = "from cmakegen.proxy import main; main('cp')"
+    env = dict(os.environ, CMAKEGEN_LOG=log_path, PYTHONPATH=ROOT_DIR, CMAKEGEN_TIMING="1")
+    (tmp_path / "in.c").write_text("x" * 2000)
+    proc = subprocess.run([sys.executable, "-c", code, "in.c", "-o", "out.o"], env=env, cwd=str(tmp_path))
+    assert proc.returncode == 1  # cp rejects -o; the status still comes through
+    proc = subprocess.run([sys.executable, "-c", "from cmakegen.proxy import main; main('true')",
+                           "-c", "-o", "in.c", "main.cpp"], env=env, cwd=str(tmp_path))
+    assert proc.returncode == 0
+    failed, timed = read_invocations(log_path)
+    assert failed["timing"]["exit_status"] == 1
+    timing = timed["timing"]
+    assert timing["exit_status"] == 0
+    assert timing["output_bytes"] == 2000
+    assert timing["wall_ms"] > 0 and timing["proxy_cpu_ms"] > 0
+    assert timing["max_rss_kb"] > 0
+    assert timed["source_files"] == ["main.cpp"]
+
+
+@pytest.mark.skipif(not shutil.which("cc"), reason="needs a C compiler that writes depfiles")
+def test_deps_records_headers(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    (tmp_path / "a.h").write_text("#define A 1\n")
+    (tmp_path / "a.c").write_text('#include "a.h"\nint a(void) { return A; }\n')
+    code = "from cmakegen.proxy import main; main('cc')"
+    env = dict(os.environ, CMAKEGEN_LOG=log_path, PYTHONPATH=ROOT_DIR, CMAKEGEN_DEPS="1", TMPDIR=str(tmp_path))
+    for args in (["-c", "-o", "a.o", "a.c"], ["-MMD", "-c", "-o", "b.o", "a.c"], ["-c", "missing.c"]):
+        subprocess.run([sys.executable, "-c", code] + args, env=env, cwd=str(tmp_path), stderr=subprocess.DEVNULL)
+    injected, own, failed = read_invocations(log_path)
+    assert injected["headers"][-1] == "a.h"  # after the compiler's implicit ones, e.g. stdc-predef.h
+    assert "-MD" not in injected["dependency_flags"] and injected["timing"]["exit_status"] == 0
+    assert own["headers"] == ["a.h"] and (tmp_path / "b.d").exists()
+    assert "headers" not in failed
+    # The injected depfile was temporary
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.c", "a.h", "a.o", "b.d", "b.o", "build.jsonl"]
@@ -0,0 +1,37 @@
+"""Tests for cmakegen.report."""
+
+from cmakegen.cmake_generator import aggregate_invocations
+from cmakegen.flag_parser import parse_args
+from cmakegen.report import build_report
+
+
+def _timed(argv, wall_ms, status=0):
+    invocation = parse_args(argv)
+    invocation["timing"] = {"wall_ms": wall_ms, "user_ms": wall_ms * 0.8, "sys_ms": wall_ms * 0.1,
+                            "max_rss_kb": 204800, "exit_status": status, "output_bytes": 4096,
+                            "proxy_cpu_ms": 20.0}
+    return invocation
+
+
+def test_report_ranks_tus_and_targets():
+    aggregate = aggregate_invocations([
+        _timed(["-c", "-o", "fast.o", "fast.cpp"], 100),
+        _timed(["-c", "-o", "slow.o", "slow.cpp"], 9000),
+        _timed(["-c", "-o", "lib.o", "lib.cpp"], 500, status=1),
+        _timed(["-shared", "lib.o", "-o", "libutil.so"], 300),
+        _timed(["fast.o", "slow.o", "-o", "app"], 1000),
+    ])
+    text = build_report(aggregate, top=2)
+    tus = text.split("Heaviest targets")[0]
+    assert tus.index("slow.cpp") < tus.index("lib.cpp")
+    assert "fast.cpp" not in tus
+    assert "top 2 of 3" in tus
+    targets = text.split("Heaviest targets")[1]
+    assert targets.index("app") < targets.index("util")
+    assert "5 timed steps" in text
+    assert "0.1 s of proxy CPU (20.0 ms per step" in text
+    assert "1 step(s) failed" in text
+
+
+def test_report_without_timings():
+    assert build_report(aggregate_invocations([parse_args(["-c", "a.cpp"])])) is None
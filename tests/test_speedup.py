@@ -0,0 +1,98 @@
+"""Tests for cmakegen.speedup."""
+
+from cmakegen.cmake_generator import aggregate_invocations, generate_cmake
+from cmakegen.flag_parser import parse_args
+from cmakegen.speedup import format_plan, plan_speedups
+
+
+def _project(tmp_path, sources):
+    """Compile steps of `sources` {name: (text, headers read)} with depfiles in tmp_path."""
+    (tmp_path / "src").mkdir()
+    invocations = []
+    for name, (text, headers) in sources.items():
+        (tmp_path / "src" / name).write_text(text)
+        obj = f"obj/{name}.o"
+        (tmp_path / "obj").mkdir(exist_ok=True)
+        (tmp_path / f"{obj}.d").write_text(f"{obj}: src/{name} " + " ".join(headers) + "\n")
+        invocation = parse_args(["-Iinclude", "-MD", "-MF", f"{obj}.d", "-c", "-o", obj, f"src/{name}"])
+        invocation["cwd"] = str(tmp_path)
+        invocations.append(invocation)
+    return invocations
+
+
+def test_precompiled_headers_from_depfiles(tmp_path):
+    vector = "/usr/include/c++/12/vector"
+    map_ = "/usr/include/c++/12/map"
+    common = "#include <vector>\n#include <common/config.h>\n"
+    invocations = _project(tmp_path, {
+        "a.cpp": (common + "#include <map>\n", [vector, "include/common/config.h", map_]),
+        "b.cpp": (common, [vector, "include/common/config.h"]),
+        "c.cpp": (common, [vector, "include/common/config.h"]),
+        "d.cpp": ("#include \"d.h\"\n", ["src/d.h", vector]),
+    })
+    plans = plan_speedups(aggregate_invocations(invocations), unity=False)
+    plan = plans["project"]
+    # config.h is a project header and <map> is read by too few sources
+    assert plan.precompile_headers == ["<vector>"]
+    assert plan.unity_batch_size == 0
+    report = format_plan(plans)
+    assert "100%  <vector>" in report
+    assert "25%  <map>  (left out, below 75%)" in report
+
+    cmake = generate_cmake(invocations, precompile_headers=True)
+    assert "target_precompile_headers(project PRIVATE <vector>)" in cmake
+    assert cmake.startswith("cmake_minimum_required(VERSION 3.16)")
+
+
+def test_mixed_language_headers_are_guarded(tmp_path):
+    sources = {f"{n}.cpp": ("#include <vector>\n", ["/usr/include/c++/12/vector"]) for n in "abc"}
+    sources.update({f"{n}.c": ("#include <stdio.h>\n", ["/usr/include/stdio.h"]) for n in "xyz"})
+    plan = plan_speedups(aggregate_invocations(_project(tmp_path, sources)), unity=False)["project"]
+    assert plan.precompile_headers == ["$<$<COMPILE_LANGUAGE:CXX>:<vector$<ANGLE-R>>",
+                                       "$<$<COMPILE_LANGUAGE:C>:<stdio.h$<ANGLE-R>>"]
+
+
+def test_missing_depfiles_mean_no_pch():
+    invocations = [parse_args(["-MD", "-c", "-o", f"{n}.o", f"{n}.cpp"]) for n in "abcd"]
+    plan = plan_speedups(aggregate_invocations(invocations), unity=False)["project"]
+    assert plan.precompile_headers == []
+    assert "0 of 4 source(s) have logged headers or a readable depfile" in plan.notes[0]
+
+
+def test_unity_batch_size():
+    invocations = []
+    for i in range(10):
+        invocation = parse_args(["-O2", "-c", "-o", f"f{i}.o", f"f{i}.cpp"])
+        invocation["timing"] = {"start": 0.0, "wall_ms": 5000}
+        invocations.append(invocation)
+    invocations.append(parse_args(["-O2", "-DODD", "-c", "-o", "odd.o", "odd.cpp"]))
+    invocations.append(parse_args([f"f{i}.o" for i in range(10)] + ["odd.o", "-o", "app"]))
+    plan = plan_speedups(aggregate_invocations(invocations), precompile_headers=False)["app"]
+    # 30 s batches of 5 s sources; odd.cpp has its own flags
+    assert plan.unity_batch_size == 6
+    assert "1 source(s) with their own flags" in plan.notes[0]
+    assert "UNITY_BUILD ON UNITY_BUILD_BATCH_SIZE 6" in generate_cmake(invocations, unity=True)
+
+    small = [parse_args(["-c", "-o", f"{n}.o", f"{n}.cpp"]) for n in "ab"]
+    assert plan_speedups(aggregate_invocations(small), precompile_headers=False)["project"].unity_batch_size == 0
+
+
+def test_logged_headers_are_preferred(tmp_path):
+    # The depfiles on disk are stale; the logged headers are what counts
+    invocations = _project(tmp_path, {f"{n}.cpp": ("#include <map>\n", ["/usr/include/c++/12/vector"])
+                                      for n in "abc"})
+    for invocation in invocations:
+        invocation["headers"] = ["/usr/include/c++/12/map"]
+    plan = plan_speedups(aggregate_invocations(invocations), unity=False)["project"]
+    assert plan.precompile_headers == ["<map>"]
+
+
+def test_unknown_cwd_is_the_current_directory(tmp_path, monkeypatch):
+    # Logs written by the daemon record "cwd": null when a client didn't send one
+    invocations = _project(tmp_path, {f"{n}.cpp": ("#include <vector>\n", ["/usr/include/c++/12/vector"])
+                                      for n in "abc"})
+    for invocation in invocations:
+        invocation["cwd"] = None
+    monkeypatch.chdir(tmp_path)
+    plan = plan_speedups(aggregate_invocations(invocations), unity=False)["project"]
+    assert plan.precompile_headers == ["<vector>"]
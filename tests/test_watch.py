@@ -0,0 +1,90 @@
+"""Tests for cmakegen.watch."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from cmakegen import watch as watch_module
+from cmakegen.flag_parser import parse_args
+from cmakegen.invocation_log import _dumps, log_invocations
+from cmakegen.watch import LogTail, watch
+
+
+def _compile(name):
+    return parse_args(["-c", "-o", f"{name}.o", f"{name}.cpp"])
+
+
+def test_log_tail_reads_only_appended_records(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    tail = LogTail(log_path)
+    assert not tail.read()
+    log_invocations(log_path, [_compile("a"), _compile("b")])
+    assert tail.read()
+    assert tail.aggregate.count == 2
+    assert not tail.read()
+
+    # A record still being written waits for its newline
+    line = _dumps(_compile("c")) + "\n"
+    with open(log_path, "a") as f:
+        f.write(line[:10])
+    assert not tail.read()
+    with open(log_path, "a") as f:
+        f.write(line[10:])
+    assert tail.read()
+    assert [src for src, _ in tail.aggregate.compiles.values()] == ["a.cpp", "b.cpp", "c.cpp"]
+    assert tail.offset == os.path.getsize(log_path)
+
+
+def test_log_tail_follows_replaced_logs(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    tail = LogTail(log_path)
+    log_invocations(log_path, [_compile("a"), _compile("b")])
+    tail.read()
+    os.remove(log_path)
+    assert tail.read() and tail.aggregate.count == 0
+    log_invocations(log_path, [_compile("c")])
+    assert tail.read()
+    assert [src for src, _ in tail.aggregate.compiles.values()] == ["c.cpp"]
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_watch_regenerates_on_change(tmp_path, monkeypatch, polling):
+    if polling:
+        monkeypatch.setattr(watch_module, "_watcher", watch_module._Poller)
+        monkeypatch.setattr(watch_module, "POLL_SECONDS", 0.02)
+    log_path = str(tmp_path / "build.jsonl")
+    output = str(tmp_path / "CMakeLists.txt")
+    renders = []
+
+    def render(aggregate):
+        renders.append(aggregate.count)
+        return " ".join(sorted(src for src, _ in aggregate.compiles.values()))
+
+    log_invocations(log_path, [_compile("a")])
+    stop = threading.Event()
+    thread = threading.Thread(target=watch, args=(log_path, output, render),
+                              kwargs={"debounce": 0.05, "max_delay": 1, "stop": stop.is_set})
+    thread.start()
+    try:
+        _wait_for(lambda: os.path.exists(output))
+        assert open(output).read() == "a.cpp"
+        log_invocations(log_path, [_compile("b")])
+        _wait_for(lambda: open(output).read() == "a.cpp b.cpp")
+        mtime = os.stat(output).st_mtime_ns
+        # A repeated record renders the same output, which is left alone
+        log_invocations(log_path, [_compile("b")])
+        _wait_for(lambda: renders[-1] == 3)
+        assert os.stat(output).st_mtime_ns == mtime
+    finally:
+        stop.set()
+        thread.join(timeout=10)
+    assert not thread.is_alive()
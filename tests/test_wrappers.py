@@ -0,0 +1,77 @@
+"""Tests for cmakegen.wrappers and the wrap command."""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from cmakegen.invocation_log import read_invocations
+from cmakegen.wrappers import LAUNCHER_NAME, find_tools, install_wrappers, tool_kind
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses symlinks and POSIX true/false as the real tools")
+
+
+def test_tool_kind():
+    for name in ("cc", "c++", "gcc-12", "clang++", "aarch64-linux-gnu-g++"):
+        assert tool_kind(name) == "compiler"
+    for name in ("ar", "llvm-ar", "gcc-ar-12", "x86_64-linux-gnu-ar"):
+        assert tool_kind(name) == "archiver"
+    assert tool_kind("gcc-ranlib-12") == "ranlib"
+    for name in ("ccache", "make", "gcc-nm", "cargo"):
+        assert tool_kind(name) is None
+
+
+def test_find_tools_skips_the_wrapper_directory(tmp_path, monkeypatch):
+    first, second = tmp_path / "first", tmp_path / "second"
+    for directory in (first, second):
+        directory.mkdir()
+        for name in ("gcc", "ar", "make"):
+            (directory / name).write_text("#!/bin/sh\n")
+            (directory / name).chmod(0o755)
+    monkeypatch.setenv("PATH", os.pathsep.join([str(first), str(second)]))
+    assert find_tools() == {"ar": str(first / "ar"), "gcc": str(first / "gcc")}
+    assert find_tools(["gcc"], exclude=str(first)) == {"gcc": str(second / "gcc")}
+
+
+def test_wrappers_log_compilers_and_archivers(tmp_path):
+    wrappers = str(tmp_path / "wrappers")
+    log_path = str(tmp_path / "build.jsonl")
+    install_wrappers(wrappers, {"gcc": shutil.which("true"), "cc": shutil.which("false"),
+                                "ar": shutil.which("true"), "ranlib": shutil.which("true")})
+    env = dict(os.environ, CMAKEGEN_LOG=log_path)
+
+    assert subprocess.run([os.path.join(wrappers, "gcc"), "-c", "-o", "a.o", "a.c"], env=env).returncode == 0
+    assert subprocess.run([os.path.join(wrappers, "cc"), "-c", "b.c"], env=env).returncode == 1
+    assert subprocess.run([os.path.join(wrappers, "ar"), "rcs", "liba.a", "a.o"], env=env).returncode == 0
+    assert subprocess.run([os.path.join(wrappers, "ar"), "t", "liba.a"], env=env).returncode == 0
+    assert subprocess.run([os.path.join(wrappers, "ranlib"), "liba.a"], env=env).returncode == 0
+    invocations = read_invocations(log_path)
+    assert [inv["source_files"] for inv in invocations] == [["a.c"], ["b.c"], []]
+    assert invocations[2]["archive"] and invocations[2]["object_files"] == ["a.o"]
+
+    # Reinstalling drops tools no longer wrapped
+    install_wrappers(wrappers, {"gcc": shutil.which("true")})
+    assert sorted(os.listdir(wrappers)) == [LAUNCHER_NAME, "gcc"]
+
+
+def test_launcher_imports_only_the_proxy(tmp_path):
+    wrappers = str(tmp_path / "wrappers")
+    install_wrappers(wrappers, {"gcc": shutil.which("true")})
+    with open(os.path.join(wrappers, LAUNCHER_NAME)) as f:
+        source = f.read()
+    assert source.startswith(f"#!{sys.executable} -S\n")
+    probe = source.replace("launch(", "print(sorted(set(sys.modules) & {'site', 'json', 're', 'argparse'})) or (")
+    proc = subprocess.run([sys.executable, "-S", "-c", probe], capture_output=True, text=True)
+    assert proc.stdout.strip() == "[]"
+
+
+def test_wrap_command(tmp_path):
+    log_path = str(tmp_path / "build.jsonl")
+    env = dict(os.environ, CMAKEGEN_LOG=log_path, PYTHONPATH=ROOT_DIR)
+    proc = subprocess.run([sys.executable, "-m", "cmakegen", "wrap", "true", "-c", "main.cpp"], env=env)
+    assert proc.returncode == 0
+    assert read_invocations(log_path)[0]["source_files"] == ["main.cpp"]